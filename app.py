@@ -1,9 +1,11 @@
-import os
+import click
 from flask import Flask
 from config import Config
-from extensions import db, login_manager, migrate, mail
+from extensions import db, login_manager, mail, init_migrate
 from models import User
 from error_handlers import register_error_handlers
+from commands import register_commands, init_database
+from db_profile import register_db_timing, warm_pool
 
 
 
@@ -14,7 +16,9 @@ def create_app():
     # Initialize extensions
     db.init_app(app)
     login_manager.init_app(app)
-    migrate.init_app(app, db)
+    # Flask-Migrate pulls in Alembic, which only the `flask db` CLI needs
+    if not app.config['FAST_STARTUP'] or click.get_current_context(silent=True):
+        init_migrate(app)
     mail.init_app(app)
 
     # Login configuration
@@ -39,35 +43,19 @@ def create_app():
     app.register_blueprint(patient)
     app.register_blueprint(admin)
 
+    register_commands(app)
+    register_db_timing(app)
+
     # Initialize OAuth
     from blueprints.auth import init_oauth
     init_oauth(app)
 
-    # Create DB + upload folder + auto-seed admin
-    with app.app_context():
-        try:
-            db.create_all()
-            try:
-                os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-            except OSError:
-                print("WARNING: Could not create upload folder (Read-only filesystem?)")
-
-            # Auto-create admin if none exists
-            if not User.query.filter_by(role='admin').first():
-                admin_user = User(
-                    name='Admin',
-                    email='admin@lifecare.com',
-                    phone='',
-                    role='admin'
-                )
-                admin_user.set_password('admin123')
-                db.session.add(admin_user)
-                db.session.commit()
-                print('✅ Default admin user created: admin@lifecare.com / admin123')
-        except Exception as e:
-            print(f"⚠️ Startup Database Connection Failed: {e}")
-            # We do NOT raise the error, so the app can still start and show debug pages
+    # Schema, upload folder and default admin. FAST_STARTUP deployments
+    # run `flask init-db` once instead of paying for this on every cold start
+    if not app.config['FAST_STARTUP']:
+        init_database(app)
 
+    warm_pool(app, app.config['DB_WARMUP'])
 
     return app
 
@@ -0,0 +1,274 @@
+"""
+Slot availability and capacity.
+
+slot_usage holds the number of live (not cancelled) bookings per
+(date, slot, lab/home). Booking inserts, reschedules, status changes and
+deletes adjust it inside the same flush, the way daily_stats.py keeps its
+rollup. A new booking only takes a slot through a conditional
+`booked = booked + 1 WHERE booked < capacity` update, so two patients
+racing for the last place can't both get it: the loser's flush raises
+SlotUnavailable and its transaction rolls back.
+
+Readers get a whole range of days — blocks and usage together — from one
+query, so the booking page can fetch a month up front and pick dates
+without further round trips.
+
+Closures that span many days (a holiday fortnight, every Sunday) are one
+block_rules row each, expanded per day here rather than stored per date.
+"""
+from collections import namedtuple
+from datetime import datetime, timedelta
+from sqlalchemy import event, inspect, literal, select, union_all
+from config import Config
+from db_utils import old_value, track_old_values, upsert_for
+from extensions import db
+from models import BlockedSlot, BlockRule, Booking, SlotUsage
+
+
+SlotAvailability = namedtuple('SlotAvailability', ['time', 'booked', 'capacity', 'is_blocked'])
+DayAvailability = namedtuple('DayAvailability', ['date', 'full_day_blocked', 'reason', 'slots'])
+
+
+class SlotUnavailable(Exception):
+    """The slot is blocked, unknown or already at capacity."""
+
+
+def capacity(home):
+    return Config.SLOT_CAPACITY_HOME if home else Config.SLOT_CAPACITY_LAB
+
+
+def _kind(home):
+    return 'home' if home else 'lab'
+
+
+def _slot_to_dict(slot):
+    return {
+        'time': slot.time,
+        'booked': slot.booked,
+        'capacity': slot.capacity,
+        'is_blocked': slot.is_blocked,
+        'is_full': slot.booked >= slot.capacity,
+        'is_available': not slot.is_blocked and slot.booked < slot.capacity,
+    }
+
+
+def day_to_dict(day):
+    return {
+        'date': day.date.isoformat(),
+        'full_day_blocked': day.full_day_blocked,
+        'reason': day.reason,
+        'slots': [_slot_to_dict(s) for s in day.slots],
+    }
+
+
+# ── Read side ──
+def _rows(start, end, kind):
+    """Blocks, block rules and usage for [start, end] in a single round trip.
+
+    Rows are (source, first date, last date, slot(s), weekdays, booked, reason).
+    """
+    no_int = db.cast(db.null(), db.Integer)
+    blocks = select(literal('block'), BlockedSlot.date, BlockedSlot.date, BlockedSlot.time_slot,
+                    no_int, no_int, BlockedSlot.reason)\
+        .where(BlockedSlot.date.between(start, end))
+    rules = select(literal('rule'), BlockRule.start_date, BlockRule.end_date, BlockRule.time_slots,
+                   BlockRule.weekdays, no_int, BlockRule.reason)\
+        .where(BlockRule.start_date <= end,
+               BlockRule.end_date.is_(None) | (BlockRule.end_date >= start))
+    usage = select(literal('usage'), SlotUsage.date, SlotUsage.date, SlotUsage.slot_time,
+                   no_int, SlotUsage.booked, db.cast(db.null(), db.String))\
+        .where(SlotUsage.date.between(start, end), SlotUsage.kind == kind,
+               SlotUsage.booked > 0)
+    return db.session.execute(union_all(blocks, rules, usage)).all()
+
+
+def calendar(start, days, home=False):
+    """[DayAvailability] for `days` consecutive days from `start`."""
+    days = max(1, min(days, Config.AVAILABILITY_MAX_DAYS))
+    end = start + timedelta(days=days - 1)
+    limit = capacity(home)
+
+    full_day = {}
+    blocked = set()
+    booked = {}
+    rules = []
+    for source, first, last, slot, weekdays, count, reason in _rows(start, end, _kind(home)):
+        if source == 'usage':
+            booked[(first, slot)] = count
+        elif source == 'rule':
+            rules.append(BlockRule(start_date=first, end_date=last, time_slots=slot,
+                                   weekdays=weekdays, reason=reason))
+        elif slot is None:
+            full_day[first] = reason
+        else:
+            blocked.add((first, slot))
+
+    result = []
+    for offset in range(days):
+        date = start + timedelta(days=offset)
+        rule_slots = set()
+        for rule in rules:
+            if not rule.applies_to(date):
+                continue
+            if not rule.time_slots:
+                full_day.setdefault(date, rule.reason)
+            rule_slots.update(rule.slot_list)
+
+        if date in full_day:
+            result.append(DayAvailability(date, True, full_day[date], []))
+            continue
+        slots = [SlotAvailability(t, booked.get((date, t), 0), limit,
+                                  (date, t) in blocked or t in rule_slots)
+                 for t in Config.SLOT_TIMES]
+        result.append(DayAvailability(date, False, None, slots))
+    return result
+
+
+def day(date, home=False):
+    return calendar(date, 1, home)[0]
+
+
+def check_slot(date, slot_time, home=False):
+    """Raise SlotUnavailable unless slot_time on date can take a booking now."""
+    if slot_time not in Config.SLOT_TIMES:
+        raise SlotUnavailable('Unknown time slot.')
+    availability = day(date, home)
+    if availability.full_day_blocked:
+        raise SlotUnavailable('The lab is closed on that date.')
+    slot = next(s for s in availability.slots if s.time == slot_time)
+    if slot.is_blocked:
+        raise SlotUnavailable('Selected slot is unavailable.')
+    if slot.booked >= slot.capacity:
+        raise SlotUnavailable('Selected slot is fully booked.')
+
+
+# ── Blocking ──
+def block_slots(dates, time_slots, reason):
+    """Block every (date, slot) pair — or whole days if time_slots is empty.
+
+    One multi-row INSERT; pairs that are already blocked are skipped.
+    Returns the number of new blocks. Commits nothing.
+    """
+    now = datetime.utcnow()
+    rows = [dict(date=d, time_slot=t, reason=reason, created_at=now)
+            for d in dates for t in (time_slots or [None])]
+    if not rows:
+        return 0
+    table = BlockedSlot.__table__
+    insert = upsert_for(db.session.get_bind())
+    if insert is not None:
+        result = db.session.execute(insert(table).values(rows).on_conflict_do_nothing())
+        return result.rowcount
+
+    existing = set(db.session.execute(
+        select(BlockedSlot.date, BlockedSlot.time_slot)
+        .where(BlockedSlot.date.in_({r['date'] for r in rows}))).all())
+    rows = [r for r in rows if (r['date'], r['time_slot']) not in existing]
+    if rows:
+        db.session.execute(table.insert(), rows)
+    return len(rows)
+
+
+def add_rule(start_date, end_date, weekdays, time_slots, reason):
+    """Store a ranged / weekly block as one row. Commits nothing."""
+    mask = sum(1 << d for d in set(weekdays)) or None
+    rule = BlockRule(start_date=start_date, end_date=end_date, weekdays=mask,
+                     time_slots=','.join(time_slots) or None, reason=reason)
+    db.session.add(rule)
+    return rule
+
+
+# ── Write side ──
+def _key(date, slot_time, home, status):
+    if status == 'cancelled':
+        return None
+    return date, slot_time, _kind(home)
+
+
+def _ensure_row(connection, date, slot_time, kind):
+    table = SlotUsage.__table__
+    values = dict(date=date, slot_time=slot_time, kind=kind, booked=0)
+    insert = upsert_for(connection)
+    if insert is not None:
+        connection.execute(insert(table).values(**values).on_conflict_do_nothing(
+            index_elements=['date', 'slot_time', 'kind']))
+        return
+    exists = connection.execute(select(table.c.booked).where(
+        table.c.date == date, table.c.slot_time == slot_time, table.c.kind == kind)).first()
+    if exists is None:
+        connection.execute(table.insert().values(**values))
+
+
+def _take(connection, key, limit=None):
+    """Add one booking to key; with a limit, only while booked < limit."""
+    table = SlotUsage.__table__
+    date, slot_time, kind = key
+    _ensure_row(connection, date, slot_time, kind)
+    stmt = table.update().where(
+        table.c.date == date, table.c.slot_time == slot_time, table.c.kind == kind
+    ).values(booked=table.c.booked + 1)
+    if limit is not None:
+        stmt = stmt.where(table.c.booked < limit)
+    if connection.execute(stmt).rowcount == 0:
+        raise SlotUnavailable('Selected slot is fully booked.')
+
+
+def _release(connection, key):
+    table = SlotUsage.__table__
+    date, slot_time, kind = key
+    connection.execute(table.update().where(
+        table.c.date == date, table.c.slot_time == slot_time, table.c.kind == kind,
+        table.c.booked > 0
+    ).values(booked=table.c.booked - 1))
+
+
+track_old_values(Booking.booking_date, Booking.slot_time, Booking.home_collection, Booking.status)
+
+
+def _old_key(target):
+    state = inspect(target)
+    return _key(old_value(state, 'booking_date', target.booking_date),
+                old_value(state, 'slot_time', target.slot_time),
+                old_value(state, 'home_collection', target.home_collection),
+                old_value(state, 'status', target.status))
+
+
+@event.listens_for(Booking, 'after_insert')
+def _booking_inserted(mapper, connection, target):
+    key = _key(target.booking_date, target.slot_time, target.home_collection, target.status)
+    if key is not None:
+        _take(connection, key, capacity(target.home_collection))
+
+
+@event.listens_for(Booking, 'after_update')
+def _booking_updated(mapper, connection, target):
+    old = _old_key(target)
+    new = _key(target.booking_date, target.slot_time, target.home_collection, target.status)
+    if old == new:
+        return
+    # Staff changes (reschedules, un-cancelling) may overbook on purpose
+    if old is not None:
+        _release(connection, old)
+    if new is not None:
+        _take(connection, new)
+
+
+@event.listens_for(Booking, 'after_delete')
+def _booking_deleted(mapper, connection, target):
+    old = _old_key(target)
+    if old is not None:
+        _release(connection, old)
+
+
+def backfill():
+    """Rebuild slot_usage from live bookings. Returns the number of rows."""
+    kind = db.case((Booking.home_collection.is_(True), 'home'), else_='lab')
+    rows = select(Booking.booking_date, Booking.slot_time, kind, db.func.count(Booking.id))\
+        .where(db.func.coalesce(Booking.status, 'pending') != 'cancelled')\
+        .group_by(Booking.booking_date, Booking.slot_time, kind)
+
+    db.session.execute(db.delete(SlotUsage))
+    db.session.execute(SlotUsage.__table__.insert().from_select(
+        ['date', 'slot_time', 'kind', 'booked'], rows))
+    db.session.commit()
+    return db.session.query(db.func.count()).select_from(SlotUsage).scalar()
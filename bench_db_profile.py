@@ -0,0 +1,69 @@
+"""
+Compare the 'serverless' and 'pooled' DB_PROFILE settings.
+
+Starts the app once per profile (in a subprocess, since the engine options
+are fixed at import), requests a few public pages repeatedly, and reports
+the connection and query time each request spent, from the same
+Server-Timing numbers DB_TIMING adds in production.
+
+DATABASE_URL must be set explicitly so this never runs against the
+built-in default database by accident.
+
+Usage:
+    DATABASE_URL=postgresql://... python bench_db_profile.py [requests per url]
+"""
+import json
+import os
+import re
+import subprocess
+import sys
+
+PROFILES = ['serverless', 'pooled']
+URLS = ['/', '/services', '/api/tests/autocomplete?q=bl', '/login']
+_SERVER_TIMING = re.compile(r'([\w-]+);dur=([\d.]+)')
+
+
+def child(requests_per_url):
+    from app import app
+
+    samples = []
+    client = app.test_client()
+    for _ in range(requests_per_url):
+        for url in URLS:
+            response = client.get(url)
+            timings = dict(_SERVER_TIMING.findall(response.headers.get('Server-Timing', '')))
+            samples.append({k: float(v) for k, v in timings.items()})
+    print(json.dumps(samples))
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)] if values else 0.0
+
+
+def main():
+    if 'DATABASE_URL' not in os.environ:
+        sys.exit("Set DATABASE_URL to the database to benchmark against.")
+    requests_per_url = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+
+    print(f"{len(URLS)} urls x {requests_per_url} requests per profile")
+    print(f"{'profile':12s} {'connect p50':>12s} {'connect p95':>12s} "
+          f"{'query p50':>10s} {'request p50':>12s} {'request p95':>12s}")
+    for profile in PROFILES:
+        env = dict(os.environ, DB_PROFILE=profile, DB_TIMING='1', DB_WARMUP='2')
+        out = subprocess.run([sys.executable, __file__, '--child', str(requests_per_url)],
+                             env=env, capture_output=True, text=True, check=True).stdout
+        samples = json.loads(out.strip().splitlines()[-1])
+        connect = [s.get('db-connect', 0) for s in samples]
+        query = [s.get('db-query', 0) for s in samples]
+        total = [s.get('app', 0) for s in samples]
+        print(f"{profile:12s} {percentile(connect, .5):10.1f}ms {percentile(connect, .95):10.1f}ms "
+              f"{percentile(query, .5):8.1f}ms {percentile(total, .5):10.1f}ms "
+              f"{percentile(total, .95):10.1f}ms")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == '--child':
+        child(int(sys.argv[2]))
+    else:
+        main()
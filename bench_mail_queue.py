@@ -0,0 +1,79 @@
+"""
+Compare one-SMTP-session-per-email with the batched mail queue.
+
+Starts the local SMTP stand-in with a simulated handshake delay, sends N
+messages the old way (mail.send each) and through mail_queue (queue, then
+one send_due batch), and prints wall time and SMTP connections for both.
+A second queue run against a flaky relay shows retries and the metrics.
+
+Usage:
+    python bench_mail_queue.py [messages] [handshake latency seconds]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from smtp_standin import SMTPStandIn
+
+COUNT = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+LATENCY = float(sys.argv[2]) if len(sys.argv) > 2 else 0.2
+
+relay = SMTPStandIn(latency=LATENCY).start()
+_db_fd, _db_path = tempfile.mkstemp(suffix='.db')
+os.environ.update(DATABASE_URL=f'sqlite:///{_db_path}', MAIL_SERVER='127.0.0.1',
+                  MAIL_PORT=str(relay.port), MAIL_USE_TLS='0', MAIL_QUEUE_MODE='worker',
+                  MAIL_RETRY_SECONDS='0')
+
+from config import Config
+Config.SQLALCHEMY_ENGINE_OPTIONS = {}  # Postgres-only connect args
+
+from flask_mail import Message
+from app import app
+from extensions import db, mail
+import mail_queue
+
+
+def message(i):
+    return dict(subject=f'Bench {i}', recipients=[f'patient{i}@example.com'], body='Hello')
+
+
+def main():
+    with app.app_context():
+        db.create_all()
+
+        before = relay.connections
+        start = time.perf_counter()
+        for i in range(COUNT):
+            mail.send(Message(**message(i)))
+        direct_s = time.perf_counter() - start
+        print(f"mail.send x{COUNT}:   {direct_s * 1000:8.0f} ms, "
+              f"{relay.connections - before} SMTP connection(s)")
+
+        before = relay.connections
+        start = time.perf_counter()
+        for i in range(COUNT):
+            mail_queue.queue_mail(**message(i))
+        db.session.commit()
+        queued_s = time.perf_counter() - start
+        while mail_queue.send_due():
+            pass
+        sent_s = time.perf_counter() - start
+        print(f"queue_mail x{COUNT}: {queued_s * 1000:8.0f} ms in the request, "
+              f"{sent_s * 1000:.0f} ms until sent, {relay.connections - before} SMTP connection(s)")
+
+        relay.fail_every = 3
+        for i in range(COUNT):
+            mail_queue.queue_mail(**message(i))
+        db.session.commit()
+        rounds = 0
+        while mail_queue.send_due():
+            rounds += 1
+        print(f"flaky relay (every 3rd rejected): drained in {rounds} batch(es)")
+        print(mail_queue.metrics())
+
+    relay.stop()
+
+
+if __name__ == "__main__":
+    main()
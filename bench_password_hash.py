@@ -0,0 +1,60 @@
+"""
+Benchmark for password hash costs (passwords.py).
+
+Times the configured PASSWORD_HASH_USER / PASSWORD_HASH_REPORT methods
+and a ladder of scrypt and PBKDF2 costs on this machine, then names the
+strongest setting of each that stays within a time budget. Run it on the
+machine (or instance size) that serves logins and /check-report: a cost
+that takes 50 ms on a laptop can take several times that on a small
+serverless CPU.
+
+Usage:
+    python bench_password_hash.py [budget ms] [iterations]
+"""
+import sys
+import time
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from config import Config
+from passwords import normalise
+
+SCRYPT_LADDER = [f'scrypt:{2 ** e}:8:1' for e in range(12, 17)]
+PBKDF2_LADDER = [f'pbkdf2:sha256:{n}' for n in (100000, 200000, 400000, 600000, 1000000)]
+
+
+def per_hash_ms(method, iterations):
+    stored = generate_password_hash('correct horse', method=method)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        check_password_hash(stored, 'correct horse')
+    return (time.perf_counter() - start) / iterations * 1000
+
+
+def main():
+    budget = float(sys.argv[1]) if len(sys.argv) > 1 else 50
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    print(f"{'Method':28s} {'ms/hash':>8s} {'hashes/s':>9s}")
+    for kind, method in (('user', Config.PASSWORD_HASH_USER), ('report', Config.PASSWORD_HASH_REPORT)):
+        ms = per_hash_ms(method, iterations)
+        print(f"{normalise(method) + f' ({kind})':28s} {ms:8.1f} {1000 / ms:9.1f}")
+    print()
+
+    for ladder in (SCRYPT_LADDER, PBKDF2_LADDER):
+        best = None
+        for method in ladder:
+            ms = per_hash_ms(method, iterations)
+            within = ms <= budget
+            if within:
+                best = method
+            print(f"{method:28s} {ms:8.1f} {1000 / ms:9.1f}{'' if within else '  over budget'}")
+        print(f"-> strongest within {budget:g} ms: {best or 'none'}")
+        print()
+
+    print("Set PASSWORD_HASH_USER / PASSWORD_HASH_REPORT to the chosen method; stored")
+    print("hashes are re-hashed to it as their passwords are next verified.")
+
+
+if __name__ == "__main__":
+    main()
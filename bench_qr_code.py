@@ -0,0 +1,65 @@
+"""
+Benchmark for the report QR code paths.
+
+Compares the raster path (qrcode + PIL PNG) uncached and cached against
+ReportLab's vector QR widget, both standalone and inside a full report.
+
+Usage:
+    python bench_qr_code.py [iterations]
+"""
+import io
+import sys
+import time
+
+from report_generator import (_render_qr_png, clear_qr_cache, generate_qr_code,
+                              generate_report_pdf)
+from bench_report_pdf import SAMPLE_REPORT
+
+URL = 'https://example.com/report/RID{:06d}/download'
+
+
+def per_call_ms(fn, iterations):
+    start = time.perf_counter()
+    for i in range(iterations):
+        fn(i)
+    return (time.perf_counter() - start) / iterations * 1000
+
+
+def pdf_with(mode):
+    def build(i):
+        generate_report_pdf(SAMPLE_REPORT, io.BytesIO(), URL.format(0), qr_mode=mode)
+    return build
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+    # Warm up imports
+    generate_qr_code(URL.format(0), mode='raster')
+    generate_qr_code(URL.format(0), mode='vector')
+
+    rows = [
+        ("Raster, no cache",
+         per_call_ms(lambda i: _render_qr_png(URL.format(i)), iterations)),
+        ("Raster, cache miss",
+         per_call_ms(lambda i: generate_qr_code(URL.format(100000 + i), mode='raster'), iterations)),
+        ("Raster, cache hit",
+         per_call_ms(lambda i: generate_qr_code(URL.format(0), mode='raster'), iterations)),
+        ("Vector widget",
+         per_call_ms(lambda i: generate_qr_code(URL.format(i), mode='vector'), iterations)),
+    ]
+
+    pdf_iterations = max(iterations // 10, 5)
+    clear_qr_cache()
+    rows += [
+        ("Full PDF, raster (cached)", per_call_ms(pdf_with('raster'), pdf_iterations)),
+        ("Full PDF, vector", per_call_ms(pdf_with('vector'), pdf_iterations)),
+    ]
+
+    print(f"Iterations: {iterations} (full PDF: {pdf_iterations})")
+    for label, ms in rows:
+        print(f"{label:28s} {ms:8.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Benchmark for abnormal-result flagging.
+
+Flags a synthetic batch of report rows the old way (split the range text
+on '-' for every row) and with range_eval (each distinct range compiled
+once, then float comparisons), counts rows the old parser couldn't judge
+or judged wrongly, and times the saved-report path, where the flags were
+stored in report_results when the report was created.
+
+Usage:
+    python bench_range_eval.py [rows] [iterations]
+"""
+import random
+import sys
+import time
+
+from range_eval import compile_range, flag_results
+
+RANGES = ['12.0 - 17.5', '4000 - 11000', '4,000 - 11,000', '< 200', '≥ 40', 'Up to 34',
+          '-2 - 2', 'M: 13 - 17; F: 12 - 15.5', 'Adult: 0.6 - 1.2, Child: 0.3 - 0.7',
+          '0.5-5.0', '70 - 110', 'Negative']
+
+
+def old_flag(result):
+    val = str(result.get('value', ''))
+    rng = str(result.get('normal_range', ''))
+    is_abnormal = False
+    try:
+        v = float(val)
+        if '-' in rng:
+            parts = rng.split('-')
+            if len(parts) == 2:
+                lo, hi = float(parts[0]), float(parts[1])
+                if v < lo or v > hi:
+                    is_abnormal = True
+    except:
+        return None
+    return is_abnormal
+
+
+def rows(count):
+    rng = random.Random(7)
+    return [{'parameter': f'P{i % 40}', 'value': f'{rng.uniform(-5, 300):.1f}',
+             'normal_range': rng.choice(RANGES)} for i in range(count)]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    results = rows(count)
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        old = [old_flag(r) for r in results]
+    old_ms = (time.perf_counter() - start) / iterations * 1000
+
+    compile_range.cache_clear()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        new = flag_results(results, gender='Female', age=35)
+    new_ms = (time.perf_counter() - start) / iterations * 1000
+
+    stored = [dict(r, is_abnormal=flag) for r, flag in zip(results, new)]
+    start = time.perf_counter()
+    for _ in range(iterations):
+        flag_results(stored, gender='Female', age=35)
+    stored_ms = (time.perf_counter() - start) / iterations * 1000
+
+    wrong = sum(1 for o, n in zip(old, new) if o is not None and n is not None and o != n)
+    missed = sum(1 for o, n in zip(old, new) if o is None and n is not None)
+    print(f"{count} rows, {len(RANGES)} distinct ranges")
+    print(f"split('-') per row:  {old_ms:7.1f} ms, unjudged {old.count(None)}, "
+          f"wrong {wrong}, judgeable but skipped {missed}")
+    print(f"range_eval compiled: {new_ms:7.1f} ms, unjudged {new.count(None)} "
+          f"(cache: {compile_range.cache_info().currsize} compiled)")
+    print(f"stored flags:        {stored_ms:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
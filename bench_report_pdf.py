@@ -0,0 +1,69 @@
+"""
+Micro-benchmark for report_generator.generate_report_pdf.
+
+Compares building the styles/table styles/header flowables for every report
+(the old behaviour) against reusing the shared report theme.
+
+Usage:
+    python bench_report_pdf.py [iterations]
+"""
+import io
+import sys
+import time
+
+from report_generator import build_report_theme, get_report_theme, generate_report_pdf
+
+SAMPLE_REPORT = {
+    'report_id': 'RID123456',
+    'patient_name': 'Sample Patient',
+    'age': '42',
+    'gender': 'Male',
+    'doctor_name': 'Dr. Sharma',
+    'test_name': 'Complete Blood Count',
+    'token_number': 'RID654321',
+    'remarks': 'Fasting sample.',
+    'test_results': [
+        {'parameter': 'Haemoglobin', 'value': '11.2', 'unit': 'g/dL', 'normal_range': '13.0 - 17.0'},
+        {'parameter': 'Total WBC Count', 'value': '7200', 'unit': '/cumm', 'normal_range': '4000 - 11000'},
+        {'parameter': 'Platelet Count', 'value': '2.1', 'unit': 'lakh/cumm', 'normal_range': '1.5 - 4.5'},
+        {'parameter': 'RBC Count', 'value': '4.6', 'unit': 'mill/cumm', 'normal_range': '4.5 - 5.5'},
+        {'parameter': 'PCV', 'value': '39', 'unit': '%', 'normal_range': '40 - 50'},
+    ],
+}
+DOWNLOAD_URL = 'https://example.com/report/RID123456/download'
+
+
+def time_theme_build(iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        build_report_theme()
+    return (time.perf_counter() - start) / iterations
+
+
+def time_reports(iterations, fresh_theme):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        theme = build_report_theme() if fresh_theme else get_report_theme()
+        generate_report_pdf(SAMPLE_REPORT, io.BytesIO(), DOWNLOAD_URL, theme=theme)
+    return (time.perf_counter() - start) / iterations
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+
+    # Warm up imports, font metrics and the shared theme
+    generate_report_pdf(SAMPLE_REPORT, io.BytesIO(), DOWNLOAD_URL)
+
+    build_ms = time_theme_build(iterations) * 1000
+    before_ms = time_reports(iterations, fresh_theme=True) * 1000
+    after_ms = time_reports(iterations, fresh_theme=False) * 1000
+
+    print(f"Iterations:                 {iterations}")
+    print(f"Theme build only:           {build_ms:8.3f} ms")
+    print(f"Per report (fresh theme):   {before_ms:8.3f} ms")
+    print(f"Per report (shared theme):  {after_ms:8.3f} ms")
+    print(f"Saved per report:           {before_ms - after_ms:8.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Benchmark for the in-memory test catalogue search.
+
+Builds a MemoryIndex over a synthetic catalogue and times autocomplete for
+typical as-you-type prefixes, multi-word queries and typos.
+
+Usage:
+    python bench_search.py [catalogue size] [iterations]
+"""
+import random
+import sys
+import time
+
+from search import MemoryIndex
+
+WORDS = ['blood', 'sugar', 'fasting', 'thyroid', 'profile', 'lipid', 'liver', 'kidney',
+         'function', 'vitamin', 'haemoglobin', 'complete', 'count', 'urine', 'culture',
+         'serum', 'iron', 'calcium', 'cholesterol', 'hormone', 'panel', 'antibody', 'test']
+CATEGORIES = ['Haematology', 'Biochemistry', 'Endocrinology', 'Microbiology',
+              'Immunology', 'Pathology', 'Serology', 'Vitamins']
+QUERIES = ['h', 'hae', 'haemo', 'thyr', 'lipid prof', 'vitamin cal', 'kidny', 'cholestrol',
+           'blood sugar fast', 'micro']
+
+
+def catalogue(size):
+    rng = random.Random(42)
+    for i in range(size):
+        name = ' '.join(rng.sample(WORDS, 3)).title() + f' {i}'
+        description = ' '.join(rng.sample(WORDS, 8))
+        yield i, name, description, rng.choice(CATEGORIES), 100 + i % 900
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    start = time.perf_counter()
+    index = MemoryIndex(catalogue(size))
+    build_ms = (time.perf_counter() - start) * 1000
+
+    print(f"Catalogue: {size} tests, index built in {build_ms:.1f} ms")
+    for q in QUERIES:
+        timings = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            results = index.autocomplete(q)
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        top = results[0].name if results else '-'
+        print(f"{q!r:20s} p50 {timings[len(timings) // 2]:6.3f} ms   "
+              f"p95 {timings[int(len(timings) * 0.95)]:6.3f} ms   top: {top}")
+
+
+if __name__ == "__main__":
+    main()
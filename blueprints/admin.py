@@ -1,19 +1,32 @@
 import os
 import csv
-import io
 import json
 from datetime import datetime, timedelta
 from flask import (Blueprint, render_template, request, redirect,
-                   url_for, flash, current_app, Response, jsonify)
+                   url_for, flash, current_app, Response, jsonify, stream_with_context, abort)
 from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename
 from models import (User, Test, TestCategory, Booking, Report,
                     ContactEnquiry, Testimonial, DoctorReferral,
-                    ActivityLog, SiteSettings, TestParameter, ReportTemplate, BlockedSlot)
+                    ActivityLog, SiteSettings, TestParameter, ReportTemplate, BlockedSlot,
+                    BlockRule)
 from extensions import db
 from utils import role_required
 from file_utils import validate_pdf
-from report_generator import generate_report_pdf
+from report_jobs import enqueue_report_pdf, dispatch, pdf_status
+from loaders import view_loaders
+from catalogue import get_catalogue
+from report_results import save_results
+from report_links import link_report
+import report_access
+import storage
+from downloads import send_blob
+from range_eval import flag_results
+from pagination import paginate_request
+from dashboard_stats import get_dashboard_stats
+import daily_stats
+import availability as availability_engine  # the view below is called availability
+from config import Config
 from sqlalchemy import func
 
 admin = Blueprint('admin', __name__, url_prefix='/admin')
@@ -38,34 +51,16 @@ def log_activity(action, details=''):
 @admin.route('/dashboard')
 @role_required('admin')
 def dashboard():
-    total_patients = User.query.filter_by(role='patient').count()
-    total_tests = Test.query.count()
-    total_bookings = Booking.query.count()
-    pending_bookings = Booking.query.filter_by(status='pending').count()
-    total_reports = Report.query.count()
-    unread_enquiries = ContactEnquiry.query.filter_by(is_read=False).count()
-
-    recent_bookings = Booking.query.order_by(Booking.created_at.desc()).limit(10).all()
-
-    # Revenue (completed bookings)
-    today = datetime.utcnow().date()
-    month_start = today.replace(day=1)
-    monthly_revenue = db.session.query(func.sum(Test.price)).join(
-        Booking, Booking.test_id == Test.id
-    ).filter(
-        Booking.status == 'completed',
-        Booking.booking_date >= month_start
-    ).scalar() or 0
-
+    stats = get_dashboard_stats()
     return render_template('admin/dashboard.html',
-                           total_patients=total_patients,
-                           total_tests=total_tests,
-                           total_bookings=total_bookings,
-                           pending_bookings=pending_bookings,
-                           total_reports=total_reports,
-                           unread_enquiries=unread_enquiries,
-                           recent_bookings=recent_bookings,
-                           monthly_revenue=monthly_revenue)
+                           total_patients=stats.total_patients,
+                           total_tests=stats.total_tests,
+                           total_bookings=stats.total_bookings,
+                           pending_bookings=stats.pending_bookings,
+                           total_reports=stats.total_reports,
+                           unread_enquiries=stats.unread_enquiries,
+                           recent_bookings=stats.recent_bookings,
+                           monthly_revenue=stats.monthly_revenue)
 
 
 # ═══════════════════════════════════════════════════════
@@ -74,7 +69,8 @@ def dashboard():
 @admin.route('/tests')
 @role_required('admin')
 def tests():
-    all_tests = Test.query.order_by(Test.created_at.desc()).all()
+    all_tests = Test.query.options(*view_loaders('admin.tests'))\
+        .order_by(Test.created_at.desc()).all()
     return render_template('admin/tests.html', tests=all_tests)
 
 
@@ -146,7 +142,7 @@ def delete_test(test_id):
 @admin.route('/categories')
 @role_required('admin')
 def categories():
-    all_categories = TestCategory.query.all()
+    all_categories = TestCategory.query.options(*view_loaders('admin.categories')).all()
     return render_template('admin/categories.html', categories=all_categories)
 
 
@@ -207,44 +203,76 @@ def delete_category(cat_id):
 # ═══════════════════════════════════════════════════════
 #  AVAILABILITY MANAGEMENT
 # ═══════════════════════════════════════════════════════
+MAX_BLOCK_DAYS = 366
+
+
+def _form_date(name):
+    value = request.form.get(name)
+    return datetime.strptime(value, '%Y-%m-%d').date() if value else None
+
+
 @admin.route('/availability', methods=['GET', 'POST'])
 @role_required('admin')
 def availability():
     if request.method == 'POST':
-        date_str = request.form.get('date')
-        time_slot = request.form.get('time_slot')
-        reason = request.form.get('reason', 'Unavailable')
-
-        if not date_str:
-            flash('Date is required.', 'error')
-            return redirect(url_for('admin.availability'))
+        kind = request.form.get('kind', 'dates')
+        reason = request.form.get('reason') or 'Unavailable'
+        time_slots = [t for t in request.form.getlist('time_slot') if t in Config.SLOT_TIMES]
+        slot_label = ', '.join(time_slots) or 'Full Day'
 
         try:
-            date_obj = datetime.strptime(date_str, '%Y-%m-%d').date()
-            if time_slot == 'all':
-                time_slot = None  # Block entire day
-            
-            # Check duplicate
-            exists = BlockedSlot.query.filter_by(date=date_obj, time_slot=time_slot).first()
-            if exists:
-                flash('This slot/date is already blocked.', 'error')
-            else:
-                block = BlockedSlot(date=date_obj, time_slot=time_slot, reason=reason)
-                db.session.add(block)
-                db.session.commit()
-                log_activity('Blocked availability', f'Date: {date_str}, Slot: {time_slot or "Full Day"}')
-                flash('Availability blocked successfully. ✅', 'success')
+            start_date = _form_date('date')
+            end_date = _form_date('end_date')
         except ValueError:
             flash('Invalid date format.', 'error')
+            return redirect(url_for('admin.availability'))
 
+        if not start_date:
+            flash('Date is required.', 'error')
+            return redirect(url_for('admin.availability'))
+        if end_date and end_date < start_date:
+            flash('End date must be on or after the start date.', 'error')
+            return redirect(url_for('admin.availability'))
+
+        if kind == 'rule':
+            weekdays = [int(d) for d in request.form.getlist('weekday') if d.isdigit() and int(d) < 7]
+            rule = availability_engine.add_rule(start_date, end_date, weekdays, time_slots, reason)
+            db.session.commit()
+            days = ', '.join(rule.weekday_list) or 'Every day'
+            log_activity('Added block rule',
+                         f'From {start_date} to {end_date or "—"}, {days}, Slot: {slot_label}')
+            flash('Recurring block added. ✅', 'success')
+            return redirect(url_for('admin.availability'))
+
+        end_date = end_date or start_date
+        span = (end_date - start_date).days + 1
+        if span > MAX_BLOCK_DAYS:
+            flash(f'Block at most {MAX_BLOCK_DAYS} days at a time, or add a recurring block.', 'error')
+            return redirect(url_for('admin.availability'))
+
+        dates = [start_date + timedelta(days=i) for i in range(span)]
+        added = availability_engine.block_slots(dates, time_slots, reason)
+        db.session.commit()
+        if not added:
+            flash('This slot/date is already blocked.', 'error')
+        else:
+            log_activity('Blocked availability',
+                         f'Date: {start_date}' + (f' to {end_date}' if span > 1 else '') +
+                         f', Slot: {slot_label}')
+            flash(f'Availability blocked successfully ({added} new). ✅', 'success')
         return redirect(url_for('admin.availability'))
 
-    # GET: Show upcoming blocked slots
+    # GET: Show upcoming blocked slots and rules still in effect
     today = datetime.utcnow().date()
     blocked_slots = BlockedSlot.query.filter(BlockedSlot.date >= today)\
         .order_by(BlockedSlot.date, BlockedSlot.time_slot).all()
-    
-    return render_template('admin/availability.html', blocked_slots=blocked_slots, today=today)
+    block_rules = BlockRule.query.filter(
+        BlockRule.end_date.is_(None) | (BlockRule.end_date >= today)
+    ).order_by(BlockRule.start_date).all()
+
+    return render_template('admin/availability.html', blocked_slots=blocked_slots,
+                           block_rules=block_rules, slot_times=Config.SLOT_TIMES,
+                           weekday_names=BlockRule.WEEKDAY_NAMES, today=today)
 
 
 @admin.route('/availability/<int:block_id>/delete', methods=['POST'])
@@ -258,6 +286,17 @@ def delete_blocked_slot(block_id):
     return redirect(url_for('admin.availability'))
 
 
+@admin.route('/availability/rule/<int:rule_id>/delete', methods=['POST'])
+@role_required('admin')
+def delete_block_rule(rule_id):
+    rule = BlockRule.query.get_or_404(rule_id)
+    db.session.delete(rule)
+    db.session.commit()
+    log_activity('Removed block rule', f'From {rule.start_date} to {rule.end_date or "—"}')
+    flash('Recurring block removed. ✅', 'success')
+    return redirect(url_for('admin.availability'))
+
+
 # ═══════════════════════════════════════════════════════
 #  APPOINTMENTS / BOOKINGS
 # ═══════════════════════════════════════════════════════
@@ -265,11 +304,12 @@ def delete_blocked_slot(block_id):
 @role_required('admin')
 def appointments():
     status_filter = request.args.get('status', '')
-    query = Booking.query.order_by(Booking.created_at.desc())
+    query = Booking.query.options(*view_loaders('admin.appointments'))
     if status_filter:
         query = query.filter_by(status=status_filter)
-    bookings = query.all()
-    return render_template('admin/appointments.html', bookings=bookings, status_filter=status_filter)
+    page = paginate_request(query, Booking.created_at, Booking.id, request.args)
+    return render_template('admin/appointments.html', bookings=page.items, page=page,
+                           status_filter=status_filter)
 
 
 @admin.route('/appointments/<int:booking_id>/update', methods=['POST'])
@@ -309,6 +349,8 @@ def upload_report():
         token_number = request.form.get('token_number', '').strip()
         password = request.form.get('password')
         remarks = request.form.get('remarks')
+        phone = request.form.get('phone', '').strip()
+        email = request.form.get('email', '').strip()
         file = request.files.get('report_file')
 
         if not all([patient_name, password, file]):
@@ -325,18 +367,12 @@ def upload_report():
             token_number = report_id
 
         filename = secure_filename(f"{report_id}_{file.filename}")
-        upload_dir = current_app.config['UPLOAD_FOLDER']
-        try:
-            os.makedirs(upload_dir, exist_ok=True)
-        except OSError:
-            pass  # Read-only filesystem (Vercel)
-        file_path = os.path.join(upload_dir, filename)
-        file.save(file_path)
-
         report = Report(report_id=report_id, patient_name=patient_name,
-                        token_number=token_number,
-                        file_path=filename, remarks=remarks)
+                        token_number=token_number, phone=phone,
+                        file_path=filename, remarks=remarks,
+                        file_hash=storage.save(file.stream, 'application/pdf'))
         report.set_password(password)
+        link_report(report, email=email)
         db.session.add(report)
         db.session.commit()
         log_activity('Uploaded report', f'Patient: {patient_name}, RID: {report_id}')
@@ -349,22 +385,26 @@ def upload_report():
 @admin.route('/reports')
 @role_required('admin')
 def reports():
-    all_reports = Report.query.order_by(Report.uploaded_at.desc()).all()
-    return render_template('admin/reports.html', reports=all_reports)
+    page = paginate_request(Report.query, Report.uploaded_at, Report.id, request.args)
+    return render_template('admin/reports.html', reports=page.items, page=page)
 
 
 @admin.route('/reports/<int:report_id>/delete', methods=['POST'])
 @role_required('admin')
 def delete_report(report_id):
     report = Report.query.get_or_404(report_id)
-    # Delete file from disk
-    upload_dir = current_app.config['UPLOAD_FOLDER']
-    file_path = os.path.join(upload_dir, report.file_path)
-    if os.path.exists(file_path):
-        os.remove(file_path)
+    file_hash = report.file_hash
+    if file_hash:
+        storage.release(file_hash)
+    else:
+        # Pre-storage file on disk
+        file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], report.file_path)
+        if os.path.exists(file_path):
+            os.remove(file_path)
     token = report.token_number
     db.session.delete(report)
     db.session.commit()
+    storage.purge([file_hash])
     log_activity('Deleted report', f'Token: {token}')
     flash(f'Report (Token: {token}) deleted. 🗑️', 'success')
     return redirect(url_for('admin.reports'))
@@ -375,13 +415,13 @@ def delete_report(report_id):
 @admin.route('/api/test-parameters/<int:test_id>')
 @role_required('admin')
 def api_test_parameters(test_id):
-    test = Test.query.get_or_404(test_id)
-    params = TestParameter.query.filter_by(test_id=test_id)\
-        .order_by(TestParameter.display_order).all()
+    test = get_catalogue().tests_by_id.get(test_id)
+    if test is None:
+        abort(404)
     return jsonify({
         'test_name': test.name,
         'sample_type': test.sample_type,
-        'parameters': [p.to_dict() for p in params]
+        'parameters': [p.to_dict() for p in test.parameters]
     })
 
 
@@ -389,9 +429,9 @@ def api_test_parameters(test_id):
 @role_required('admin')
 def create_report():
     try:
-        all_tests = Test.query.filter_by(is_active=True)\
-            .order_by(Test.name).all()
-        categories = TestCategory.query.order_by(TestCategory.name).all()
+        catalogue = get_catalogue()
+        all_tests = catalogue.tests
+        categories = sorted(catalogue.categories, key=lambda c: c.name)
 
         if request.method == 'POST':
             try:
@@ -406,8 +446,9 @@ def create_report():
                 remarks = request.form.get('remarks', '').strip()
                 sample_type = request.form.get('sample_type', 'Blood').strip()
                 collection_date = request.form.get('collection_date', '').strip()
-                report_time = request.form.get('report_time', '').strip()
                 collected_at = request.form.get('collected_at', '').strip()
+                email = request.form.get('email', '').strip()
+                booking_id = request.form.get('booking_id', type=int)
 
                 if not patient_name or not test_name:
                     flash('Patient Name and Test are required.', 'error')
@@ -438,35 +479,10 @@ def create_report():
                 report_id = Report.generate_report_id()
                 password = Report.generate_password_from_name(patient_name)
 
-                # Report data dict
-                report_data = {
-                    'report_id': report_id,
-                    'patient_name': patient_name,
-                    'age': age or 'N/A',
-                    'gender': gender or 'N/A',
-                    'doctor_name': doctor_name or 'Self',
-                    'phone': phone,
-                    'test_name': test_name,
-                    'token_number': sample_id,
-                    'sample_type': sample_type,
-                    'collection_date': collection_date,
-                    'report_time': report_time,
-                    'collected_at': collected_at,
-                    'remarks': remarks,
-                    'test_results': test_results
-                }
-
                 filename = secure_filename(f"{report_id}_{sample_id}.pdf")
-                upload_dir = current_app.config['UPLOAD_FOLDER']
-                os.makedirs(upload_dir, exist_ok=True)
-                output_path = os.path.join(upload_dir, filename)
 
                 # Download URL for QR code
-                download_url = url_for('main.download_report_by_rid',
-                                       report_id=report_id, _external=True)
-
-                # Generate PDF
-                generate_report_pdf(report_data, output_path, download_url)
+                download_url = report_access.qr_url(report_id)
 
                 # Safe age conversion
                 safe_age = None
@@ -476,7 +492,7 @@ def create_report():
                     except ValueError:
                         safe_age = None
 
-                # Save to database
+                # Save to database; the PDF is built by a background job
                 report = Report(
                     report_id=report_id,
                     patient_name=patient_name,
@@ -493,9 +509,14 @@ def create_report():
                     collected_at=collected_at
                 )
                 report.set_password(password)
-                report.set_test_results(test_results)
+                link_report(report, email=email, booking_id=booking_id)
                 db.session.add(report)
+                db.session.flush()
+                test = catalogue.tests_by_id.get(int(test_id)) if test_id.isdigit() else None
+                save_results(report, test_results, test.parameters if test else ())
+                job = enqueue_report_pdf(report, download_url)
                 db.session.commit()
+                dispatch(job)
 
                 log_activity('Created report',
                              f'Patient: {patient_name}, RID: {report_id}')
@@ -511,8 +532,11 @@ def create_report():
                 return render_template('admin/create_report.html',
                                        tests=all_tests, categories=categories)
 
+        # From the appointments list: prefill the patient and link the report
+        booking_id = request.args.get('booking_id', type=int)
+        booking = db.session.get(Booking, booking_id) if booking_id else None
         return render_template('admin/create_report.html',
-                               tests=all_tests, categories=categories)
+                               tests=all_tests, categories=categories, booking=booking)
     except Exception as e:
         current_app.logger.error(f"Critical error in create_report route: {str(e)}")
         return f"<h1>A critical error occurred</h1><p>{str(e)}</p><p>Please check your database connectivity or if tables exist.</p>", 500
@@ -523,16 +547,64 @@ def create_report():
 def report_preview(report_id):
     try:
         report = Report.query.filter_by(report_id=report_id.upper()).first_or_404()
-        test_results = report.get_test_results() if getattr(report, 'test_results_json', None) else []
+        test_results = report.get_test_results()
+        for result, flag in zip(test_results, flag_results(test_results, report.gender, report.age)):
+            result['is_abnormal'] = flag
         templates = ReportTemplate.query.order_by(ReportTemplate.name).all()
+        status, _ = pdf_status(report)
         return render_template('admin/report_preview.html',
                                report=report, test_results=test_results,
-                               templates=templates)
+                               templates=templates, pdf_status=status)
     except Exception as e:
         import traceback
         return f"<h1>Error Rendering Preview</h1><pre style='background:#f4f4f4; padding:20px; border:1px solid #ccc; white-space:pre-wrap;'>{traceback.format_exc()}</pre>", 500
 
 
+@admin.route('/report/<report_id>/status')
+@role_required('admin')
+def report_status(report_id):
+    """PDF generation status, polled by the preview page."""
+    report = Report.query.filter_by(report_id=report_id.upper()).first_or_404()
+    status, error = pdf_status(report)
+    return jsonify({
+        'report_id': report.report_id,
+        'status': status,
+        'error': error,
+        'download_url': url_for('main.download_report', report_id=report.id)
+    })
+
+
+@admin.route('/api/mail-queue')
+@role_required('admin')
+def mail_queue_metrics():
+    """Email delivery counters and outbox backlog (see mail_queue.py)."""
+    import mail_queue
+    return jsonify(mail_queue.metrics())
+
+
+@admin.route('/api/abnormal-results')
+@role_required('admin')
+def abnormal_results():
+    """Abnormal rates per parameter, or one parameter's abnormal results."""
+    import report_results
+    days = request.args.get('days', 30, type=int)
+    parameter = request.args.get('parameter', '').strip()
+
+    if not parameter:
+        return jsonify([{'parameter': name, 'results': total, 'abnormal': abnormal}
+                        for name, total, abnormal in report_results.abnormal_rates(days)])
+
+    since = datetime.utcnow() - timedelta(days=days)
+    return jsonify([{
+        'report_id': report.report_id,
+        'patient_name': report.patient_name,
+        'uploaded_at': report.uploaded_at.isoformat() if report.uploaded_at else None,
+        'value': result.raw_value,
+        'unit': result.unit,
+        'normal_range': result.normal_range,
+    } for report, result in report_results.abnormal_results(parameter, since=since)])
+
+
 # ── Test Parameter Management ──
 @admin.route('/tests/<int:test_id>/parameters')
 @role_required('admin')
@@ -595,7 +667,7 @@ def delete_test_parameter(param_id):
 @role_required('admin')
 def patients():
     search = request.args.get('q', '').strip()
-    query = User.query.filter_by(role='patient')
+    query = User.query.options(*view_loaders('admin.patients')).filter_by(role='patient')
     if search:
         query = query.filter(
             db.or_(
@@ -604,15 +676,15 @@ def patients():
                 User.phone.ilike(f'%{search}%')
             )
         )
-    all_patients = query.order_by(User.created_at.desc()).all()
-    return render_template('admin/patients.html', patients=all_patients, search=search)
+    page = paginate_request(query, User.created_at, User.id, request.args)
+    return render_template('admin/patients.html', patients=page.items, page=page, search=search)
 
 
 @admin.route('/users')
 @role_required('admin')
 def users():
-    all_users = User.query.order_by(User.created_at.desc()).all()
-    return render_template('admin/users.html', users=all_users)
+    page = paginate_request(User.query, User.created_at, User.id, request.args)
+    return render_template('admin/users.html', users=page.items, page=page)
 
 
 @admin.route('/users/<int:user_id>/toggle-active', methods=['POST'])
@@ -665,8 +737,8 @@ def delete_user(user_id):
 @admin.route('/testimonials')
 @role_required('admin')
 def testimonials():
-    all_testimonials = Testimonial.query.order_by(Testimonial.created_at.desc()).all()
-    return render_template('admin/testimonials.html', testimonials=all_testimonials)
+    page = paginate_request(Testimonial.query, Testimonial.created_at, Testimonial.id, request.args)
+    return render_template('admin/testimonials.html', testimonials=page.items, page=page)
 
 
 @admin.route('/testimonials/add', methods=['GET', 'POST'])
@@ -739,8 +811,9 @@ def delete_testimonial(t_id):
 @admin.route('/referrals')
 @role_required('admin')
 def referrals():
-    all_referrals = DoctorReferral.query.order_by(DoctorReferral.created_at.desc()).all()
-    return render_template('admin/referrals.html', referrals=all_referrals)
+    page = paginate_request(DoctorReferral.query, DoctorReferral.created_at, DoctorReferral.id,
+                            request.args)
+    return render_template('admin/referrals.html', referrals=page.items, page=page)
 
 
 @admin.route('/referrals/add', methods=['GET', 'POST'])
@@ -785,8 +858,9 @@ def delete_referral(ref_id):
 @admin.route('/enquiries')
 @role_required('admin')
 def enquiries():
-    all_enquiries = ContactEnquiry.query.order_by(ContactEnquiry.created_at.desc()).all()
-    return render_template('admin/enquiries.html', enquiries=all_enquiries)
+    page = paginate_request(ContactEnquiry.query, ContactEnquiry.created_at, ContactEnquiry.id,
+                            request.args)
+    return render_template('admin/enquiries.html', enquiries=page.items, page=page)
 
 
 @admin.route('/enquiries/<int:enquiry_id>/read', methods=['POST'])
@@ -816,42 +890,19 @@ def delete_enquiry(enquiry_id):
 @role_required('admin')
 def analytics():
     today = datetime.utcnow().date()
-
-    # Today's stats
-    today_bookings = Booking.query.filter(
-        func.date(Booking.booking_date) == today
-    ).count()
-    today_revenue = db.session.query(func.sum(Test.price)).join(
-        Booking, Booking.test_id == Test.id
-    ).filter(Booking.status == 'completed',
-             func.date(Booking.booking_date) == today).scalar() or 0
-
-    # This month
     month_start = today.replace(day=1)
-    monthly_bookings = Booking.query.filter(Booking.booking_date >= month_start).count()
-    monthly_revenue = db.session.query(func.sum(Test.price)).join(
-        Booking, Booking.test_id == Test.id
-    ).filter(Booking.status == 'completed',
-             Booking.booking_date >= month_start).scalar() or 0
-
-    # Total all time
-    total_revenue = db.session.query(func.sum(Test.price)).join(
-        Booking, Booking.test_id == Test.id
-    ).filter(Booking.status == 'completed').scalar() or 0
-
-    # Top tests (most booked)
-    top_tests = db.session.query(
-        Test.name, func.count(Booking.id).label('count')
-    ).join(Booking, Booking.test_id == Test.id
-    ).group_by(Test.name).order_by(func.count(Booking.id).desc()).limit(5).all()
-
-    # Booking status breakdown
-    status_counts = db.session.query(
-        Booking.status, func.count(Booking.id)
-    ).group_by(Booking.status).all()
+
+    # Figures come from the daily_stats rollup, not a scan of bookings
+    today_bookings = daily_stats.bookings_between(today, today)
+    today_revenue = daily_stats.revenue_between(today, today)
+    monthly_bookings = daily_stats.bookings_between(month_start)
+    monthly_revenue = daily_stats.revenue_between(month_start)
+    total_revenue = daily_stats.revenue_between()
+    top_tests = daily_stats.top_tests(5)
+    status_counts = daily_stats.status_counts()
 
     # Recent activity
-    recent_activity = ActivityLog.query.order_by(
+    recent_activity = ActivityLog.query.options(*view_loaders('admin.analytics')).order_by(
         ActivityLog.created_at.desc()
     ).limit(20).all()
 
@@ -862,7 +913,7 @@ def analytics():
                            monthly_revenue=monthly_revenue,
                            total_revenue=total_revenue,
                            top_tests=top_tests,
-                           status_counts=dict(status_counts),
+                           status_counts=status_counts,
                            recent_activity=recent_activity)
 
 
@@ -872,7 +923,8 @@ def analytics():
 @admin.route('/activity-log')
 @role_required('admin')
 def activity_log():
-    logs = ActivityLog.query.order_by(ActivityLog.created_at.desc()).limit(100).all()
+    logs = ActivityLog.query.options(*view_loaders('admin.activity_log'))\
+        .order_by(ActivityLog.created_at.desc()).limit(100).all()
     return render_template('admin/activity_log.html', logs=logs)
 
 
@@ -908,52 +960,95 @@ def settings():
 # ═══════════════════════════════════════════════════════
 #  CSV EXPORTS
 # ═══════════════════════════════════════════════════════
+EXPORT_BATCH_SIZE = 1000
+
+
+class _CSVLine:
+    """File-like sink that hands each csv.writer row straight back."""
+    def write(self, value):
+        return value
+
+
+def _stream_csv(header, rows, chunk_rows=200):
+    """Yield CSV text in small chunks as rows arrive from the cursor."""
+    writer = csv.writer(_CSVLine())
+    chunk = [writer.writerow(header)]
+    for row in rows:
+        chunk.append(writer.writerow(row))
+        if len(chunk) >= chunk_rows:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+
+def _csv_response(filename, header, rows):
+    return Response(stream_with_context(_stream_csv(header, rows)), mimetype='text/csv',
+                    headers={'Content-Disposition': f'attachment;filename={filename}'})
+
+
+def _fmt_date(value):
+    return value.strftime('%Y-%m-%d') if value else ''
+
+
 @admin.route('/export/patients')
 @role_required('admin')
 def export_patients():
-    patients = User.query.filter_by(role='patient').all()
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(['ID', 'Name', 'Email', 'Phone', 'Address', 'Bookings', 'Joined'])
-    for p in patients:
-        writer.writerow([p.id, p.name, p.email, p.phone, p.address,
-                         len(p.bookings), p.created_at.strftime('%Y-%m-%d')])
+    booking_counts = db.session.query(
+        Booking.user_id, func.count(Booking.id).label('n')
+    ).group_by(Booking.user_id).subquery()
+
+    query = db.session.query(
+        User.id, User.name, User.email, User.phone, User.address,
+        func.coalesce(booking_counts.c.n, 0), User.created_at
+    ).outerjoin(booking_counts, booking_counts.c.user_id == User.id)\
+        .filter(User.role == 'patient')\
+        .order_by(User.id)\
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+
     log_activity('Exported patients CSV')
-    return Response(output.getvalue(), mimetype='text/csv',
-                    headers={'Content-Disposition': 'attachment;filename=patients.csv'})
+    rows = ((pid, name, email, phone, address, count, _fmt_date(created))
+            for pid, name, email, phone, address, count, created in query)
+    return _csv_response('patients.csv',
+                         ['ID', 'Name', 'Email', 'Phone', 'Address', 'Bookings', 'Joined'],
+                         rows)
 
 
 @admin.route('/export/bookings')
 @role_required('admin')
 def export_bookings():
-    bookings = Booking.query.order_by(Booking.created_at.desc()).all()
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(['ID', 'Patient', 'Test', 'Date', 'Time', 'Status',
-                     'Home Collection', 'Payment', 'Created'])
-    for b in bookings:
-        writer.writerow([b.id, b.user.name, b.test.name,
-                         b.booking_date.strftime('%Y-%m-%d'), b.slot_time,
-                         b.status, 'Yes' if b.home_collection else 'No',
-                         b.payment_status, b.created_at.strftime('%Y-%m-%d')])
+    query = db.session.query(
+        Booking.id, User.name, Test.name, Booking.booking_date, Booking.slot_time,
+        Booking.status, Booking.home_collection, Booking.payment_status, Booking.created_at
+    ).join(User, Booking.user_id == User.id)\
+        .join(Test, Booking.test_id == Test.id)\
+        .order_by(Booking.created_at.desc())\
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+
     log_activity('Exported bookings CSV')
-    return Response(output.getvalue(), mimetype='text/csv',
-                    headers={'Content-Disposition': 'attachment;filename=bookings.csv'})
+    rows = ((bid, patient, test, _fmt_date(date), slot, status,
+             'Yes' if home else 'No', payment, _fmt_date(created))
+            for bid, patient, test, date, slot, status, home, payment, created in query)
+    return _csv_response('bookings.csv',
+                         ['ID', 'Patient', 'Test', 'Date', 'Time', 'Status',
+                          'Home Collection', 'Payment', 'Created'],
+                         rows)
 
 
 @admin.route('/export/reports')
 @role_required('admin')
 def export_reports():
-    reports = Report.query.order_by(Report.uploaded_at.desc()).all()
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(['ID', 'Patient Name', 'Token Number', 'Remarks', 'Uploaded'])
-    for r in reports:
-        writer.writerow([r.id, r.patient_name, r.token_number,
-                         r.remarks, r.uploaded_at.strftime('%Y-%m-%d')])
+    query = db.session.query(
+        Report.id, Report.patient_name, Report.token_number, Report.remarks, Report.uploaded_at
+    ).order_by(Report.uploaded_at.desc())\
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+
     log_activity('Exported reports CSV')
-    return Response(output.getvalue(), mimetype='text/csv',
-                    headers={'Content-Disposition': 'attachment;filename=reports.csv'})
+    rows = ((rid, name, token, remarks, _fmt_date(uploaded))
+            for rid, name, token, remarks, uploaded in query)
+    return _csv_response('reports.csv',
+                         ['ID', 'Patient Name', 'Token Number', 'Remarks', 'Uploaded'],
+                         rows)
 
 
 # ═══════════════════════════════════════════════════════
@@ -981,12 +1076,9 @@ def upload_template():
         flash('Only image files (PNG, JPG, WEBP) are allowed.', 'error')
         return redirect(url_for('admin.report_templates'))
 
-    tpl_dir = os.path.join(current_app.static_folder, 'images', 'templates')
-    os.makedirs(tpl_dir, exist_ok=True)
     filename = secure_filename(f"tpl_{int(datetime.utcnow().timestamp())}_{file.filename}")
-    file.save(os.path.join(tpl_dir, filename))
-
-    tpl = ReportTemplate(name=name, file_path=filename)
+    tpl = ReportTemplate(name=name, file_path=filename,
+                         file_hash=storage.save(file.stream, file.mimetype or f'image/{ext}'))
     db.session.add(tpl)
     db.session.commit()
     log_activity('Uploaded report template', name)
@@ -994,18 +1086,34 @@ def upload_template():
     return redirect(url_for('admin.report_templates'))
 
 
+@admin.route('/report-templates/<int:tpl_id>/image')
+@role_required('admin')
+def template_image(tpl_id):
+    tpl = ReportTemplate.query.get_or_404(tpl_id)
+    blob = storage.stat(tpl.file_hash)
+    if blob is None:
+        # Uploaded before storage.py: still under static/
+        return redirect(url_for('static', filename='images/templates/' + tpl.file_path))
+    if request.args.get('v') == blob.digest[:16]:
+        return send_blob(blob, max_age=365 * 24 * 3600)  # this URL names these bytes
+    return send_blob(blob, max_age=0)
+
+
 @admin.route('/report-templates/<int:tpl_id>/delete', methods=['POST'])
 @role_required('admin')
 def delete_template(tpl_id):
     tpl = ReportTemplate.query.get_or_404(tpl_id)
-    # Delete file
-    tpl_path = os.path.join(current_app.static_folder, 'images', 'templates', tpl.file_path)
-    if os.path.exists(tpl_path):
-        os.remove(tpl_path)
+    file_hash = tpl.file_hash
+    if file_hash:
+        storage.release(file_hash)
+    else:
+        tpl_path = os.path.join(current_app.static_folder, 'images', 'templates', tpl.file_path)
+        if os.path.exists(tpl_path):
+            os.remove(tpl_path)
     name = tpl.name
     db.session.delete(tpl)
     db.session.commit()
-    db.session.commit()
+    storage.purge([file_hash])
     log_activity('Deleted report template', name)
     flash(f'Template "{name}" deleted.', 'success')
     return redirect(url_for('admin.report_templates'))
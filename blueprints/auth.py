@@ -1,9 +1,12 @@
 import os
+import threading
+from datetime import timedelta
 from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, session, jsonify
 from flask_login import login_user, logout_user, login_required, current_user
 from werkzeug.utils import secure_filename
 from models import User
 from extensions import db
+import mail_queue
 
 auth = Blueprint('auth', __name__)
 
@@ -24,6 +27,7 @@ def login():
         user = User.query.filter((User.email == login_id) | (User.phone == login_id)).first()
 
         if user and user.password_hash and user.check_password(password):
+            db.session.commit()  # keeps the hash if check_password re-hashed it
             login_user(user)
             
             # Smart Redirect
@@ -50,10 +54,8 @@ def generate_otp(length=6):
     return ''.join(random.choices(string.digits, k=length))
 
 def send_otp_email(to_email, otp, purpose="Registration"):
+    """Queue the OTP email. Commit, then call mail_queue.dispatch()."""
     try:
-        from flask_mail import Message
-        from extensions import mail
-        
         subject_map = {
             "Registration": "Verify Account - LifeCare Pathology",
             "Login": "Login OTP - LifeCare Pathology",
@@ -61,9 +63,9 @@ def send_otp_email(to_email, otp, purpose="Registration"):
         }
         subject = subject_map.get(purpose, "Verification Code")
 
-        msg = Message(
-            subject=subject,
-            recipients=[to_email],
+        mail_queue.queue_mail(
+            subject,
+            [to_email],
             body=f"Your {purpose} verification code is: {otp}\n\nValid for 10 minutes.",
             html=f"""
             <div style="font-family: Arial, sans-serif; padding: 20px; border: 1px solid #e0e0e0; border-radius: 10px; max-width: 500px;">
@@ -75,9 +77,9 @@ def send_otp_email(to_email, otp, purpose="Registration"):
                 </div>
                 <p>If you did not request this, please ignore this email.</p>
             </div>
-            """
+            """,
+            expires_in=timedelta(minutes=10)  # the code's stated validity
         )
-        mail.send(msg)
         return True
     except Exception as e:
         print(f"Error sending OTP to {to_email}: {e}")
@@ -115,6 +117,8 @@ def send_otp():
 
         # Send Email
         if send_otp_email(email, otp, purpose):
+            db.session.commit()
+            mail_queue.dispatch()
             return jsonify({'success': True, 'message': 'OTP sent successfully!'})
         else:
             return jsonify({'success': False, 'message': 'Failed to send OTP.'}), 500
@@ -222,9 +226,10 @@ def logout():
 # ============================================================
 #                    OAUTH SOCIAL LOGIN
 # ============================================================
-from authlib.integrations.flask_client import OAuth
-
-oauth = OAuth()
+# authlib is imported and the clients registered on first use under
+# FAST_STARTUP, so cold starts that never touch social login skip it.
+_oauth = None
+_oauth_lock = threading.Lock()
 _registered_providers = set()  # Track which providers are actually configured
 
 
@@ -283,9 +288,10 @@ def db_migrate_oauth():
     except Exception as e:
         return f"Migration Error: {str(e)}"
 
-def init_oauth(app):
-    """Initialize OAuth with the Flask app."""
-    oauth.init_app(app)
+def _create_oauth(app):
+    """Build the OAuth registry and register the configured providers."""
+    from authlib.integrations.flask_client import OAuth
+    oauth = OAuth(app)
 
     # Google
     if app.config.get('GOOGLE_CLIENT_ID'):
@@ -300,8 +306,23 @@ def init_oauth(app):
         print(f"✅ Google OAuth registered with client_id: {app.config['GOOGLE_CLIENT_ID'][:20]}...")
     else:
         print("⚠️ Google OAuth not configured (GOOGLE_CLIENT_ID missing)")
+    return oauth
 
 
+def get_oauth():
+    global _oauth
+    if _oauth is None:
+        with _oauth_lock:
+            if _oauth is None:
+                _oauth = _create_oauth(current_app._get_current_object())
+    return _oauth
+
+
+def init_oauth(app):
+    """Initialize OAuth with the Flask app (deferred to first use under FAST_STARTUP)."""
+    global _oauth
+    if not app.config['FAST_STARTUP']:
+        _oauth = _create_oauth(app)
 
 
 def _handle_oauth_user(provider, oauth_id, email, name, picture=None):
@@ -349,6 +370,7 @@ def _handle_oauth_user(provider, oauth_id, email, name, picture=None):
 # --- Google OAuth Routes ---
 @auth.route('/auth/google')
 def google_login():
+    oauth = get_oauth()
     if 'google' not in _registered_providers:
         flash('Google login is not configured.', 'error')
         return redirect(url_for('auth.login'))
@@ -361,6 +383,7 @@ def google_login():
 @auth.route('/auth/google/callback')
 def google_callback():
     try:
+        oauth = get_oauth()
         token = oauth.google.authorize_access_token()
         user_info = token.get('userinfo')
         if not user_info:
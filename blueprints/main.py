@@ -1,6 +1,15 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, send_file, current_app
-from models import Test, TestCategory, ContactEnquiry, Testimonial, Report
+from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, jsonify
+from flask_login import current_user
+from sqlalchemy import or_
+from models import ContactEnquiry, Testimonial, Report
 from extensions import db
+from catalogue import get_catalogue, tests_in_category
+import search
+import storage
+import throttle
+import report_access
+import report_links
+from downloads import send_blob
 import os
 
 main = Blueprint('main', __name__)
@@ -8,8 +17,9 @@ main = Blueprint('main', __name__)
 
 @main.route('/')
 def home():
-    categories = TestCategory.query.all()
-    popular_tests = Test.query.filter_by(is_active=True).limit(6).all()
+    catalogue = get_catalogue()
+    categories = catalogue.categories
+    popular_tests = catalogue.featured
     testimonials = Testimonial.query.filter_by(is_approved=True).order_by(Testimonial.created_at.desc()).limit(6).all()
     return render_template('home.html', categories=categories, popular_tests=popular_tests, testimonials=testimonials)
 
@@ -21,23 +31,31 @@ def about():
 
 @main.route('/services')
 def services():
-    categories = TestCategory.query.all()
+    catalogue = get_catalogue()
+    categories = catalogue.categories
     selected_category = request.args.get('category', '')
     search_query = request.args.get('q', '').strip()
-
-    query = Test.query.filter_by(is_active=True)
-
-    if selected_category:
-        query = query.filter_by(category_id=int(selected_category))
+    category_id = int(selected_category) if selected_category else None
 
     if search_query:
-        query = query.filter(Test.name.ilike(f'%{search_query}%'))
-
-    tests = query.order_by(Test.name).all()
+        tests = search.search_tests(search_query, category_id=category_id)
+    elif category_id is not None:
+        tests = tests_in_category(catalogue, category_id)
+    else:
+        tests = catalogue.tests
     return render_template('services.html', tests=tests, categories=categories,
                            selected_category=selected_category, search_query=search_query)
 
 
+@main.route('/api/tests/autocomplete')
+def tests_autocomplete():
+    q = request.args.get('q', '').strip()[:100]
+    results = [s._asdict() for s in search.autocomplete(q)]
+    response = jsonify({'query': q, 'results': results})
+    response.headers['Cache-Control'] = 'public, max-age=60'
+    return response
+
+
 @main.route('/contact', methods=['GET', 'POST'])
 def contact():
     if request.method == 'POST':
@@ -72,42 +90,93 @@ def check_report():
         if not identifier or not password:
             error = 'Please enter both Report ID/Token Number and Password.'
         else:
-            # Search by Report ID (RID format) or Token Number
-            report_obj = None
-            if identifier.upper().startswith('RID'):
-                report_obj = Report.query.filter_by(report_id=identifier.upper()).first()
-            if not report_obj:
-                report_obj = Report.query.filter_by(token_number=identifier).first()
+            # Charged before any query or password hash, so guessing costs nothing here
+            cfg = current_app.config
+            ip = throttle.client_ip()
+            decision = throttle.attempt([
+                ('check-ip', ip, cfg['CHECK_REPORT_IP_LIMIT'], cfg['CHECK_REPORT_WINDOW']),
+                # Per report *and* client: one client's guesses can't lock the patient out
+                ('check-id', f'{ip} {identifier.upper()}',
+                 cfg['CHECK_REPORT_ID_LIMIT'], cfg['CHECK_REPORT_WINDOW']),
+                # Per report from anywhere: caps guessing spread over many addresses
+                ('check-report', identifier.upper(),
+                 cfg['CHECK_REPORT_GLOBAL_LIMIT'], cfg['CHECK_REPORT_GLOBAL_WINDOW']),
+            ])
+            if not decision.allowed:
+                error = f'Too many attempts. Please try again in about {decision.retry_after // 60 + 1} min. ⏳'
+                response = current_app.make_response(
+                    (render_template('check_report.html', report=None, error=error), 429))
+                response.headers['Retry-After'] = str(decision.retry_after)
+                return response
+
+            # Report ID (RID format) or Token Number, in one query; an RID match wins
+            candidates = Report.query.filter(or_(Report.report_id == identifier.upper(),
+                                                 Report.token_number == identifier)).limit(2).all()
+            report_obj = next((r for r in candidates if r.report_id == identifier.upper()),
+                              candidates[0] if candidates else None)
 
             if report_obj and report_obj.check_password(password):
-                report = report_obj
-            else:
-                error = 'Invalid Report ID/Token Number or Password. Please check and try again.'
+                # A logged-in patient who knows the password gets it on their dashboard
+                if report_links.claim(report_obj, current_user):
+                    flash('Report added to your account. 📋', 'success')
+                db.session.commit()  # also keeps the hash if check_password re-hashed it
+                report_access.grant(report_obj)
+                return redirect(url_for('main.check_report', report=report_obj.report_id))
+            error = 'Invalid Report ID/Token Number or Password. Please check and try again.'
+
+    elif request.args.get('report'):
+        # Back from a successful check (or a reload): the session token stands
+        # in for the password until REPORT_ACCESS_TTL runs out
+        report_obj = Report.query.filter_by(report_id=request.args['report'].upper()).first()
+        if report_obj and report_access.can_view(report_obj):
+            report = report_obj
+        else:
+            error = 'Your report session has expired. Please enter the password again.'
 
     return render_template('check_report.html', report=report, error=error)
 
 
+def _send_report(report):
+    """The report's PDF with ETag, conditional GET and Range support (downloads.py)."""
+    if report.file_hash is None:
+        # Uploaded before storage.py: move it over on first download, which
+        # also gives it its content hash (the ETag)
+        digest = storage.import_file(
+            os.path.join(current_app.config['UPLOAD_FOLDER'], report.file_path), 'application/pdf')
+        if digest:
+            claimed = Report.query.filter(Report.id == report.id, Report.file_hash.is_(None))\
+                .update({'file_hash': digest}, synchronize_session=False)
+            if not claimed:
+                storage.release(digest)  # a concurrent download got there first
+            db.session.commit()
+            db.session.refresh(report)
+    blob = storage.stat(report.file_hash)
+    if blob is None:
+        flash('Report file not found. Please contact the lab.', 'error')
+        return redirect(url_for('main.check_report'))
+    return send_blob(blob, download_name=f'Report_{report.report_id}.pdf')
+
+
 @main.route('/download-report/<int:report_id>')
 def download_report(report_id):
     report = Report.query.get_or_404(report_id)
-    file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], report.file_path)
-    if os.path.exists(file_path):
-        return send_file(file_path, as_attachment=True,
-                         download_name=f'Report_{report.report_id}.pdf')
-    flash('Report file not found. Please contact the lab.', 'error')
-    return redirect(url_for('main.check_report'))
+    if not report_access.can_view(report):
+        flash('Please enter your report password to download it. 🔒', 'error')
+        return redirect(url_for('main.check_report'))
+    return _send_report(report)
 
 
 @main.route('/report/<report_id>/download')
 def download_report_by_rid(report_id):
-    """Direct download via QR code — requires report_id in URL."""
-    report = Report.query.filter_by(report_id=report_id.upper()).first_or_404()
-    file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], report.file_path)
-    if os.path.exists(file_path):
-        return send_file(file_path, as_attachment=True,
-                         download_name=f'Report_{report.report_id}.pdf')
-    flash('Report file not found. Please contact the lab.', 'error')
-    return redirect(url_for('main.check_report'))
+    """Direct download via QR code — needs the QR's signature or an open report session."""
+    report = Report.query.filter_by(report_id=report_id.upper()).first()
+    if report is not None and (report_access.has_qr_token(report.report_id, request.args.get('t'))
+                               or report_access.can_view(report)
+                               or report_access.legacy_qr_allowed(report)):
+        return _send_report(report)
+    # Unknown and locked reports look the same, so this can't be used to probe IDs
+    flash('Please enter your report password to download it. 🔒', 'error')
+    return redirect(url_for('main.check_report', identifier=report_id.upper()))
 
 
 @main.route('/appointment', methods=['GET', 'POST'])
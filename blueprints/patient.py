@@ -1,10 +1,15 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app
 from flask_login import current_user, login_required
-from flask_mail import Message
-from models import Booking, Test, TestCategory, Report, BlockedSlot
-from extensions import db, mail
+from sqlalchemy import func
+from models import Booking, Report
+from extensions import db
 from datetime import datetime
 from utils import role_required
+from loaders import view_loaders
+from catalogue import get_catalogue
+from config import Config
+import availability
+import mail_queue
 
 patient = Blueprint('patient', __name__, url_prefix='/patient')
 
@@ -15,18 +20,21 @@ def dashboard():
 
     user_bookings = Booking.query.filter_by(user_id=current_user.id)
 
-    upcoming_bookings = user_bookings.filter(
+    upcoming_bookings = user_bookings.options(*view_loaders('patient.dashboard')).filter(
         Booking.status.in_(['pending', 'confirmed'])
     ).order_by(Booking.booking_date.desc()).limit(5).all()
 
-    total_bookings = user_bookings.count()
-    completed = user_bookings.filter_by(status='completed').count()
-    pending = user_bookings.filter_by(status='pending').count()
+    # One grouped COUNT instead of one query per status
+    counts = dict(db.session.query(Booking.status, func.count(Booking.id))
+                  .filter(Booking.user_id == current_user.id)
+                  .group_by(Booking.status).all())
+    total_bookings = sum(counts.values())
+    completed = counts.get('completed', 0)
+    pending = counts.get('pending', 0)
 
-    # Get reports for this patient (by name match)
-    user_reports = Report.query.filter(
-        Report.patient_name.ilike(f'%{current_user.name}%')
-    ).order_by(Report.uploaded_at.desc()).all()
+    # Reports linked to this account (see report_links)
+    user_reports = Report.query.filter_by(user_id=current_user.id)\
+        .order_by(Report.uploaded_at.desc()).all()
 
     return render_template(
         'patient/dashboard.html',
@@ -38,6 +46,13 @@ def dashboard():
     )
 
 
+def _parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return None
+
+
 @patient.route('/api/check-availability')
 @role_required('patient')
 def check_availability():
@@ -45,50 +60,34 @@ def check_availability():
     if not date_str:
         return jsonify({'error': 'Date required'}), 400
 
-    try:
-        date_obj = datetime.strptime(date_str, '%Y-%m-%d').date()
-    except ValueError:
+    date_obj = _parse_date(date_str)
+    if date_obj is None:
         return jsonify({'error': 'Invalid date'}), 400
 
-    # Check full day block
-    full_block = BlockedSlot.query.filter_by(date=date_obj, time_slot=None).first()
-    if full_block:
-        return jsonify({'full_day_blocked': True, 'reason': full_block.reason})
-
-    # Available slots (Standard 7 AM - 8 PM)
-    all_slots = [
-        "07:00 AM", "08:00 AM", "09:00 AM", "10:00 AM", "11:00 AM", "12:00 PM",
-        "01:00 PM", "02:00 PM", "03:00 PM", "04:00 PM", "05:00 PM", "06:00 PM",
-        "07:00 PM", "08:00 PM"
-    ]
-
-    # Get blocked slots for this date
-    blocked_db = BlockedSlot.query.filter(
-        BlockedSlot.date == date_obj,
-        BlockedSlot.time_slot.isnot(None)
-    ).all()
-    blocked_times = {b.time_slot for b in blocked_db}
+    return jsonify(availability.day_to_dict(
+        availability.day(date_obj, home=request.args.get('home') == '1')))
 
-    # Optional: Check existing bookings if you want to limit slots (e.g. 1 per slot)
-    # booked_db = Booking.query.filter_by(booking_date=date_obj, status='confirmed').all()
-    # booked_times = {b.slot_time for b in booked_db}
-    # blocked_times.update(booked_times)
 
-    response_slots = []
-    for slot in all_slots:
-        response_slots.append({
-            'time': slot,
-            'is_blocked': slot in blocked_times
-        })
+@patient.route('/api/availability')
+@role_required('patient')
+def availability_calendar():
+    """Slot availability for a range of days (one query), for the booking page."""
+    start = _parse_date(request.args.get('start')) or datetime.today().date()
+    days = request.args.get('days', Config.AVAILABILITY_MAX_DAYS, type=int)
+    home = request.args.get('home') == '1'
 
-    return jsonify({'full_day_blocked': False, 'slots': response_slots})
+    return jsonify({
+        'home_collection': home,
+        'days': [availability.day_to_dict(d) for d in availability.calendar(start, days, home)],
+    })
 
 
 @patient.route('/book-test', methods=['GET', 'POST'])
 @role_required('patient')
 def book_test():
-    categories = TestCategory.query.all()
-    tests = Test.query.filter_by(is_active=True).order_by(Test.name).all()
+    catalogue = get_catalogue()
+    categories = catalogue.categories
+    tests = catalogue.tests
 
     if request.method == 'POST':
         test_id = request.form.get('test_id')
@@ -108,7 +107,7 @@ def book_test():
             flash('Please fill in all required fields.', 'error')
             return render_template('patient/book_test.html', categories=categories, tests=tests)
 
-        test = Test.query.get(test_id)
+        test = catalogue.tests_by_id.get(int(test_id)) if test_id.isdigit() else None
         if not test:
             flash('Invalid test selected.', 'error')
             return redirect(url_for('patient.book_test'))
@@ -124,11 +123,10 @@ def book_test():
             return redirect(url_for('patient.book_test'))
 
         # Check availability again server-side
-        if BlockedSlot.query.filter(
-            (BlockedSlot.date == booking_date) & 
-            ((BlockedSlot.time_slot == slot_time) | (BlockedSlot.time_slot == None))
-        ).first():
-            flash('Selected slot is unavailable. Please choose another.', 'error')
+        try:
+            availability.check_slot(booking_date, slot_time, home_collection)
+        except availability.SlotUnavailable as e:
+            flash(f'{e} Please choose another.', 'error')
             return redirect(url_for('patient.book_test'))
 
         booking = Booking(
@@ -150,15 +148,20 @@ def book_test():
         )
 
         db.session.add(booking)
-        db.session.commit()
+        try:
+            # The capacity check is repeated atomically as the booking is written
+            db.session.commit()
+        except availability.SlotUnavailable as e:
+            db.session.rollback()
+            flash(f'{e} Please choose another.', 'error')
+            return redirect(url_for('patient.book_test'))
 
         # ── Send Email Notifications ──
+        # Queued and sent off the request (see mail_queue.py)
         try:
             # 1. Email to Patient
             if patient_email:
-                msg = Message(f'Booking Confirmed - {test.name}',
-                              recipients=[patient_email])
-                msg.body = f"""Dear {patient_name},
+                mail_queue.queue_mail(f'Booking Confirmed - {test.name}', [patient_email], body=f"""Dear {patient_name},
 
 Your appointment for {test.name} has been booked successfully.
 
@@ -171,20 +174,19 @@ Please pay ₹{test.price} at the time of collection/visit.
 
 Thank you,
 Life Care Pathology Lab
-                """
-                mail.send(msg)
+                """)
 
             # 2. Email to Admin (Default Sender)
-            admin_msg = Message(f'New Booking: {test.name}',
-                                recipients=[current_app.config.get('MAIL_USERNAME')])
-            admin_msg.body = f"""New Booking Received!
+            mail_queue.queue_mail(f'New Booking: {test.name}',
+                                  [current_app.config.get('MAIL_USERNAME')], body=f"""New Booking Received!
 
 Patient: {patient_name} ({patient_phone})
 Test: {test.name}
 Date: {booking_date_str} | Time: {slot_time}
 Type: {'Home Collection' if home_collection else 'Lab Visit'}
-            """
-            mail.send(admin_msg)
+            """)
+            db.session.commit()
+            mail_queue.dispatch()
         except Exception as e:
             print(f"Email Error: {e}")
             # Don't rollback booking if email fails, just log it.
@@ -199,7 +201,8 @@ Type: {'Home Collection' if home_collection else 'Lab Visit'}
 @role_required('patient')
 def my_bookings():
 
-    bookings = Booking.query.filter_by(user_id=current_user.id).order_by(
+    bookings = Booking.query.options(*view_loaders('patient.my_bookings'))\
+        .filter_by(user_id=current_user.id).order_by(
         Booking.created_at.desc()
     ).all()
 
@@ -218,7 +221,7 @@ def profile():
 
         if name:
             current_user.name = name
-        if phone:
+        if phone and phone != current_user.phone:
             current_user.phone = phone
 
         current_user.address = address
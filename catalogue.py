@@ -0,0 +1,160 @@
+"""
+Versioned in-process cache of the test catalogue.
+
+Categories, tests and their parameters change a few times a month but are
+read on nearly every public page, so each process keeps one immutable
+snapshot of them and serves views from it.
+
+Coherence across processes / serverless instances comes from a version
+token in site_settings ('catalogue_version'). Any insert, update or delete
+of a Test, TestCategory or TestParameter writes a new token in the same
+transaction. Readers compare the token with their snapshot's — a single
+primary-key lookup, done at most every CATALOGUE_VERSION_TTL seconds — and
+rebuild when it has moved.
+"""
+import threading
+import uuid
+from collections import namedtuple
+from datetime import datetime
+from types import MappingProxyType
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, object_session, selectinload
+from config import Config
+from extensions import db
+from cache import TTLCache
+from models import Test, TestCategory, TestParameter, SiteSettings
+
+VERSION_KEY = 'catalogue_version'
+FEATURED_COUNT = 6
+
+CatalogueCategory = namedtuple('CatalogueCategory', [
+    'id', 'name', 'icon', 'description', 'test_count',
+])
+
+CatalogueTest = namedtuple('CatalogueTest', [
+    'id', 'name', 'category_id', 'category_name', 'price', 'description',
+    'sample_type', 'report_time', 'is_active', 'parameters',
+])
+
+
+class CatalogueParameter(namedtuple('CatalogueParameter', [
+        'id', 'parameter_name', 'unit', 'normal_range_text',
+        'normal_range_min', 'normal_range_max', 'display_order'])):
+    __slots__ = ()
+
+    def to_dict(self):
+        return self._asdict()
+
+
+# tests: active tests by name; featured: the first active tests by id (home
+# page); tests_by_id: every test, active or not
+Catalogue = namedtuple('Catalogue', [
+    'version', 'categories', 'categories_by_id', 'tests', 'featured', 'tests_by_id',
+])
+
+_version_cache = TTLCache(ttl=Config.CATALOGUE_VERSION_TTL, maxsize=1)
+_lock = threading.Lock()
+_snapshot = None
+
+
+def _read_version():
+    return db.session.execute(
+        select(SiteSettings.value).where(SiteSettings.key == VERSION_KEY)
+    ).scalar()
+
+
+def current_version():
+    """The catalogue version token in the database (briefly cached)."""
+    if not Config.CATALOGUE_VERSION_TTL:
+        return _read_version()
+    return _version_cache.get_or_set(VERSION_KEY, _read_version)
+
+
+def _build(version):
+    categories = TestCategory.query.order_by(TestCategory.id).all()
+    tests = Test.query.options(selectinload(Test.parameters)).order_by(Test.id).all()
+    category_names = {c.id: c.name for c in categories}
+
+    all_tests = tuple(
+        CatalogueTest(
+            t.id, t.name, t.category_id, category_names.get(t.category_id, ''),
+            t.price, t.description or '', t.sample_type, t.report_time, bool(t.is_active),
+            tuple(CatalogueParameter(p.id, p.parameter_name, p.unit, p.normal_range_text,
+                                     p.normal_range_min, p.normal_range_max, p.display_order)
+                  for p in t.parameters))
+        for t in tests)
+    active = [t for t in all_tests if t.is_active]
+
+    test_counts = {}
+    for t in all_tests:
+        test_counts[t.category_id] = test_counts.get(t.category_id, 0) + 1
+    all_categories = tuple(
+        CatalogueCategory(c.id, c.name, c.icon, c.description or '', test_counts.get(c.id, 0))
+        for c in categories)
+
+    return Catalogue(
+        version=version,
+        categories=all_categories,
+        categories_by_id=MappingProxyType({c.id: c for c in all_categories}),
+        tests=tuple(sorted(active, key=lambda t: t.name.lower())),
+        featured=tuple(active[:FEATURED_COUNT]),
+        tests_by_id=MappingProxyType({t.id: t for t in all_tests}),
+    )
+
+
+def get_catalogue():
+    """The current catalogue snapshot, rebuilt if the version has moved."""
+    global _snapshot
+    version = current_version()
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.version == version:
+        return snapshot
+
+    with _lock:
+        if _snapshot is None or _snapshot.version != version:
+            _snapshot = _build(version)
+        return _snapshot
+
+
+def tests_in_category(catalogue, category_id):
+    return [t for t in catalogue.tests if t.category_id == category_id]
+
+
+def invalidate_local():
+    """Forget this process's snapshot and cached version token."""
+    global _snapshot
+    _snapshot = None
+    _version_cache.invalidate()
+
+
+# ── Write side ──
+def _bump_version(mapper, connection, target):
+    table = SiteSettings.__table__
+    token = uuid.uuid4().hex
+    result = connection.execute(
+        table.update().where(table.c.key == VERSION_KEY)
+        .values(value=token, updated_at=datetime.utcnow()))
+    if result.rowcount == 0:
+        connection.execute(table.insert().values(key=VERSION_KEY, value=token,
+                                                 updated_at=datetime.utcnow()))
+    session = object_session(target)
+    if session is not None:
+        session.info['catalogue_changed'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _after_commit(session):
+    # Other processes notice the new token on their next version check;
+    # this one shouldn't have to wait out the TTL.
+    if session.info.pop('catalogue_changed', False):
+        invalidate_local()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _after_rollback(session):
+    session.info.pop('catalogue_changed', None)
+
+
+for _model in (Test, TestCategory, TestParameter):
+    for _event in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(_model, _event, _bump_version)
@@ -0,0 +1,131 @@
+"""
+HTTP behaviour check for report downloads (downloads.py).
+
+Stores a PDF-sized file in a throwaway SQLite database and local store,
+then replays what browsers, QR-scanning phones and resuming mobile viewers
+send against the signed /report/<RID>/download link and checks each answer:
+
+  * first GET: 200, strong ETag, Last-Modified, `private, no-cache`
+  * If-None-Match / If-Modified-Since: 304 with no body
+  * Range (including suffix and open-ended): 206 with just those bytes
+  * unsatisfiable Range: 416; multiple ranges or a stale If-Range: full 200
+  * DOWNLOAD_OFFLOAD=x-accel / x-sendfile: empty body plus the header
+  * a pre-storage file on disk is imported on first download
+
+Usage:
+    python check_downloads.py
+"""
+import os
+import shutil
+import sys
+import tempfile
+
+_db_fd, _db_path = tempfile.mkstemp(suffix='.db')
+_root = tempfile.mkdtemp(prefix='downloads-')
+os.environ['DATABASE_URL'] = f'sqlite:///{_db_path}'
+os.environ['STORAGE_BACKEND'] = 'local'
+os.environ['STORAGE_ROOT'] = os.path.join(_root, 'store')
+os.environ['STORAGE_CHUNK_SIZE'] = str(16 * 1024)
+
+from config import Config
+Config.SQLALCHEMY_ENGINE_OPTIONS = {}  # Postgres-only connect args
+
+from app import app
+from extensions import db
+from models import Report
+import report_access
+import storage
+
+PAYLOAD = os.urandom(300 * 1024)
+LEGACY = b'%PDF-1.4 legacy upload ' * 500
+
+
+def setup():
+    app.config['UPLOAD_FOLDER'] = os.path.join(_root, 'uploads')
+    os.makedirs(app.config['UPLOAD_FOLDER'])
+    with open(os.path.join(app.config['UPLOAD_FOLDER'], 'legacy.pdf'), 'wb') as f:
+        f.write(LEGACY)
+    with app.app_context():
+        db.session.add(Report(report_id='RID900001', patient_name='Check', token_number='C1',
+                              password_hash='x', file_path='check.pdf',
+                              file_hash=storage.save(PAYLOAD, 'application/pdf')))
+        db.session.add(Report(report_id='RID900002', patient_name='Legacy', token_number='C2',
+                              password_hash='x', file_path='legacy.pdf'))
+        db.session.commit()
+
+
+def main():
+    setup()
+    client = app.test_client()
+    with app.test_request_context():
+        url, legacy_url = report_access.qr_url('RID900001'), report_access.qr_url('RID900002')
+    size = len(PAYLOAD)
+    results = []
+
+    def expect(label, response, status, body=None, **headers):
+        problems = []
+        if response.status_code != status:
+            problems.append(f'HTTP {response.status_code}, wanted {status}')
+        if body is not None and response.get_data() != body:
+            problems.append(f'{len(response.get_data())} bytes, wanted {len(body)}')
+        for name, value in headers.items():
+            got = response.headers.get(name.replace('_', '-'))
+            if value is True and not got or value is not True and got != value:
+                problems.append(f'{name}: {got!r}')
+        results.append((label, problems))
+        print(f"{'ok  ' if not problems else 'FAIL'} {label}" + (f"  ({'; '.join(problems)})" if problems else ''))
+
+    first = client.get(url)
+    etag, modified = first.headers.get('ETag'), first.headers.get('Last-Modified')
+    expect('GET', first, 200, PAYLOAD, ETag=True, Last_Modified=True, Accept_Ranges='bytes',
+           Content_Length=str(size))
+    cache_control = first.headers.get('Cache-Control', '')
+    if 'private' not in cache_control or 'no-cache' not in cache_control or \
+            'max-age' in cache_control or etag.startswith('W/'):
+        results.append(('cache headers', [first.headers.get('Cache-Control'), etag]))
+        print(f"FAIL cache headers ({first.headers.get('Cache-Control')}, {etag})")
+
+    expect('If-None-Match', client.get(url, headers={'If-None-Match': etag}), 304, b'')
+    expect('If-Modified-Since', client.get(url, headers={'If-Modified-Since': modified}), 304, b'')
+    expect('If-None-Match (other)', client.get(url, headers={'If-None-Match': '"nope"'}), 200, PAYLOAD)
+
+    expect('Range first 1000', client.get(url, headers={'Range': 'bytes=0-999'}), 206,
+           PAYLOAD[:1000], Content_Range=f'bytes 0-999/{size}')
+    expect('Range resume', client.get(url, headers={'Range': 'bytes=100000-'}), 206,
+           PAYLOAD[100000:], Content_Range=f'bytes 100000-{size - 1}/{size}')
+    expect('Range suffix', client.get(url, headers={'Range': 'bytes=-500'}), 206, PAYLOAD[-500:])
+    expect('Range unsatisfiable', client.get(url, headers={'Range': f'bytes={size + 10}-'}), 416,
+           Content_Range=f'bytes */{size}')
+    expect('Range multiple', client.get(url, headers={'Range': 'bytes=0-9,20-29'}), 200, PAYLOAD)
+    expect('If-Range match', client.get(url, headers={'Range': 'bytes=0-9', 'If-Range': etag}),
+           206, PAYLOAD[:10])
+    expect('If-Range stale', client.get(url, headers={'Range': 'bytes=0-9', 'If-Range': '"old"'}),
+           200, PAYLOAD)
+
+    app.config['DOWNLOAD_OFFLOAD'] = 'x-accel'
+    expect('X-Accel-Redirect', client.get(url), 200, b'', X_Accel_Redirect=True)
+    expect('X-Accel 304 first', client.get(url, headers={'If-None-Match': etag}), 304, b'')
+    app.config['DOWNLOAD_OFFLOAD'] = 'x-sendfile'
+    expect('X-Sendfile', client.get(url), 200, b'', X_Sendfile=True)
+    app.config['DOWNLOAD_OFFLOAD'] = ''
+
+    legacy = client.get(legacy_url)
+    expect('legacy import', legacy, 200, LEGACY, ETag=True)
+    with app.app_context():
+        imported = Report.query.filter_by(report_id='RID900002').one().file_hash
+    if not imported or legacy.headers.get('ETag') != f'"{imported}"':
+        results.append(('legacy hash stored', [imported]))
+        print(f"FAIL legacy hash stored ({imported})")
+
+    os.close(_db_fd)
+    os.unlink(_db_path)
+    shutil.rmtree(_root, ignore_errors=True)
+    failed = [label for label, problems in results if problems]
+    if failed:
+        print(f"{len(failed)} check(s) failed: {', '.join(failed)}")
+        sys.exit(1)
+    print("✅ Report downloads answer conditional and range requests correctly.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+N+1 query check for the list views.
+
+Renders each view against a throwaway SQLite database at two data sizes,
+counts the SQL statements it emits, and exits non-zero if any view's count
+grows with the number of rows.
+
+Usage:
+    python check_query_counts.py
+"""
+import os
+import sys
+import tempfile
+from datetime import date, timedelta
+
+_db_fd, _db_path = tempfile.mkstemp(suffix='.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{_db_path}'
+
+from config import Config
+Config.SQLALCHEMY_ENGINE_OPTIONS = {}  # Postgres-only connect args
+
+from sqlalchemy import event
+from app import app
+from extensions import db
+from models import (User, Test, TestCategory, Booking, Report, ActivityLog,
+                    ContactEnquiry, Testimonial, DoctorReferral)
+
+ADMIN_VIEWS = [
+    '/admin/dashboard',
+    '/admin/appointments',
+    '/admin/reports',
+    '/admin/activity-log',
+    '/admin/analytics',
+    '/admin/tests',
+    '/admin/categories',
+    '/admin/patients',
+    '/admin/users',
+]
+PATIENT_VIEWS = [
+    '/patient/dashboard',
+    '/patient/my-bookings',
+]
+PUBLIC_VIEWS = [
+    '/',
+    '/services',
+]
+
+PATIENT_EMAIL = 'querycheck@example.com'
+PATIENT_PASSWORD = 'querycheck123'
+
+
+def seed(n):
+    """Add n more rows of everything the views list."""
+    admin = User.query.filter_by(role='admin').first()
+    patient = User.query.filter_by(email=PATIENT_EMAIL).first()
+    if not patient:
+        patient = User(name='Query Check', email=PATIENT_EMAIL, phone='0000000000', role='patient')
+        patient.set_password(PATIENT_PASSWORD)
+        db.session.add(patient)
+        db.session.flush()
+
+    start = User.query.count()
+    for i in range(start, start + n):
+        category = TestCategory(name=f'Category {i}')
+        db.session.add(category)
+        db.session.flush()
+        test = Test(name=f'Test {i}', category_id=category.id, price=100 + i)
+        user = User(name=f'Patient {i}', email=f'patient{i}@example.com', role='patient')
+        db.session.add_all([test, user])
+        db.session.flush()
+        for owner in (user, patient):
+            db.session.add(Booking(user_id=owner.id, test_id=test.id,
+                                   booking_date=date.today() + timedelta(days=i % 5),
+                                   slot_time=Config.SLOT_TIMES[i % len(Config.SLOT_TIMES)],
+                                   status='pending'))
+        db.session.add(Report(report_id=f'RID{900000 + i}', patient_name=f'Patient {i}',
+                              token_number=f'QC{i}', password_hash='x', file_path=f'QC{i}.pdf'))
+        db.session.add(ActivityLog(admin_id=admin.id, action='Query check', details=str(i)))
+        db.session.add(ContactEnquiry(name=f'Enquiry {i}', message='Hello'))
+        db.session.add(Testimonial(reviewer_name=f'Reviewer {i}', review='Good', is_approved=True))
+        db.session.add(DoctorReferral(doctor_name=f'Dr. {i}'))
+    db.session.commit()
+
+
+def count_queries(client, url):
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        response = client.get(url)
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    if response.status_code != 200:
+        raise RuntimeError(f'{url} returned {response.status_code}')
+    return len(statements)
+
+
+def login(client, email, password):
+    client.post('/login', data={'email': email, 'password': password})
+
+
+def measure():
+    admin_client = app.test_client()
+    login(admin_client, 'admin@lifecare.com', 'admin123')
+    patient_client = app.test_client()
+    login(patient_client, PATIENT_EMAIL, PATIENT_PASSWORD)
+    public_client = app.test_client()
+
+    counts = {}
+    for client, urls in ((admin_client, ADMIN_VIEWS),
+                         (patient_client, PATIENT_VIEWS),
+                         (public_client, PUBLIC_VIEWS)):
+        for url in urls:
+            counts[url] = count_queries(client, url)
+    return counts
+
+
+def main():
+    app.config['TESTING'] = True
+    try:
+        with app.app_context():
+            seed(5)
+        small = measure()
+        with app.app_context():
+            seed(20)
+        large = measure()
+    finally:
+        os.close(_db_fd)
+        os.remove(_db_path)
+
+    failed = False
+    print(f"{'View':28s} {'small':>6s} {'large':>6s}")
+    for url in small:
+        grew = large[url] > small[url]
+        failed = failed or grew
+        print(f"{url:28s} {small[url]:6d} {large[url]:6d}{'   <-- grows with rows' if grew else ''}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
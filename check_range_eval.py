@@ -0,0 +1,69 @@
+"""
+Correctness check for normal-range parsing and abnormal flags (range_eval.py).
+
+Runs a table of range texts as lab staff write them — Western and Indian
+(lakh) digit grouping, comparisons, worded limits, gender and age variants
+— through compile_range() and parse_value(), and checks that the stored
+flag (report_results.build_rows) and the PDF/preview flag (flag_results)
+agree with the expected answer for each value.
+
+Usage:
+    python check_range_eval.py
+"""
+import sys
+
+from range_eval import compile_range, flag_results, parse_value
+from report_results import build_rows
+
+# (range text, gender, age, value, expected (low, high) for this patient, expected flag)
+CASES = [
+    ('12.0 - 17.5', None, None, '11.9', (12.0, 17.5), True),
+    ('4,000 - 11,000', None, None, '10,500', (4000.0, 11000.0), False),
+    ('1,50,000 - 4,50,000', None, None, '2,50,000', (150000.0, 450000.0), False),
+    ('1,50,000 - 4,50,000', None, None, '1,20,000', (150000.0, 450000.0), True),
+    ('1,50,000-4,50,000 /cumm', None, None, '4,80,000', (150000.0, 450000.0), True),
+    ('10,00,000 - 12,00,000', None, None, '11,50,000', (1000000.0, 1200000.0), False),
+    ('< 200', None, None, '199', (None, 200.0), False),
+    ('≥ 40', None, None, '39', (40.0, None), True),
+    ('Up to 34', None, None, '34', (None, 34.0), False),
+    ('-2 - 2', None, None, '-2.5', (-2.0, 2.0), True),
+    ('M: 13 - 17; F: 12 - 15.5', 'Female', 30, '16', (12.0, 15.5), True),
+    ('M: 13 - 17; F: 12 - 15.5', 'Male', 30, '16', (13.0, 17.0), False),
+    ('Adult: 0.6 - 1.2, Child: 0.3 - 0.7', None, 8, '0.9', (0.3, 0.7), True),
+    ('Adult: 0.6 - 1.2, Child: 0.3 - 0.7', None, 40, '0.9', (0.6, 1.2), False),
+    ('Male: 1,50,000 - 4,00,000, Female: 1,60,000 - 4,50,000', 'F', 25, '4,20,000',
+     (160000.0, 450000.0), False),
+    ('Negative', None, None, 'Negative', None, None),
+]
+
+VALUES = [('2,50,000', 250000.0), ('4,000', 4000.0), ('1,00,00,000', 10000000.0),
+          ('12.5', 12.5), (' 7 ', 7.0), ('Nil', None), ('', None)]
+
+
+def main():
+    failures = []
+    for raw, expected in VALUES:
+        got = parse_value(raw)
+        if got != expected:
+            failures.append(f'parse_value({raw!r}) = {got!r}, wanted {expected!r}')
+
+    for text, gender, age, value, limits, flag in CASES:
+        result = {'parameter': 'P', 'value': value, 'normal_range': text}
+        row = build_rows([result], gender=gender, age=age)[0]
+        got_limits = (row['range_min'], row['range_max']) if row['range_min'] is not None or \
+            row['range_max'] is not None else None
+        shown = flag_results([dict(result)], gender=gender, age=age)[0]
+        if got_limits != limits or row['is_abnormal'] != flag or shown != flag:
+            failures.append(f'{text!r} ({gender}, {age}) value {value!r}: limits {got_limits}, '
+                            f'stored {row["is_abnormal"]}, shown {shown}; wanted {limits}, {flag}'
+                            f'  [{compile_range(text)}]')
+
+    for failure in failures:
+        print(f'FAIL {failure}')
+    if failures:
+        sys.exit(1)
+    print(f"✅ {len(VALUES)} values and {len(CASES)} ranges parse and flag correctly.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Round-trip check for the report file store.
+
+Runs the same checks against each storage backend — local disk (a temp
+directory), S3 (s3_standin.py, with signature checking) and the database
+(a throwaway SQLite file):
+
+  * saving identical content twice stores it once and counts two refs
+  * full and ranged reads return exactly the right bytes, across chunk
+    boundaries
+  * streaming a large file keeps memory near one chunk, not the file size
+  * the report download route serves the stored PDF
+  * releasing every reference and purging deletes the object
+  * a save whose transaction rolls back leaves no object behind
+
+Usage:
+    python check_storage.py [size in MB]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import tracemalloc
+
+SIZE_MB = float(sys.argv[1]) if len(sys.argv) > 1 else 8
+CHUNK = 64 * 1024
+
+_db_fd, _db_path = tempfile.mkstemp(suffix='.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{_db_path}'
+os.environ['STORAGE_CHUNK_SIZE'] = str(CHUNK)
+
+from config import Config
+Config.SQLALCHEMY_ENGINE_OPTIONS = {}  # Postgres-only connect args
+
+from app import app
+from extensions import db
+from models import BlobChunk, Report, StoredBlob
+from s3_standin import S3StandIn
+import report_access
+import storage
+
+s3 = None  # S3StandIn, started in main()
+
+
+def object_count(name, target, digest):
+    if name == 'local':
+        return int(os.path.exists(target.path(digest)))
+    if name == 's3':
+        return sum(1 for key in s3.objects if key.endswith(digest))
+    return db.session.query(BlobChunk).filter_by(digest=digest).count()
+
+
+def check(name, payload):
+    failures = []
+    app.config['STORAGE_BACKEND'] = name
+    app.extensions.pop('storage_backends', None)
+    with app.app_context():
+        target = storage.backend()
+        first = storage.save(payload, 'application/pdf')
+        second = storage.save(payload, 'application/pdf')
+        db.session.commit()
+        blob = storage.stat(first)
+        if first != second or blob.refs != 2 or object_count(name, target, first) < 1:
+            failures.append(f'dedup: digests {first == second}, refs {blob.refs}')
+
+        if b''.join(storage.stream(blob)) != payload:
+            failures.append('full read differs')
+        size = len(payload)
+        for start, end in ((0, 1), (CHUNK - 3, CHUNK + 5), (size // 2, size // 2 + 3 * CHUNK + 7),
+                           (size - 10, size), (size - 1, None)):
+            got = b''.join(storage.stream(blob, start, end))
+            if got != payload[start:end]:
+                failures.append(f'range {start}-{end}: {len(got)} bytes')
+
+        tracemalloc.start()
+        streamed = sum(len(piece) for piece in storage.stream(blob))
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        if streamed != size or peak > 8 * CHUNK + 512 * 1024:
+            failures.append(f'streaming peak {peak // 1024} KiB for {size // 1024} KiB')
+
+        report = Report(report_id=f'RID9{len(name):05d}', patient_name='Check', token_number=name,
+                        password_hash='x', file_path='check.pdf', file_hash=first)
+        db.session.add(report)
+        db.session.commit()
+        with app.test_request_context():
+            url = report_access.qr_url(report.report_id)
+        response = app.test_client().get(url)
+        if response.status_code != 200 or response.get_data() != payload:
+            failures.append(f'download route: HTTP {response.status_code}')
+        db.session.delete(report)
+
+        storage.release(first)
+        db.session.commit()
+        if storage.purge([first]) != 0:
+            failures.append('purged a blob that still had a reference')
+        storage.release(first)
+        db.session.commit()
+        storage.purge([first])
+        if db.session.get(StoredBlob, first) or object_count(name, target, first):
+            failures.append('object left behind after purge')
+
+        orphan = storage.save(payload[::-1], 'application/pdf')
+        db.session.rollback()
+        if object_count(name, target, orphan):
+            failures.append('object left behind by a rolled-back save')
+
+    print(f"{name:9s} {'ok' if not failures else 'FAILED: ' + '; '.join(failures)}"
+          f"  (streaming peak {peak // 1024} KiB for a {size // 1024} KiB file)")
+    return not failures
+
+
+def main():
+    global s3
+    payload = os.urandom(int(SIZE_MB * 1024 * 1024))
+    root = tempfile.mkdtemp(prefix='storage-')
+    s3 = S3StandIn().start()
+    app.config.update(STORAGE_ROOT=root, STORAGE_CHUNK_SIZE=CHUNK, S3_ENDPOINT_URL=s3.url,
+                      S3_BUCKET='reports', S3_ACCESS_KEY_ID=s3.access_key,
+                      S3_SECRET_ACCESS_KEY=s3.secret_key)
+    try:
+        ok = all([check(name, payload) for name in ('local', 's3', 'database')])
+    finally:
+        s3.stop()
+        shutil.rmtree(root, ignore_errors=True)
+        os.close(_db_fd)
+        os.unlink(_db_path)
+    if not ok:
+        sys.exit(1)
+    print("✅ All storage backends round-trip.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""
+Abuse check for /check-report (throttle.py, report_access.py).
+
+Against a throwaway SQLite database, with each throttle backend:
+
+  * wrong-password attempts on one report from one IP are refused with 429
+    after CHECK_REPORT_ID_LIMIT, attempts from one IP across many reports
+    after CHECK_REPORT_IP_LIMIT, and attempts on one report spread over
+    many IPs after CHECK_REPORT_GLOBAL_LIMIT
+  * refused attempts run no SQL and no password hash
+  * someone else's refused attempts don't lock the patient out
+  * a correct password redirects to the result page, and reloading it and
+    downloading the PDF hash nothing
+  * /download-report/<id> and /report/<RID>/download without a token,
+    admin login or linked account are sent to /check-report; the signed
+    QR link downloads
+
+Usage:
+    python check_throttle.py
+"""
+import os
+import sys
+import tempfile
+import time
+
+_db_fd, _db_path = tempfile.mkstemp(suffix='.db')
+_root = tempfile.mkdtemp(prefix='throttle-')
+os.environ['DATABASE_URL'] = f'sqlite:///{_db_path}'
+os.environ['STORAGE_BACKEND'] = 'local'
+os.environ['STORAGE_ROOT'] = _root
+
+from config import Config
+Config.SQLALCHEMY_ENGINE_OPTIONS = {}  # Postgres-only connect args
+
+from sqlalchemy import event
+from app import app
+from extensions import db
+from models import Report
+import report_access
+import storage
+import throttle
+
+PASSWORD = 'ab12'
+PDF = b'%PDF-1.4 throttle check' * 100
+
+
+class Counter:
+    """Counts SQL statements and password hashes while active."""
+
+    def __init__(self):
+        self.queries = self.hashes = 0
+        self._check = Report.check_password
+
+        def check_password(report, password):
+            self.hashes += 1
+            return self._check(report, password)
+        Report.check_password = check_password
+        with app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', self._query)
+
+    def _query(self, *args):
+        self.queries += 1
+
+    def reset(self):
+        self.queries = self.hashes = 0
+
+
+def setup():
+    with app.app_context():
+        for n in range(30):
+            report = Report(report_id=f'RID8{n:05d}', patient_name='Throttle', token_number=f'T{n}',
+                            file_path='check.pdf', file_hash=storage.save(PDF, 'application/pdf'))
+            report.set_password(PASSWORD)
+            db.session.add(report)
+        db.session.commit()
+
+
+def post(client, identifier, password, ip):
+    return client.post('/check-report', data={'report_identifier': identifier, 'password': password},
+                       environ_base={'REMOTE_ADDR': ip})
+
+
+def check(name, counter):
+    failures = []
+    app.config['THROTTLE_BACKEND'] = name
+    with app.app_context():
+        throttle.counter().clear()
+    id_limit, ip_limit = app.config['CHECK_REPORT_ID_LIMIT'], app.config['CHECK_REPORT_IP_LIMIT']
+
+    # One report, one IP: the per-identifier limit trips
+    client = app.test_client()
+    codes = [post(client, 'RID800000', 'wrong', '10.0.0.1').status_code for _ in range(id_limit + 2)]
+    if codes[:id_limit] != [200] * id_limit or codes[id_limit:] != [429, 429]:
+        failures.append(f'per-report limit: {codes}')
+
+    counter.reset()
+    refused = post(client, 'RID800000', PASSWORD, '10.0.0.1')
+    if refused.status_code != 429 or not refused.headers.get('Retry-After'):
+        failures.append(f'correct password while throttled: HTTP {refused.status_code}')
+    if counter.hashes:
+        failures.append(f'refused attempt hashed {counter.hashes}x')
+    if name == 'memory' and counter.queries:
+        failures.append(f'refused attempt ran {counter.queries} queries')
+
+    owner = post(app.test_client(), 'RID800000', PASSWORD, '10.0.1.1')
+    if owner.status_code != 302:
+        failures.append(f'patient locked out by someone else: HTTP {owner.status_code}')
+
+    # One IP, many reports: the per-IP limit trips
+    codes = [post(client, f'RID8{n + 1:05d}', 'wrong', '10.0.2.1').status_code for n in range(ip_limit + 2)]
+    if codes[:ip_limit] != [200] * ip_limit or codes[ip_limit:] != [429, 429]:
+        failures.append(f'per-IP limit: {codes}')
+
+    # Many IPs, one report: the per-report limit across all clients trips
+    global_limit = app.config['CHECK_REPORT_GLOBAL_LIMIT']
+    codes = [post(app.test_client(), 'RID800025', 'wrong', f'10.1.{n // 250}.{n % 250 + 1}').status_code
+             for n in range(global_limit + 2)]
+    if codes[:global_limit] != [200] * global_limit or codes[global_limit:] != [429, 429]:
+        failures.append(f'per-report limit across IPs: {codes}')
+
+    # A good password from a fresh IP: one hash, then none for reloads and downloads
+    client = app.test_client()
+    counter.reset()
+    found = post(client, 'T29', PASSWORD, '10.0.3.1')
+    location = found.headers.get('Location', '')
+    hashes = counter.hashes
+    page = client.get(location)
+    with app.app_context():
+        report_pk = Report.query.filter_by(report_id='RID800029').one().id
+    again = client.get(location)
+    pdf = client.get(f'/download-report/{report_pk}')
+    if found.status_code != 302 or 'RID800029' not in location:
+        failures.append(f'token lookup: HTTP {found.status_code} -> {location!r}')
+    if page.status_code != 200 or b'Report Found' not in page.get_data() or b'Report Found' not in again.get_data():
+        failures.append('result page not shown from the session')
+    if pdf.status_code != 200 or pdf.get_data() != PDF:
+        failures.append(f'download with token: HTTP {pdf.status_code}')
+    if hashes != 1 or counter.hashes != 1:
+        failures.append(f'{counter.hashes} password hashes for one check, reload and download')
+
+    stranger = app.test_client().get(f'/download-report/{report_pk}')
+    if stranger.status_code != 302 or '/check-report' not in stranger.headers.get('Location', ''):
+        failures.append(f'download without token: HTTP {stranger.status_code}')
+    by_rid = app.test_client().get('/report/RID800029/download')
+    with app.test_request_context():
+        signed = report_access.qr_url('RID800029')
+    scanned = app.test_client().get(signed)
+    if by_rid.status_code != 302 or '/check-report' not in by_rid.headers.get('Location', ''):
+        failures.append(f'RID download without token: HTTP {by_rid.status_code}')
+    if scanned.status_code != 200 or scanned.get_data() != PDF:
+        failures.append(f'signed QR link: HTTP {scanned.status_code}')
+    forged = app.test_client().get(signed.replace('RID800029', 'RID800028'))
+    if forged.status_code != 302:
+        failures.append(f'QR signature reused for another report: HTTP {forged.status_code}')
+    expired = app.test_client().get('/check-report?report=RID800029')
+    if b'Report Found' in expired.get_data():
+        failures.append('result page shown without a token')
+
+    print(f"{name:9s} {'ok' if not failures else 'FAILED: ' + '; '.join(failures)}")
+    return not failures
+
+
+def bench(counter):
+    """Time refused attempts against a full password check."""
+    app.config['THROTTLE_BACKEND'] = 'memory'
+    client = app.test_client()
+    with app.app_context():
+        throttle.counter().clear()
+    for _ in range(app.config['CHECK_REPORT_ID_LIMIT']):
+        post(client, 'RID800001', 'wrong', '10.9.0.1')
+    started = time.perf_counter()
+    for _ in range(200):
+        post(client, 'RID800001', 'wrong', '10.9.0.1')
+    refused = (time.perf_counter() - started) / 200
+    with app.app_context():
+        throttle.counter().clear()
+    started = time.perf_counter()
+    post(client, 'RID800002', 'wrong', '10.9.0.2')
+    checked = time.perf_counter() - started
+    print(f"refused attempt {refused * 1000:.2f} ms, password check {checked * 1000:.1f} ms")
+
+
+def main():
+    setup()
+    counter = Counter()
+    try:
+        ok = all([check(name, counter) for name in ('memory', 'database')])
+        bench(counter)
+    finally:
+        os.close(_db_fd)
+        os.unlink(_db_path)
+    if not ok:
+        sys.exit(1)
+    print("✅ /check-report refuses floods before touching the database or hashing.")
+
+
+if __name__ == "__main__":
+    main()
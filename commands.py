@@ -0,0 +1,200 @@
+import mimetypes
+import os
+import tempfile
+from datetime import timedelta
+import click
+from flask import current_app
+from extensions import db
+from models import Report, ReportTemplate, User
+
+
+def init_database(app):
+    """Create tables, the upload folder and the default admin if missing."""
+    with app.app_context():
+        try:
+            db.create_all()
+            try:
+                os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+            except OSError:
+                print("WARNING: Could not create upload folder (Read-only filesystem?)")
+
+            # Auto-create admin if none exists
+            if not User.query.filter_by(role='admin').first():
+                admin_user = User(
+                    name='Admin',
+                    email='admin@lifecare.com',
+                    phone='',
+                    role='admin'
+                )
+                admin_user.set_password('admin123')
+                db.session.add(admin_user)
+                db.session.commit()
+                print('✅ Default admin user created: admin@lifecare.com / admin123')
+        except Exception as e:
+            print(f"⚠️ Startup Database Connection Failed: {e}")
+            # We do NOT raise the error, so the app can still start and show debug pages
+
+
+def register_commands(app):
+
+    @app.cli.command("init-db")
+    @click.option("--seed", is_flag=True,
+                  help="Also load the sample categories, tests and parameters.")
+    def init_db(seed):
+        """One-shot setup for FAST_STARTUP deployments (tables, admin, uploads)."""
+        init_database(current_app._get_current_object())
+        if seed:
+            from seed_data import seed_data
+            from seed_parameters import seed_test_parameters
+            seed_data()
+            seed_test_parameters()
+        click.echo("Database initialised.")
+
+    @app.cli.command("regenerate-reports")
+    @click.option("--workers", type=int, default=None,
+                  help="Worker processes (default: REPORT_RENDER_WORKERS or one per CPU).")
+    @click.option("--report-id", "report_ids", multiple=True,
+                  help="Only regenerate these RIDs (repeatable).")
+    @click.option("--base-url", default=None,
+                  help="Public site URL used for QR download links.")
+    def regenerate_reports(workers, report_ids, base_url):
+        """Re-render admin-created report PDFs across a process pool."""
+        import storage
+        import report_access
+        from report_batch import job_from_report, render_reports
+
+        # Uploaded PDFs have no structured results and must not be overwritten
+        query = Report.query.filter(Report.test_name != '')
+        if report_ids:
+            query = query.filter(Report.report_id.in_([r.upper() for r in report_ids]))
+        reports = query.order_by(Report.id).all()
+
+        # Workers render into a scratch directory; each PDF is then saved
+        # to storage here, in the parent, as it comes back
+        scratch = tempfile.mkdtemp(prefix='regenerate-')
+        by_rid = {r.report_id: r for r in reports}
+        base_url = base_url or current_app.config['PUBLIC_BASE_URL']
+        with current_app.test_request_context(base_url=base_url):
+            jobs = [
+                job_from_report(r, scratch, report_access.qr_url(r.report_id))
+                for r in reports
+            ]
+
+        workers = workers or current_app.config['REPORT_RENDER_WORKERS']
+        total = len(jobs)
+        failed = 0
+        click.echo(f"Rendering {total} report(s)...")
+        for done, result in enumerate(render_reports(jobs, workers=workers), 1):
+            if result.error:
+                failed += 1
+                click.echo(f"[{done}/{total}] {result.key} FAILED: {result.error}", err=True)
+                continue
+            report = by_rid[result.key]
+            previous = report.file_hash
+            report.file_hash = storage.import_file(result.output_path, 'application/pdf')
+            storage.release(previous)
+            db.session.commit()
+            storage.purge([previous])
+            os.remove(result.output_path)
+            click.echo(f"[{done}/{total}] {result.key} -> {report.file_hash[:12]}")
+        os.rmdir(scratch)
+        click.echo(f"Done: {total - failed} rendered, {failed} failed.")
+
+    @app.cli.command("report-worker")
+    @click.option("--once", is_flag=True, help="Exit when the queue is empty.")
+    @click.option("--poll-interval", type=float, default=2.0, show_default=True,
+                  help="Seconds to sleep when there is nothing to do.")
+    @click.option("--stale-minutes", type=int, default=10, show_default=True,
+                  help="Requeue jobs stuck in 'running' longer than this.")
+    def report_worker(once, poll_interval, stale_minutes):
+        """Process queued report PDF jobs (REPORT_JOB_MODE=worker)."""
+        from report_jobs import run_worker
+
+        click.echo("Report worker started.")
+        run_worker(poll_interval=poll_interval, once=once,
+                   stale_after=timedelta(minutes=stale_minutes))
+
+    @app.cli.command("backfill-daily-stats")
+    def backfill_daily_stats():
+        """Rebuild the daily_stats rollup from the bookings table."""
+        import daily_stats
+
+        rows = daily_stats.backfill()
+        click.echo(f"daily_stats rebuilt: {rows} row(s).")
+
+    @app.cli.command("backfill-slot-usage")
+    def backfill_slot_usage():
+        """Rebuild the slot_usage counters from the bookings table."""
+        import availability
+
+        rows = availability.backfill()
+        click.echo(f"slot_usage rebuilt: {rows} row(s).")
+
+    @app.cli.command("mail-worker")
+    @click.option("--once", is_flag=True, help="Exit when nothing is due.")
+    @click.option("--poll-interval", type=float, default=2.0, show_default=True,
+                  help="Seconds to sleep when there is nothing to do.")
+    @click.option("--stale-minutes", type=int, default=10, show_default=True,
+                  help="Requeue messages stuck in 'sending' longer than this.")
+    def mail_worker(once, poll_interval, stale_minutes):
+        """Send queued emails (MAIL_QUEUE_MODE=worker)."""
+        from mail_queue import run_worker
+
+        click.echo("Mail worker started.")
+        run_worker(poll_interval=poll_interval, once=once,
+                   stale_after=timedelta(minutes=stale_minutes))
+
+    @app.cli.command("mail-purge")
+    @click.option("--days", type=int, default=None,
+                  help="Keep this many days (default MAIL_RETENTION_DAYS).")
+    def mail_purge(days):
+        """Delete sent, failed and expired emails past the retention period."""
+        from mail_queue import purge
+
+        deleted = purge(timedelta(days=days) if days is not None else None)
+        click.echo(f"Deleted {deleted} old email(s).")
+
+    @app.cli.command("backfill-report-results")
+    def backfill_report_results():
+        """Copy test results still held only as JSON into report_results."""
+        import report_results
+
+        done = report_results.backfill()
+        click.echo(f"report_results backfilled for {done} report(s).")
+
+    @app.cli.command("reflag-report-results")
+    def reflag_report_results():
+        """Re-evaluate stored results whose value or range has grouping commas."""
+        import report_results
+
+        changed = report_results.reflag()
+        click.echo(f"{changed} report result(s) re-flagged.")
+
+    @app.cli.command("storage-import")
+    def storage_import():
+        """Move report PDFs and template images from local folders into storage."""
+        import storage
+
+        upload_dir = current_app.config['UPLOAD_FOLDER']
+        template_dir = os.path.join(current_app.static_folder, 'images', 'templates')
+        moved = missing = 0
+        for rows, folder in ((Report.query.filter(Report.file_hash.is_(None)), upload_dir),
+                             (ReportTemplate.query.filter(ReportTemplate.file_hash.is_(None)),
+                              template_dir)):
+            for row in rows.all():
+                content_type = mimetypes.guess_type(row.file_path)[0] or 'application/octet-stream'
+                row.file_hash = storage.import_file(os.path.join(folder, row.file_path), content_type)
+                if row.file_hash:
+                    moved += 1
+                else:
+                    missing += 1
+                db.session.commit()
+        click.echo(f"Imported {moved} file(s) into {current_app.config['STORAGE_BACKEND']} storage; "
+                   f"{missing} file(s) not found on this machine.")
+
+    @app.cli.command("storage-gc")
+    def storage_gc():
+        """Delete stored files no report or template refers to any more."""
+        import storage
+
+        click.echo(f"Purged {storage.purge()} unreferenced blob(s).")
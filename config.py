@@ -1,9 +1,41 @@
 import os
-from sqlalchemy.pool import NullPool
+from sqlalchemy.pool import NullPool, QueuePool
 
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 
 
+def _engine_options(profile, url):
+    """
+    SQLAlchemy engine options for a deployment profile.
+
+    serverless - NullPool: every checkout opens a fresh connection and the
+                 Supabase pooler does the pooling. Nothing is left open when
+                 the instance is frozen.
+    pooled     - QueuePool for long-lived workers (gunicorn on a VM), so
+                 requests reuse warm TLS connections.
+    """
+    options = {"pool_pre_ping": True}
+    if url.startswith("postgresql"):
+        options["connect_args"] = {
+            "connect_timeout": 10
+        }
+    if profile == 'pooled':
+        options.update({
+            "poolclass": QueuePool,
+            "pool_size": int(os.environ.get('DB_POOL_SIZE', 5)),
+            "max_overflow": int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+            "pool_timeout": int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+            # Below the pooler's idle timeout, so we never hand out a dead socket
+            "pool_recycle": int(os.environ.get('DB_POOL_RECYCLE', 280)),
+        })
+    else:
+        options.update({
+            "pool_recycle": 280,
+            "poolclass": NullPool, # Disable client-side pooling for serverless
+        })
+    return options
+
+
 class Config:
     SECRET_KEY = os.environ.get(
         "SECRET_KEY",
@@ -23,17 +55,24 @@ class Config:
 
     SQLALCHEMY_DATABASE_URI = DATABASE_URL
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    SQLALCHEMY_ENGINE_OPTIONS = {
-        "pool_recycle": 280,
-        "pool_pre_ping": True,
-        "poolclass": NullPool, # Disable client-side pooling for serverless
-        "connect_args": {
-            "connect_timeout": 10
-        }
-    }
 
     # Vercel / Serverless Filesystem Handling
     IS_VERCEL = os.environ.get('VERCEL') == '1' or os.environ.get('VERCEL_ENV') is not None
+
+    # Skip db.create_all, admin seeding, Alembic and OAuth registration at
+    # import time; run `flask init-db` once per database instead. On by
+    # default on Vercel, where every cold start imports the app
+    FAST_STARTUP = os.environ.get('FAST_STARTUP', 'true' if IS_VERCEL else 'false').lower() in ['true', 'on', '1']
+
+    # Connection pooling: 'serverless' (NullPool) or 'pooled' (QueuePool,
+    # sized by DB_POOL_SIZE / DB_MAX_OVERFLOW / DB_POOL_TIMEOUT / DB_POOL_RECYCLE).
+    # DB_WARMUP opens that many pooled connections at boot
+    DB_PROFILE = os.environ.get('DB_PROFILE', 'serverless')
+    SQLALCHEMY_ENGINE_OPTIONS = _engine_options(DB_PROFILE, DATABASE_URL)
+    DB_WARMUP = int(os.environ.get('DB_WARMUP', 0))
+
+    # Log per-request connection/query timings and send a Server-Timing header
+    DB_TIMING = os.environ.get('DB_TIMING', 'false').lower() in ['true', 'on', '1']
     
     if IS_VERCEL:
         UPLOAD_FOLDER = "/tmp" # Writable scratch space on Vercel
@@ -42,6 +81,123 @@ class Config:
 
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB
 
+    # Public site URL used when building links outside a request (CLI, workers)
+    PUBLIC_BASE_URL = os.environ.get('PUBLIC_BASE_URL', 'http://localhost:5000')
+
+    # Batch report rendering (flask regenerate-reports). 0 = one process per CPU
+    REPORT_RENDER_WORKERS = int(os.environ.get('REPORT_RENDER_WORKERS', 0)) or None
+
+    # QR codes on generated reports: 'raster' (qrcode + PIL PNG, cached) or
+    # 'vector' (ReportLab's own QR widget). The disk tier lives under UPLOAD_FOLDER
+    REPORT_QR_MODE = os.environ.get('REPORT_QR_MODE', 'raster')
+    QR_CACHE_SIZE = int(os.environ.get('QR_CACHE_SIZE', 256))
+    QR_DISK_CACHE = os.environ.get('QR_DISK_CACHE', 'false').lower() in ['true', 'on', '1']
+
+    # Seconds the admin dashboard counts are cached per process
+    DASHBOARD_CACHE_TTL = int(os.environ.get('DASHBOARD_CACHE_TTL', 30))
+
+    # Seconds a process trusts its catalogue version token before checking
+    # the database again (0 = check on every read). See catalogue.py
+    CATALOGUE_VERSION_TTL = int(os.environ.get('CATALOGUE_VERSION_TTL', 5))
+
+    # Test catalogue search: 'postgres' (tsvector + pg_trgm), 'memory'
+    # (in-process index over the catalogue snapshot) or 'auto' to pick by database
+    SEARCH_BACKEND = os.environ.get('SEARCH_BACKEND', 'auto')
+
+    # Bookable time slots, and how many bookings each slot takes per
+    # collection type before it shows as full
+    SLOT_TIMES = os.environ.get(
+        'SLOT_TIMES',
+        "07:00 AM,08:00 AM,09:00 AM,10:00 AM,11:00 AM,12:00 PM,01:00 PM,"
+        "02:00 PM,03:00 PM,04:00 PM,05:00 PM,06:00 PM,07:00 PM,08:00 PM"
+    ).split(',')
+    SLOT_CAPACITY_LAB = int(os.environ.get('SLOT_CAPACITY_LAB', 4))
+    SLOT_CAPACITY_HOME = int(os.environ.get('SLOT_CAPACITY_HOME', 2))
+    AVAILABILITY_MAX_DAYS = int(os.environ.get('AVAILABILITY_MAX_DAYS', 60))
+
+    # Report PDF generation after create_report: inline / thread / worker.
+    # Vercel freezes the instance after the response, so background threads
+    # can't be relied on there — use 'worker' with a separate process instead.
+    REPORT_JOB_MODE = os.environ.get('REPORT_JOB_MODE', 'inline' if IS_VERCEL else 'thread')
+    REPORT_JOB_THREADS = int(os.environ.get('REPORT_JOB_THREADS', 2))
+    REPORT_JOB_MAX_ATTEMPTS = int(os.environ.get('REPORT_JOB_MAX_ATTEMPTS', 3))
+    REPORT_JOB_RETRY_SECONDS = float(os.environ.get('REPORT_JOB_RETRY_SECONDS', 2))  # doubles per retry
+
+    # Random report IDs each process draws and claims at a time
+    # (report_ids.py). Bigger blocks mean fewer round trips but more claimed
+    # IDs left unused when short-lived (serverless) instances exit.
+    REPORT_ID_BLOCK_SIZE = int(os.environ.get('REPORT_ID_BLOCK_SIZE', 20))
+
+    # Outgoing email: inline / thread / worker, like REPORT_JOB_MODE. Each
+    # run sends everything due over one SMTP session; failures are retried
+    # after MAIL_RETRY_SECONDS, doubling per attempt. Bodies are blanked once
+    # a message is sent or given up on (they can hold OTPs) and the rows are
+    # deleted MAIL_RETENTION_DAYS later (`flask mail-purge`, or the worker).
+    MAIL_QUEUE_MODE = os.environ.get('MAIL_QUEUE_MODE', 'inline' if IS_VERCEL else 'thread')
+    MAIL_QUEUE_BATCH_SIZE = int(os.environ.get('MAIL_QUEUE_BATCH_SIZE', 50))
+    MAIL_QUEUE_MAX_ATTEMPTS = int(os.environ.get('MAIL_QUEUE_MAX_ATTEMPTS', 5))
+    MAIL_RETRY_SECONDS = int(os.environ.get('MAIL_RETRY_SECONDS', 30))
+    MAIL_RETENTION_DAYS = int(os.environ.get('MAIL_RETENTION_DAYS', 7))
+
+    # Where report PDFs and template images are kept (storage.py):
+    # 'local' (STORAGE_ROOT on disk), 's3' (any S3-compatible store) or
+    # 'database' (chunked rows in blob_chunks). Vercel's /tmp doesn't survive
+    # between invocations, so there it defaults to S3 when a bucket is set
+    # and the database otherwise.
+    S3_ENDPOINT_URL = os.environ.get('S3_ENDPOINT_URL', 'https://s3.amazonaws.com')
+    S3_BUCKET = os.environ.get('S3_BUCKET', '')
+    S3_ACCESS_KEY_ID = os.environ.get('S3_ACCESS_KEY_ID', '')
+    S3_SECRET_ACCESS_KEY = os.environ.get('S3_SECRET_ACCESS_KEY', '')
+    S3_REGION = os.environ.get('S3_REGION', 'us-east-1')
+    STORAGE_BACKEND = os.environ.get(
+        'STORAGE_BACKEND', ('s3' if S3_BUCKET else 'database') if IS_VERCEL else 'local')
+    STORAGE_ROOT = os.environ.get('STORAGE_ROOT', os.path.join(BASE_DIR, 'storage'))
+    STORAGE_CHUNK_SIZE = int(os.environ.get('STORAGE_CHUNK_SIZE', 256 * 1024))
+
+    # Report downloads (downloads.py): seconds browsers may keep a PDF
+    # before revalidating with its ETag. 0 (no-cache) because the URL stays
+    # the same when a report is regenerated; revalidation is a 304. Behind nginx / Apache, set
+    # DOWNLOAD_OFFLOAD to 'x-accel' / 'x-sendfile' to let the web server
+    # send files held by the local backend; DOWNLOAD_OFFLOAD_PREFIX is the
+    # nginx `internal` location aliased to STORAGE_ROOT.
+    DOWNLOAD_MAX_AGE = int(os.environ.get('DOWNLOAD_MAX_AGE', 0))
+    DOWNLOAD_OFFLOAD = os.environ.get('DOWNLOAD_OFFLOAD', '')
+    DOWNLOAD_OFFLOAD_PREFIX = os.environ.get('DOWNLOAD_OFFLOAD_PREFIX', '/_protected/storage/')
+
+    # /check-report throttling (throttle.py): attempts allowed per client IP,
+    # and per report ID / token from one client IP, in any CHECK_REPORT_WINDOW
+    # seconds; plus per report ID / token from all clients together in
+    # CHECK_REPORT_GLOBAL_WINDOW, set well above what a patient needs so a
+    # stranger can at worst hold a report shut for that window. Counters
+    # are per process with THROTTLE_BACKEND 'memory'; 'database' shares them
+    # across instances. THROTTLE_PROXY_HOPS is how many proxies in front of
+    # the app append to X-Forwarded-For (1 on Vercel; 0 trusts only the socket)
+    THROTTLE_BACKEND = os.environ.get('THROTTLE_BACKEND', 'memory')
+    THROTTLE_PROXY_HOPS = int(os.environ.get('THROTTLE_PROXY_HOPS', 1 if IS_VERCEL else 0))
+    CHECK_REPORT_IP_LIMIT = int(os.environ.get('CHECK_REPORT_IP_LIMIT', 20))
+    CHECK_REPORT_ID_LIMIT = int(os.environ.get('CHECK_REPORT_ID_LIMIT', 5))
+    CHECK_REPORT_WINDOW = int(os.environ.get('CHECK_REPORT_WINDOW', 600))
+    CHECK_REPORT_GLOBAL_LIMIT = int(os.environ.get('CHECK_REPORT_GLOBAL_LIMIT', 30))
+    CHECK_REPORT_GLOBAL_WINDOW = int(os.environ.get('CHECK_REPORT_GLOBAL_WINDOW', 3600))
+
+    # Seconds a correct report password keeps the report open in that
+    # browser's session, without asking (or hashing) again. See report_access.py
+    REPORT_ACCESS_TTL = int(os.environ.get('REPORT_ACCESS_TTL', 900))
+
+    # QR codes printed before their links were signed carry a bare
+    # /report/<RID>/download. Reports uploaded before the migration that
+    # introduced signing (site_settings 'report_qr_signed_since') keep
+    # downloading from it; set to false once those printouts are retired.
+    REPORT_QR_ALLOW_LEGACY = os.environ.get('REPORT_QR_ALLOW_LEGACY', 'true').lower() in ['true', 'on', '1']
+
+    # Password hashing (passwords.py): a Werkzeug method string per kind of
+    # password. Run bench_password_hash.py on the target machine to see what
+    # each costs. Stored hashes move to a changed setting as their passwords
+    # are next verified. Report passwords are short and already throttled
+    # (above), so a bigger cost buys them little and costs every check
+    PASSWORD_HASH_USER = os.environ.get('PASSWORD_HASH_USER', 'scrypt:32768:8:1')
+    PASSWORD_HASH_REPORT = os.environ.get('PASSWORD_HASH_REPORT', 'scrypt:16384:8:1')
+
     # Email Configuration
     MAIL_SERVER = os.environ.get('MAIL_SERVER', 'smtp.gmail.com')
     MAIL_PORT = int(os.environ.get('MAIL_PORT', 587))
@@ -0,0 +1,150 @@
+"""
+Daily booking/revenue rollup behind admin.analytics.
+
+daily_stats holds one row per (booking day, test, status) with the number
+of bookings and the sum of their booked prices. Booking inserts, status
+changes and deletes adjust the matching rows inside the same flush, so
+analytics reads O(days) rollup rows instead of joining every booking.
+
+Each booking records the test's price when it was made (Booking.price),
+and every adjustment moves exactly that amount: a later price change on
+the test can't make cancelling or deleting an old booking subtract more
+or less than was added for it. A missing status counts as 'pending'
+everywhere, as the migration's backfill does.
+"""
+from sqlalchemy import event, func, inspect, select, delete
+from db_utils import old_value, track_old_values, upsert_for
+from extensions import db
+from models import Booking, DailyStat, Test
+
+
+def _bump(connection, day, test_id, status, bookings, revenue):
+    """Add to one rollup row, creating it if needed."""
+    table = DailyStat.__table__
+    insert = upsert_for(connection)
+    if insert is not None:
+        stmt = insert(table).values(day=day, test_id=test_id, status=status,
+                                    bookings=bookings, revenue=revenue)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['day', 'test_id', 'status'],
+            set_={'bookings': table.c.bookings + bookings,
+                  'revenue': table.c.revenue + revenue})
+        connection.execute(stmt)
+        return
+
+    result = connection.execute(
+        table.update()
+        .where(table.c.day == day, table.c.test_id == test_id, table.c.status == status)
+        .values(bookings=table.c.bookings + bookings, revenue=table.c.revenue + revenue))
+    if result.rowcount == 0:
+        connection.execute(table.insert().values(day=day, test_id=test_id, status=status,
+                                                 bookings=bookings, revenue=revenue))
+
+
+def _price(connection, test_id):
+    return connection.execute(select(Test.price).where(Test.id == test_id)).scalar() or 0
+
+
+track_old_values(Booking.booking_date, Booking.test_id, Booking.status, Booking.price)
+
+
+def _status(status):
+    return status or 'pending'
+
+
+@event.listens_for(Booking, 'before_insert')
+def _booking_priced(mapper, connection, target):
+    if target.price is None:
+        target.price = _price(connection, target.test_id)
+
+
+@event.listens_for(Booking, 'before_update')
+def _booking_repriced(mapper, connection, target):
+    # Moved to another test: it's now booked at that test's price
+    state = inspect(target)
+    if state.attrs.test_id.history.has_changes() and not state.attrs.price.history.has_changes():
+        target.price = _price(connection, target.test_id)
+
+
+@event.listens_for(Booking, 'after_insert')
+def _booking_inserted(mapper, connection, target):
+    _bump(connection, target.booking_date, target.test_id, _status(target.status),
+          1, target.price or 0)
+
+
+@event.listens_for(Booking, 'after_update')
+def _booking_updated(mapper, connection, target):
+    state = inspect(target)
+    old = (old_value(state, 'booking_date', target.booking_date),
+           old_value(state, 'test_id', target.test_id),
+           _status(old_value(state, 'status', target.status)))
+    new = (target.booking_date, target.test_id, _status(target.status))
+    old_price = old_value(state, 'price', target.price) or 0
+    new_price = target.price or 0
+    if old == new and old_price == new_price:
+        return
+    _bump(connection, *old, -1, -old_price)
+    _bump(connection, *new, 1, new_price)
+
+
+@event.listens_for(Booking, 'after_delete')
+def _booking_deleted(mapper, connection, target):
+    state = inspect(target)
+    day = old_value(state, 'booking_date', target.booking_date)
+    test_id = old_value(state, 'test_id', target.test_id)
+    status = _status(old_value(state, 'status', target.status))
+    price = old_value(state, 'price', target.price) or 0
+    _bump(connection, day, test_id, status, -1, -price)
+
+
+def backfill():
+    """Rebuild the whole rollup from bookings. Returns the number of rows."""
+    status = func.coalesce(Booking.status, 'pending')
+    rows = select(
+        Booking.booking_date, Booking.test_id, status,
+        func.count(Booking.id), func.coalesce(func.sum(func.coalesce(Booking.price, Test.price)), 0)
+    ).join(Test, Booking.test_id == Test.id)\
+        .group_by(Booking.booking_date, Booking.test_id, status)
+
+    db.session.execute(delete(DailyStat))
+    db.session.execute(DailyStat.__table__.insert().from_select(
+        ['day', 'test_id', 'status', 'bookings', 'revenue'], rows))
+    db.session.commit()
+    return db.session.query(func.count()).select_from(DailyStat).scalar()
+
+
+# ── Read side ──
+def bookings_between(start, end=None):
+    """Bookings with booking_date in [start, end]."""
+    query = db.session.query(func.coalesce(func.sum(DailyStat.bookings), 0))\
+        .filter(DailyStat.day >= start)
+    if end is not None:
+        query = query.filter(DailyStat.day <= end)
+    return query.scalar()
+
+
+def revenue_between(start=None, end=None):
+    """Revenue of completed bookings with booking_date in [start, end]."""
+    query = db.session.query(func.coalesce(func.sum(DailyStat.revenue), 0))\
+        .filter(DailyStat.status == 'completed')
+    if start is not None:
+        query = query.filter(DailyStat.day >= start)
+    if end is not None:
+        query = query.filter(DailyStat.day <= end)
+    return query.scalar()
+
+
+def top_tests(limit=5):
+    """[(test name, bookings)] across all time, most booked first."""
+    total = func.sum(DailyStat.bookings)
+    return db.session.query(Test.name, total.label('count'))\
+        .select_from(DailyStat).join(Test, Test.id == DailyStat.test_id)\
+        .group_by(Test.name).having(total > 0)\
+        .order_by(total.desc()).limit(limit).all()
+
+
+def status_counts():
+    """{status: bookings} across all time."""
+    rows = db.session.query(DailyStat.status, func.sum(DailyStat.bookings))\
+        .group_by(DailyStat.status).all()
+    return {status: count for status, count in rows}
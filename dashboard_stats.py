@@ -0,0 +1,104 @@
+"""
+Admin dashboard figures.
+
+The headline counts, the monthly revenue (from the daily_stats rollup, so
+it matches analytics and uses each booking's booked price) and the recent
+bookings list come back from one SELECT (the one-row aggregate outer-joined to the latest
+bookings), and the snapshot is held in a short-TTL cache that committed
+model writes invalidate.
+"""
+from collections import namedtuple
+from datetime import datetime
+from sqlalchemy import event, func, select, true
+from sqlalchemy.orm import Session, object_session
+from config import Config
+from extensions import db
+from cache import TTLCache
+from models import User, Test, Booking, Report, ContactEnquiry, DailyStat
+
+DashboardStats = namedtuple('DashboardStats', [
+    'total_patients', 'total_tests', 'total_bookings', 'pending_bookings',
+    'total_reports', 'unread_enquiries', 'monthly_revenue', 'recent_bookings',
+])
+
+# Plain-data row so cached bookings never touch a (closed) session
+RecentBooking = namedtuple('RecentBooking', [
+    'id', 'user_name', 'test_name', 'booking_date', 'slot_time', 'status', 'home_collection',
+])
+
+_cache = TTLCache(ttl=Config.DASHBOARD_CACHE_TTL, maxsize=4)
+
+
+def _count(model, *criteria):
+    return select(func.count()).select_from(model).where(*criteria).scalar_subquery()
+
+
+def _load(month_start):
+    # As daily_stats.revenue_between(month_start)
+    revenue = select(func.coalesce(func.sum(DailyStat.revenue), 0))\
+        .where(DailyStat.status == 'completed', DailyStat.day >= month_start)\
+        .scalar_subquery()
+
+    totals = select(
+        _count(User, User.role == 'patient'),
+        _count(Test),
+        _count(Booking),
+        _count(Booking, Booking.status == 'pending'),
+        _count(Report),
+        _count(ContactEnquiry, ContactEnquiry.is_read == False),
+        revenue,
+    ).subquery()
+
+    recent = select(Booking.id, User.name.label('user_name'), Test.name.label('test_name'),
+                    Booking.booking_date, Booking.slot_time, Booking.status,
+                    Booking.home_collection, Booking.created_at)\
+        .join(User, Booking.user_id == User.id)\
+        .join(Test, Booking.test_id == Test.id)\
+        .order_by(Booking.created_at.desc(), Booking.id.desc())\
+        .limit(10).subquery()
+
+    # One row per recent booking (or one all-NULL one), each carrying the totals
+    rows = db.session.execute(
+        select(*totals.c, *[recent.c[name] for name in RecentBooking._fields])
+        .select_from(totals.outerjoin(recent, true()))
+        .order_by(recent.c.created_at.desc(), recent.c.id.desc())
+    ).all()
+
+    figures = len(totals.c)
+    return DashboardStats(*rows[0][:figures], recent_bookings=[
+        RecentBooking(*r[figures:]) for r in rows if r[figures] is not None])
+
+
+def get_dashboard_stats():
+    """Cached dashboard snapshot for the current month."""
+    month_start = datetime.utcnow().date().replace(day=1)
+    return _cache.get_or_set(month_start, lambda: _load(month_start))
+
+
+def invalidate_dashboard_stats():
+    _cache.invalidate()
+
+
+# ── Write side ──
+def _mark_changed(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info['dashboard_changed'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _after_commit(session):
+    # Dropped only once the write is visible, so a request that reloads the
+    # cache between the flush and the commit can't keep the old figures.
+    if session.info.pop('dashboard_changed', False):
+        invalidate_dashboard_stats()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _after_rollback(session):
+    session.info.pop('dashboard_changed', None)
+
+
+for _model in (User, Test, Booking, Report, ContactEnquiry):
+    for _event in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(_model, _event, _mark_changed)
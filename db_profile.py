@@ -0,0 +1,117 @@
+"""
+Connection pool warmup and per-request database timing.
+
+With DB_TIMING on, every request logs how many connections it checked out,
+how many of those had to be opened (and how long that took), and how many
+SQL statements it ran and for how long. The same numbers go out in a
+Server-Timing header, so the browser dev tools show them too. Compare the
+'serverless' and 'pooled' DB_PROFILE settings with these numbers, or with
+bench_db_profile.py.
+"""
+import logging
+import time
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool
+from extensions import db
+
+
+class _Timing:
+    __slots__ = ('checkouts', 'connects', 'connect_s', 'queries', 'query_s', 'started')
+
+    def __init__(self):
+        self.checkouts = self.connects = self.queries = 0
+        self.connect_s = self.query_s = 0.0
+        self.started = time.perf_counter()
+
+
+def _timing():
+    if has_request_context():
+        return g.get('_db_timing')
+    return None
+
+
+def _before_connect(dialect, conn_rec, cargs, cparams):
+    conn_rec.info['connect_started'] = time.perf_counter()
+
+
+def _after_connect(dbapi_connection, conn_rec):
+    started = conn_rec.info.pop('connect_started', None)
+    timing = _timing()
+    if timing is not None and started is not None:
+        timing.connects += 1
+        timing.connect_s += time.perf_counter() - started
+
+
+def _on_checkout(dbapi_connection, conn_rec, conn_proxy):
+    timing = _timing()
+    if timing is not None:
+        timing.checkouts += 1
+
+
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['query_started'].pop()
+    timing = _timing()
+    if timing is not None:
+        timing.queries += 1
+        timing.query_s += time.perf_counter() - started
+
+
+def register_db_timing(app):
+    """Log connection/query timings for every request (DB_TIMING)."""
+    if not app.config.get('DB_TIMING'):
+        return
+
+    event.listen(Engine, 'do_connect', _before_connect)
+    event.listen(Pool, 'connect', _after_connect)
+    event.listen(Pool, 'checkout', _on_checkout)
+    event.listen(Engine, 'before_cursor_execute', _before_execute)
+    event.listen(Engine, 'after_cursor_execute', _after_execute)
+    app.logger.setLevel(logging.INFO)
+
+    @app.before_request
+    def _start_db_timing():
+        g._db_timing = _Timing()
+
+    @app.after_request
+    def _report_db_timing(response):
+        timing = g.pop('_db_timing', None)
+        if timing is None:
+            return response
+        total_ms = (time.perf_counter() - timing.started) * 1000
+        connect_ms = timing.connect_s * 1000
+        query_ms = timing.query_s * 1000
+
+        response.headers['Server-Timing'] = ', '.join([
+            f'db-connect;dur={connect_ms:.1f};desc="{timing.connects} new of {timing.checkouts}"',
+            f'db-query;dur={query_ms:.1f};desc="{timing.queries} queries"',
+            f'app;dur={total_ms:.1f}',
+        ])
+        app.logger.info(
+            'db-timing %s %s %s profile=%s checkouts=%d connects=%d connect_ms=%.1f '
+            'queries=%d query_ms=%.1f total_ms=%.1f',
+            request.method, request.path, response.status_code, app.config.get('DB_PROFILE'),
+            timing.checkouts, timing.connects, connect_ms, timing.queries, query_ms, total_ms)
+        return response
+
+
+def warm_pool(app, count):
+    """Open count pooled connections at boot so the first requests reuse them."""
+    if count <= 0 or app.config.get('DB_PROFILE') != 'pooled':
+        return
+    with app.app_context():
+        started = time.perf_counter()
+        try:
+            connections = [db.engine.connect() for _ in range(count)]
+            for connection in connections:
+                connection.close()  # back to the pool, still open
+        except Exception as e:
+            print(f"⚠️ Connection pool warmup failed: {e}")
+            return
+        print(f"✅ Warmed {count} pooled DB connection(s) in "
+              f"{(time.perf_counter() - started) * 1000:.0f} ms")
@@ -0,0 +1,39 @@
+"""
+SQLAlchemy helpers shared by the counter and rollup modules.
+
+upsert_for() gives the dialect's INSERT ... ON CONFLICT construct, or None
+on databases without one (callers fall back to update-then-insert).
+old_value() and track_old_values() let after_update listeners see what a
+column held before the flush, so they can move a count from the old key
+to the new one.
+"""
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+
+UPSERT_DIALECTS = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+
+
+def upsert_for(bind):
+    """postgresql/sqlite insert() for a connection or engine, else None."""
+    return UPSERT_DIALECTS.get(bind.dialect.name)
+
+
+def old_value(state, attr, current):
+    """The value attr had before this flush (current if it didn't change)."""
+    history = state.attrs[attr].history
+    return history.deleted[0] if history.deleted else current
+
+
+def _keep_old_value(target, value, oldvalue, initiator):
+    pass
+
+
+def track_old_values(*attributes):
+    """Make old_value() reliable for these mapped attributes.
+
+    active_history makes SQLAlchemy load the previous value on assignment
+    even when the instance was expired by a commit, so after_update can
+    see it.
+    """
+    for attribute in attributes:
+        event.listen(attribute, 'set', _keep_old_value, active_history=True)
@@ -0,0 +1,97 @@
+"""
+Serving stored files over HTTP.
+
+Every stored file is named by the SHA-256 of its content, which makes the
+digest a ready-made strong ETag. send_blob() answers:
+
+    If-None-Match / If-Modified-Since  -> 304, no body (repeat QR scans)
+    Range (one range, honouring If-Range) -> 206, only those bytes, read
+                                          from that offset in the backend
+    anything else                       -> 200, streamed in chunks
+
+with `Cache-Control: private` (reports are personal, so shared caches
+must not keep them). Report URLs don't change when a report is
+regenerated, so by default browsers must revalidate (`no-cache`); the
+ETag makes that a 304. Only callers whose URL carries the digest pass
+a max_age. With DOWNLOAD_OFFLOAD set and a
+file on the local backend, the body is left to nginx (X-Accel-Redirect)
+or Apache/lighttpd (X-Sendfile), which handle ranges themselves; the
+304 check still happens here first.
+"""
+import os
+from datetime import timezone
+from flask import Response, current_app, request, stream_with_context
+from werkzeug.datastructures import ContentRange
+from werkzeug.http import is_resource_modified
+import storage
+
+
+def _range_applies(blob):
+    """Whether to honour the request's Range header for this blob."""
+    rng = request.range
+    if rng is None or rng.units != 'bytes' or len(rng.ranges) != 1:
+        return False  # multipart/byteranges isn't worth it for PDFs: send it all
+    if_range = request.if_range
+    if if_range.etag is not None:
+        return if_range.etag == blob.digest
+    if if_range.date is not None:
+        return blob.created_at is not None and \
+            if_range.date >= blob.created_at.replace(microsecond=0, tzinfo=timezone.utc)
+    return True
+
+
+def _offload(response, blob):
+    """Hand the body to the front web server. Returns False if it can't."""
+    mode = current_app.config['DOWNLOAD_OFFLOAD']
+    if not mode or blob.backend != 'local':
+        return False
+    path = storage.backend('local').path(blob.digest)
+    if mode == 'x-accel':
+        relative = os.path.relpath(path, current_app.config['STORAGE_ROOT']).replace(os.sep, '/')
+        response.headers['X-Accel-Redirect'] = current_app.config['DOWNLOAD_OFFLOAD_PREFIX'] + relative
+    elif mode == 'x-sendfile':
+        response.headers['X-Sendfile'] = path
+    else:
+        return False
+    response.headers.pop('Accept-Ranges', None)  # the web server decides
+    return True
+
+
+def send_blob(blob, download_name=None, max_age=None):
+    """A conditional, range-aware response for a StoredBlob."""
+    response = Response(mimetype=blob.content_type or 'application/octet-stream')
+    response.set_etag(blob.digest)
+    if blob.created_at is not None:
+        response.last_modified = blob.created_at
+    response.cache_control.private = True
+    if max_age is None:
+        max_age = current_app.config['DOWNLOAD_MAX_AGE']
+    if max_age:
+        response.cache_control.max_age = max_age
+    else:
+        response.cache_control.no_cache = True
+    response.accept_ranges = 'bytes'
+    if download_name:
+        response.headers.set('Content-Disposition', 'attachment', filename=download_name)
+
+    if not is_resource_modified(request.environ, etag=blob.digest, last_modified=blob.created_at):
+        response.status_code = 304
+        return response
+
+    if _offload(response, blob):
+        return response
+
+    start, stop = 0, blob.size
+    if _range_applies(blob):
+        span = request.range.range_for_length(blob.size)
+        if span is None:
+            response.status_code = 416
+            response.content_range = ContentRange('bytes', None, None, blob.size)
+            return response
+        start, stop = span
+        response.status_code = 206
+        response.content_range = ContentRange('bytes', start, stop, blob.size)
+
+    response.response = stream_with_context(storage.stream(blob, start, stop))
+    response.content_length = stop - start
+    return response
@@ -0,0 +1,253 @@
+"""
+EXPLAIN the hot lookup queries with and without the lookup indexes.
+
+Prints each query's plan as it is now ("after") and again with the indexes
+from migration a3c5e8f1b642 dropped inside a rolled-back transaction
+("before"), then exits non-zero if a query doesn't use the index it was
+added for.
+
+By default it runs against a throwaway, seeded SQLite database. Point it at
+a PostgreSQL copy of production (already upgraded with `flask db upgrade`)
+to check the real planner, including the pg_trgm indexes. Nothing is
+changed there, but the rolled-back DROP INDEX holds table locks while the
+"before" plans run, so don't aim it at the live database.
+
+Usage:
+    python explain_hot_queries.py
+    python explain_hot_queries.py --database-url postgresql://.../staging
+"""
+import argparse
+import os
+import sys
+import tempfile
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+
+parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+parser.add_argument('--database-url', help='Existing database to explain against (not modified)')
+args = parser.parse_args()
+
+if args.database_url:
+    os.environ['DATABASE_URL'] = args.database_url
+else:
+    _db_fd, _db_path = tempfile.mkstemp(suffix='.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{_db_path}'
+    from config import Config
+    Config.SQLALCHEMY_ENGINE_OPTIONS = {}  # Postgres-only connect args
+
+from sqlalchemy import func, insert, or_, text
+from app import app
+from config import Config
+from extensions import db
+from models import (User, Test, TestCategory, Booking, BlockedSlot, BlockRule, Report, ReportResult,
+                    ContactEnquiry, Testimonial, ActivityLog, DailyStat)
+
+# Everything migration a3c5e8f1b642 creates (the blocked_slots index is
+# replaced by a unique one in c8f4a2d6e913), plus the block_rules,
+# report_results and report-linking indexes
+SUITE_INDEXES = [
+    'ix_users_phone', 'ix_users_oauth_provider_oauth_id',
+    'ix_bookings_user_id_created_at', 'ix_bookings_user_id_status_booking_date',
+    'ix_bookings_status_booking_date', 'ix_bookings_test_id',
+    'uq_blocked_slots_date_time_slot', 'ix_block_rules_start_date_end_date',
+    'ix_activity_logs_created_at', 'ix_report_results_parameter_name_is_abnormal',
+    'ix_reports_user_id_uploaded_at', 'ix_reports_phone', 'ix_bookings_patient_phone',
+    'ix_contact_enquiries_unread', 'ix_testimonials_approved_created_at',
+    'ix_users_name_trgm', 'ix_users_email_trgm', 'ix_users_phone_trgm',
+    'ix_reports_patient_name_trgm', 'ix_tests_name_trgm',
+]
+
+# expects: {dialect: index name the plan should mention}. A dialect missing
+# from the dict isn't checked (e.g. SQLite can't index '%...%' searches).
+HotQuery = namedtuple('HotQuery', ['label', 'build', 'expects'])
+
+USER_ID = 1
+TODAY = date.today()
+
+HOT_QUERIES = [
+    HotQuery('patient.my_bookings',
+             lambda: Booking.query.filter_by(user_id=USER_ID).order_by(Booking.created_at.desc()),
+             {'sqlite': 'ix_bookings_user_id_created_at',
+              'postgresql': 'ix_bookings_user_id_created_at'}),
+    HotQuery('patient.dashboard booking counts',
+             lambda: db.session.query(Booking.status, func.count(Booking.id))
+             .filter(Booking.user_id == USER_ID).group_by(Booking.status),
+             {'sqlite': 'ix_bookings_user_id_status_booking_date',
+              'postgresql': 'ix_bookings_user_id_status_booking_date'}),
+    HotQuery('patient.dashboard upcoming',
+             lambda: Booking.query.filter_by(user_id=USER_ID)
+             .filter(Booking.status.in_(['pending', 'confirmed']))
+             .order_by(Booking.booking_date.desc()).limit(5),
+             {'sqlite': 'ix_bookings_user_id_status_booking_date',
+              'postgresql': 'ix_bookings_user_id_status_booking_date'}),
+    HotQuery('patient.dashboard reports',
+             lambda: Report.query.filter_by(user_id=USER_ID).order_by(Report.uploaded_at.desc()),
+             {'sqlite': 'ix_reports_user_id_uploaded_at',
+              'postgresql': 'ix_reports_user_id_uploaded_at'}),
+    HotQuery('admin.dashboard monthly revenue',
+             lambda: db.session.query(func.sum(DailyStat.revenue))
+             .filter(DailyStat.status == 'completed', DailyStat.day >= TODAY.replace(day=1)),
+             {'sqlite': 'sqlite_autoindex_daily_stats_1', 'postgresql': 'daily_stats_pkey'}),
+    HotQuery('admin.dashboard unread enquiries',
+             lambda: ContactEnquiry.query.filter(ContactEnquiry.is_read == False),
+             {'sqlite': 'ix_contact_enquiries_unread',
+              'postgresql': 'ix_contact_enquiries_unread'}),
+    HotQuery('admin.patients search',
+             lambda: User.query.filter_by(role='patient').filter(or_(
+                 User.name.ilike('%tient 4%'), User.email.ilike('%tient 4%'),
+                 User.phone.ilike('%tient 4%'))),
+             {'postgresql': 'ix_users_name_trgm'}),
+    HotQuery('admin.activity_log',
+             lambda: ActivityLog.query.order_by(ActivityLog.created_at.desc()).limit(100),
+             {'sqlite': 'ix_activity_logs_created_at',
+              'postgresql': 'ix_activity_logs_created_at'}),
+    HotQuery('auth.login by phone',
+             lambda: User.query.filter((User.email == '9000000042') | (User.phone == '9000000042')),
+             {'sqlite': 'ix_users_phone', 'postgresql': 'ix_users_phone'}),
+    HotQuery('auth.oauth_callback',
+             lambda: User.query.filter_by(oauth_provider='google', oauth_id='g-42'),
+             {'sqlite': 'ix_users_oauth_provider_oauth_id',
+              'postgresql': 'ix_users_oauth_provider_oauth_id'}),
+    HotQuery('patient.availability blocks',
+             lambda: BlockedSlot.query.filter(BlockedSlot.date.between(TODAY, TODAY + timedelta(days=59))),
+             {'sqlite': 'uq_blocked_slots_date_time_slot',
+              'postgresql': 'uq_blocked_slots_date_time_slot'}),
+    HotQuery('patient.availability rules',
+             lambda: BlockRule.query.filter(BlockRule.start_date <= TODAY + timedelta(days=59),
+                                            (BlockRule.end_date.is_(None)) | (BlockRule.end_date >= TODAY)),
+             {'sqlite': 'ix_block_rules_start_date_end_date',
+              'postgresql': 'ix_block_rules_start_date_end_date'}),
+    HotQuery('main.home testimonials',
+             lambda: Testimonial.query.filter_by(is_approved=True)
+             .order_by(Testimonial.created_at.desc()).limit(6),
+             {'sqlite': 'ix_testimonials_approved_created_at',
+              'postgresql': 'ix_testimonials_approved_created_at'}),
+    HotQuery('admin.abnormal_results',
+             lambda: Report.query.join(ReportResult, ReportResult.report_id == Report.id)
+             .filter(ReportResult.parameter_name == 'Haemoglobin',
+                     ReportResult.is_abnormal.is_(True)),
+             {'sqlite': 'ix_report_results_parameter_name_is_abnormal',
+              'postgresql': 'ix_report_results_parameter_name_is_abnormal'}),
+    HotQuery('main.check_report lookup',
+             lambda: Report.query.filter(or_(Report.report_id == 'RID100042',
+                                             Report.token_number == 'RID100042')).limit(2),
+             {'sqlite': 'MULTI-INDEX OR', 'postgresql': 'BitmapOr'}),
+    HotQuery('main.services search',
+             lambda: Test.query.filter_by(is_active=True).filter(Test.name.ilike('%test 4%')),
+             {'postgresql': 'ix_tests_name_trgm'}),
+]
+
+
+def seed(n=2000):
+    """Fill the throwaway database with enough rows for the planner to care."""
+    now = datetime.utcnow()
+    db.session.execute(insert(TestCategory), [{'name': f'Category {i}'} for i in range(20)])
+    db.session.execute(insert(Test), [
+        {'name': f'Test {i}', 'category_id': i % 20 + 1, 'price': 100 + i, 'is_active': True}
+        for i in range(200)])
+    db.session.execute(insert(User), [
+        {'name': f'Patient {i}', 'email': f'patient{i}@example.com', 'phone': f'9{i:09d}',
+         'role': 'patient', 'oauth_provider': 'google' if i % 3 == 0 else None,
+         'oauth_id': f'g-{i}' if i % 3 == 0 else None,
+         'created_at': now - timedelta(minutes=i)}
+        for i in range(n)])
+    db.session.execute(insert(Booking), [
+        {'user_id': i % n + 1, 'test_id': i % 200 + 1,
+         'booking_date': TODAY + timedelta(days=i % 120 - 60), 'slot_time': '09:00 AM',
+         'patient_phone': f'9{i % n:09d}',
+         'status': ('pending', 'confirmed', 'completed', 'cancelled')[i % 4],
+         'created_at': now - timedelta(minutes=i)}
+        for i in range(n * 5)])
+    slots = [None] + Config.SLOT_TIMES
+    db.session.execute(insert(BlockedSlot), [
+        {'date': TODAY + timedelta(days=i // len(slots) - 30), 'time_slot': slots[i % len(slots)]}
+        for i in range(n)])
+    db.session.execute(insert(BlockRule), [
+        {'start_date': TODAY + timedelta(days=i - n // 40), 'end_date': TODAY + timedelta(days=i - n // 40 + 14),
+         'weekdays': 1 << (i % 7), 'time_slots': None if i % 3 else '09:00 AM,10:00 AM'}
+        for i in range(n // 20)])
+    db.session.execute(insert(Report), [
+        {'report_id': f'RID{100000 + i}', 'patient_name': f'Patient {i}',
+         'token_number': f'TK{i}', 'password_hash': 'x', 'file_path': f'{i}.pdf',
+         'phone': f'9{i:09d}', 'user_id': i + 1 if i % 4 else None,
+         'uploaded_at': now - timedelta(minutes=i)}
+        for i in range(n)])
+    parameters = ['Haemoglobin', 'WBC', 'Platelets', 'Glucose', 'Creatinine']
+    db.session.execute(insert(ReportResult), [
+        {'report_id': i // 5 + 1, 'position': i % 5, 'parameter_name': parameters[i % 5],
+         'raw_value': str(i % 20), 'numeric_value': i % 20, 'is_abnormal': i % 7 == 0}
+        for i in range(n * 5)])
+    db.session.execute(insert(ContactEnquiry), [
+        {'name': f'Enquiry {i}', 'message': 'Hello', 'is_read': i % 20 != 0,
+         'created_at': now - timedelta(minutes=i)}
+        for i in range(n)])
+    db.session.execute(insert(Testimonial), [
+        {'reviewer_name': f'Reviewer {i}', 'review': 'Good', 'is_approved': i % 10 == 0,
+         'created_at': now - timedelta(minutes=i)}
+        for i in range(n)])
+    db.session.execute(insert(ActivityLog), [
+        {'admin_id': 1, 'action': 'Seed', 'created_at': now - timedelta(minutes=i)}
+        for i in range(n)])
+    db.session.commit()
+    db.session.execute(text('ANALYZE'))
+    db.session.commit()
+
+
+def explain(connection, query, phase):
+    sql = str(query.statement.compile(dialect=connection.dialect,
+                                      compile_kwargs={'literal_binds': True}))
+    # The phase comment keeps the driver's statement cache from handing
+    # back the plan prepared before the indexes were dropped.
+    if connection.dialect.name == 'postgresql':
+        rows = connection.exec_driver_sql(f'EXPLAIN /* {phase} */ {sql}').fetchall()
+        return '\n'.join(row[0] for row in rows)
+    rows = connection.exec_driver_sql(f'EXPLAIN QUERY PLAN /* {phase} */ {sql}').fetchall()
+    return '\n'.join(row[-1] for row in rows)
+
+
+def explain_all(connection, phase):
+    return [explain(connection, hot.build(), phase) for hot in HOT_QUERIES]
+
+
+def main():
+    with app.app_context():
+        if not args.database_url:
+            seed()
+
+        connection = db.session.connection()
+        dialect = connection.dialect.name
+        after = explain_all(connection, 'after')
+
+        # DDL is transactional on PostgreSQL, so the drop never becomes
+        # visible to anyone else. The SQLite database is throwaway anyway.
+        transaction = connection.begin_nested()
+        for name in SUITE_INDEXES:
+            connection.exec_driver_sql(f'DROP INDEX IF EXISTS {name}')
+        before = explain_all(connection, 'before')
+        transaction.rollback()
+        db.session.rollback()
+
+    failures = []
+    for hot, plan_before, plan_after in zip(HOT_QUERIES, before, after):
+        expected = hot.expects.get(dialect)
+        ok = expected is None or expected in plan_after
+        if not ok:
+            failures.append(hot.label)
+        print(f"── {hot.label}  [{'ok' if ok else 'MISSING ' + expected}]")
+        print('  before: ' + plan_before.replace('\n', '\n          '))
+        print('  after:  ' + plan_after.replace('\n', '\n          '))
+        print()
+
+    if failures:
+        print(f"{len(failures)} query(ies) not using their index: {', '.join(failures)}")
+        return 1
+    print(f"All {len(HOT_QUERIES)} hot queries use their indexes ({dialect}).")
+    return 0
+
+
+if __name__ == '__main__':
+    code = main()
+    if not args.database_url:
+        os.close(_db_fd)
+        os.unlink(_db_path)
+    sys.exit(code)
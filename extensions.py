@@ -1,13 +1,17 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
-from flask_migrate import Migrate
 from flask_mail import Mail
 
 db = SQLAlchemy()
 login_manager = LoginManager()
-migrate = Migrate()
 mail = Mail()
 
 login_manager.login_view = 'auth.login'
 login_manager.login_message = 'Please login to access this page.'
 login_manager.login_message_category = 'info'
+
+
+def init_migrate(app):
+    """Attach Flask-Migrate. Imported here so web cold starts can skip Alembic."""
+    from flask_migrate import Migrate
+    Migrate(app, db)
@@ -0,0 +1,54 @@
+"""
+Named eager-loading options for list views.
+
+Each entry lists the relationships a view's template dereferences, so the
+rows and their related objects come back in a fixed number of queries
+instead of one SELECT per row. Usage:
+
+    Booking.query.options(*view_loaders('admin.appointments'))
+"""
+from sqlalchemy.orm import joinedload, selectinload
+from models import Booking, ActivityLog, Test, TestCategory, User
+
+
+def _booking_user_and_test():
+    return (joinedload(Booking.user), joinedload(Booking.test))
+
+
+def _booking_test():
+    return (joinedload(Booking.test),)
+
+
+def _log_admin():
+    return (joinedload(ActivityLog.admin),)
+
+
+def _test_category():
+    return (joinedload(Test.category),)
+
+
+def _category_tests():
+    return (selectinload(TestCategory.tests),)
+
+
+def _patient_bookings():
+    return (selectinload(User.bookings),)
+
+
+# Built lazily: backref attributes like Booking.user only exist once the
+# mappers are configured.
+VIEW_LOADERS = {
+    'admin.appointments': _booking_user_and_test,
+    'admin.activity_log': _log_admin,
+    'admin.analytics': _log_admin,
+    'admin.tests': _test_category,
+    'admin.categories': _category_tests,
+    'admin.patients': _patient_bookings,
+    'patient.dashboard': _booking_test,
+    'patient.my_bookings': _booking_test,
+}
+
+
+def view_loaders(name):
+    """Loader options for a named view."""
+    return VIEW_LOADERS[name]()
@@ -0,0 +1,286 @@
+"""
+Outgoing email queue.
+
+Views call queue_mail() and dispatch() instead of mail.send(), so a slow or
+unreachable SMTP relay never holds up a request. Messages are rows in
+outbound_mail and are delivered by one of (MAIL_QUEUE_MODE):
+
+    inline  - in the request, after the commit (still one SMTP session)
+    thread  - a single background thread, for single-process/local runs
+    worker  - a separate `flask mail-worker` process polling the table
+
+Every run claims up to MAIL_QUEUE_BATCH_SIZE due messages and sends them
+over a single mail.connect() session instead of one TLS handshake and
+login per message. A message that fails goes back on the queue with an
+exponential backoff and is given up on after MAIL_QUEUE_MAX_ATTEMPTS, or
+as soon as it can't go out before its expires_at (OTP mail is useless once
+the code has lapsed).
+
+Once a message is sent, failed or expired its body is blanked so codes
+don't sit in the table, and purge() deletes those rows after
+MAIL_RETENTION_DAYS.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import current_app
+from flask_mail import Message
+from sqlalchemy import func
+from extensions import db, mail
+from models import OutboundMail
+
+_executor = None
+_executor_lock = threading.Lock()
+_drain_pending = threading.Event()
+_retry_timer = None
+
+_metrics_lock = threading.Lock()
+_metrics = {
+    'batches': 0, 'connections': 0, 'sent': 0, 'retried': 0, 'failed': 0, 'expired': 0,
+    'connect_ms': 0.0, 'send_ms': 0.0, 'last_error': '',
+}
+
+
+def queue_mail(subject, recipients, body='', html=None, sender=None, expires_in=None):
+    """Queue an email. Commit, then call dispatch().
+
+    expires_in (a timedelta) drops the message instead of sending it late.
+    """
+    now = datetime.utcnow()
+    message = OutboundMail(subject=subject, recipients=','.join(recipients), body=body,
+                           html=html, sender=sender, next_attempt_at=now,
+                           expires_at=now + expires_in if expires_in else None)
+    db.session.add(message)
+    return message
+
+
+def dispatch():
+    """Deliver what's queued using the configured mode."""
+    mode = current_app.config['MAIL_QUEUE_MODE']
+    if mode == 'inline':
+        send_due()
+    elif mode == 'thread':
+        _schedule_drain(current_app._get_current_object())
+    # 'worker': left queued for `flask mail-worker`
+
+
+# ── Thread mode ──
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # One thread, so concurrent dispatches share a batch/session
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='mail-queue')
+    return _executor
+
+
+def _schedule_drain(app):
+    if _drain_pending.is_set():
+        return  # the pending drain will pick the new message up
+    _drain_pending.set()
+    _get_executor().submit(_drain_in_thread, app)
+
+
+def _drain_in_thread(app):
+    _drain_pending.clear()
+    with app.app_context():
+        try:
+            while send_due():
+                pass
+            _schedule_retry(app)
+        except Exception as e:
+            app.logger.error(f"Mail queue drain crashed: {e}")
+        finally:
+            db.session.remove()
+
+
+def _schedule_retry(app):
+    """Wake up again when the earliest backed-off message becomes due."""
+    global _retry_timer
+    next_due = db.session.query(func.min(OutboundMail.next_attempt_at))\
+        .filter(OutboundMail.status == 'queued').scalar()
+    if next_due is None:
+        return
+    if _retry_timer is not None:
+        _retry_timer.cancel()
+    delay = max((next_due - datetime.utcnow()).total_seconds(), 0) + 0.1
+    _retry_timer = threading.Timer(delay, _schedule_drain, args=(app,))
+    _retry_timer.daemon = True
+    _retry_timer.start()
+
+
+# ── Delivery ──
+def _expire_queued():
+    """Give up on queued messages that are past their expires_at."""
+    return OutboundMail.query.filter(
+        OutboundMail.status == 'queued',
+        OutboundMail.expires_at < datetime.utcnow()
+    ).update({'status': 'expired', 'body': '', 'html': None}, synchronize_session=False)
+
+
+def _claim_batch(limit):
+    """Lock up to limit due messages and mark them sending."""
+    expired = _expire_queued()
+    if expired:
+        _count(expired=expired)
+    batch = OutboundMail.query.filter(
+        OutboundMail.status == 'queued',
+        OutboundMail.next_attempt_at <= datetime.utcnow()
+    ).order_by(OutboundMail.next_attempt_at, OutboundMail.id)\
+        .limit(limit).with_for_update(skip_locked=True).all()
+    if not batch:
+        db.session.commit()
+        return []
+    now = datetime.utcnow()
+    for message in batch:
+        message.status = 'sending'
+        message.attempts = (message.attempts or 0) + 1
+        message.next_attempt_at = now
+    db.session.commit()
+    return batch
+
+
+def _to_message(row):
+    return Message(subject=row.subject, recipients=row.recipients.split(','),
+                   body=row.body or '', html=row.html, sender=row.sender or None)
+
+
+def _clear(row):
+    """Drop the content of a message that won't be sent again."""
+    row.body, row.html = '', None
+
+
+def _failed(row, error):
+    row.error = f"{type(error).__name__}: {error}"
+    backoff = current_app.config['MAIL_RETRY_SECONDS'] * 2 ** (row.attempts - 1)
+    retry_at = datetime.utcnow() + timedelta(seconds=backoff)
+    if row.expires_at is not None and retry_at >= row.expires_at:
+        row.status = 'expired'
+        _clear(row)
+        _count(expired=1, last_error=row.error)
+    elif row.attempts < current_app.config['MAIL_QUEUE_MAX_ATTEMPTS']:
+        row.status = 'queued'
+        row.next_attempt_at = retry_at
+        _count(retried=1, last_error=row.error)
+    else:
+        row.status = 'failed'
+        _clear(row)
+        _count(failed=1, last_error=row.error)
+        current_app.logger.error(f"Giving up on email #{row.id} to {row.recipients}: {row.error}")
+
+
+def send_due():
+    """Send one batch of due messages. Returns how many were claimed."""
+    batch = _claim_batch(current_app.config['MAIL_QUEUE_BATCH_SIZE'])
+    if not batch:
+        return 0
+
+    started = time.perf_counter()
+    try:
+        connection = mail.connect()
+        connection.__enter__()
+    except Exception as e:
+        for row in batch:
+            _failed(row, e)
+        db.session.commit()
+        _count(batches=1)
+        return len(batch)
+    connected = time.perf_counter()
+
+    try:
+        for row in batch:
+            try:
+                connection.send(_to_message(row))
+            except Exception as e:
+                _failed(row, e)
+            else:
+                row.status = 'sent'
+                row.error = ''
+                row.sent_at = datetime.utcnow()
+                _clear(row)
+                _count(sent=1)
+    finally:
+        try:
+            connection.__exit__(None, None, None)
+        except Exception:
+            pass  # relay already hung up; what was sent is sent
+        db.session.commit()
+
+    _count(batches=1, connections=1, connect_ms=(connected - started) * 1000,
+           send_ms=(time.perf_counter() - connected) * 1000)
+    return len(batch)
+
+
+def requeue_stale(older_than):
+    """Put 'sending' messages whose sender died back on the queue."""
+    cutoff = datetime.utcnow() - older_than
+    count = OutboundMail.query.filter(
+        OutboundMail.status == 'sending',
+        OutboundMail.next_attempt_at < cutoff
+    ).update({'status': 'queued'}, synchronize_session=False)
+    db.session.commit()
+    return count
+
+
+def purge(older_than=None):
+    """Delete sent, failed and expired messages older than the retention period."""
+    if older_than is None:
+        older_than = timedelta(days=current_app.config['MAIL_RETENTION_DAYS'])
+    count = OutboundMail.query.filter(
+        OutboundMail.status.in_(('sent', 'failed', 'expired')),
+        OutboundMail.created_at < datetime.utcnow() - older_than
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return count
+
+
+_PURGE_EVERY = 3600  # seconds between purges in the worker
+
+
+def run_worker(poll_interval=2.0, once=False, stale_after=timedelta(minutes=10)):
+    """Poll the outbox forever (or until nothing is due when once=True)."""
+    requeue_stale(stale_after)
+    purge()
+    last_purge = time.monotonic()
+    while True:
+        if send_due():
+            continue
+        if once:
+            return
+        if time.monotonic() - last_purge >= _PURGE_EVERY:
+            purge()
+            last_purge = time.monotonic()
+        time.sleep(poll_interval)
+
+
+# ── Metrics ──
+def _count(last_error=None, **amounts):
+    with _metrics_lock:
+        for name, amount in amounts.items():
+            _metrics[name] += amount
+        if last_error is not None:
+            _metrics['last_error'] = last_error
+
+
+def metrics():
+    """This process's delivery counters plus the outbox backlog."""
+    with _metrics_lock:
+        process = dict(_metrics)
+    process['connect_ms'] = round(process['connect_ms'], 1)
+    process['send_ms'] = round(process['send_ms'], 1)
+    if process['connections']:
+        process['avg_connect_ms'] = round(process['connect_ms'] / process['connections'], 1)
+    if process['sent']:
+        process['avg_send_ms'] = round(process['send_ms'] / process['sent'], 1)
+
+    by_status = dict(db.session.query(OutboundMail.status, func.count(OutboundMail.id))
+                     .group_by(OutboundMail.status).all())
+    oldest = db.session.query(func.min(OutboundMail.created_at))\
+        .filter(OutboundMail.status == 'queued').scalar()
+    return {
+        'mode': current_app.config['MAIL_QUEUE_MODE'],
+        'process': process,
+        'outbox': by_status,
+        'oldest_queued_seconds': round((datetime.utcnow() - oldest).total_seconds()) if oldest else 0,
+    }
@@ -0,0 +1,70 @@
+"""Add indexes for hot lookup and search columns
+
+Revision ID: a3c5e8f1b642
+Revises: d7e3f1a0b925
+Create Date: 2026-10-17 12:00:00.000000
+
+Booking.status/created_at, Report.uploaded_at and User.role are already
+covered by the keyset pagination indexes from c4d2a7e91f03.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3c5e8f1b642'
+down_revision = 'd7e3f1a0b925'
+branch_labels = None
+depends_on = None
+
+
+# (index name, table, columns, partial-index predicate or None)
+INDEXES = [
+    ('ix_users_phone', 'users', ['phone'], None),
+    ('ix_users_oauth_provider_oauth_id', 'users', ['oauth_provider', 'oauth_id'], None),
+    ('ix_bookings_user_id_created_at', 'bookings', ['user_id', 'created_at'], None),
+    ('ix_bookings_user_id_status_booking_date', 'bookings', ['user_id', 'status', 'booking_date'], None),
+    ('ix_bookings_status_booking_date', 'bookings', ['status', 'booking_date'], None),
+    ('ix_bookings_test_id', 'bookings', ['test_id'], None),
+    ('ix_blocked_slots_date_time_slot', 'blocked_slots', ['date', 'time_slot'], None),
+    ('ix_activity_logs_created_at', 'activity_logs', ['created_at'], None),
+    # Partial: only the rows the dashboard / home page actually ask for
+    ('ix_contact_enquiries_unread', 'contact_enquiries', ['created_at'],
+     {'postgresql': 'NOT is_read', 'sqlite': 'is_read = 0'}),
+    ('ix_testimonials_approved_created_at', 'testimonials', ['created_at'],
+     {'postgresql': 'is_approved', 'sqlite': 'is_approved = 1'}),
+]
+
+# (index name, table, column) — GIN trigram indexes for ilike '%...%' searches
+TRGM_INDEXES = [
+    ('ix_users_name_trgm', 'users', 'name'),
+    ('ix_users_email_trgm', 'users', 'email'),
+    ('ix_users_phone_trgm', 'users', 'phone'),
+    ('ix_reports_patient_name_trgm', 'reports', 'patient_name'),
+    ('ix_tests_name_trgm', 'tests', 'name'),
+]
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+
+    for name, table, columns, where in INDEXES:
+        kwargs = {}
+        if where and dialect in where:
+            kwargs[f'{dialect}_where'] = sa.text(where[dialect])
+        op.create_index(name, table, columns, unique=False, **kwargs)
+
+    if dialect == 'postgresql':
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm;")
+        for name, table, column in TRGM_INDEXES:
+            op.execute(f"CREATE INDEX {name} ON {table} USING gin ({column} gin_trgm_ops);")
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        for name, table, column in reversed(TRGM_INDEXES):
+            op.execute(f"DROP INDEX IF EXISTS {name};")
+
+    for name, table, columns, where in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,39 @@
+"""Record when report QR links started being signed
+
+Revision ID: a4d7e2c9f815
+Revises: f3c8e1a7d254
+Create Date: 2026-10-18 12:00:00.000000
+
+/report/<RID>/download now needs the signature qr_url() adds. QR codes
+already printed on reports carry the bare link, so the time of this
+upgrade is stored as site_settings 'report_qr_signed_since' and reports
+uploaded before it keep opening from their bare link while
+REPORT_QR_ALLOW_LEGACY is on (report_access.legacy_qr_allowed()). Set
+REPORT_QR_ALLOW_LEGACY=false to require signed links for every report;
+`flask regenerate-reports` reprints PDFs with signed QR codes.
+
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4d7e2c9f815'
+down_revision = 'f3c8e1a7d254'
+branch_labels = None
+depends_on = None
+
+_settings = sa.table('site_settings', sa.column('key', sa.String), sa.column('value', sa.Text),
+                     sa.column('updated_at', sa.DateTime))
+
+
+def upgrade():
+    now = datetime.utcnow()
+    op.execute(_settings.delete().where(_settings.c.key == 'report_qr_signed_since'))
+    op.bulk_insert(_settings, [{'key': 'report_qr_signed_since', 'value': now.isoformat(),
+                                'updated_at': now}])
+
+
+def downgrade():
+    op.execute(_settings.delete().where(_settings.c.key == 'report_qr_signed_since'))
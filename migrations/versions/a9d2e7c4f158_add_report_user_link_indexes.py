@@ -0,0 +1,36 @@
+"""Add indexes for linking reports to patient accounts
+
+Revision ID: a9d2e7c4f158
+Revises: f6c1a9d4b372
+Create Date: 2026-10-17 21:00:00.000000
+
+reports.user_id is now filled in when a report is created (report_links),
+or when a logged-in patient opens an older report with its password.
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'a9d2e7c4f158'
+down_revision = 'f6c1a9d4b372'
+branch_labels = None
+depends_on = None
+
+
+# (index name, table, columns)
+INDEXES = [
+    ('ix_reports_user_id_uploaded_at', 'reports', ['user_id', 'uploaded_at']),
+    ('ix_reports_phone', 'reports', ['phone']),
+    ('ix_bookings_patient_phone', 'bookings', ['patient_phone']),
+]
+
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, unique=False)
+
+
+def downgrade():
+    for name, table, columns in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
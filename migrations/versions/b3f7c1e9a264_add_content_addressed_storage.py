@@ -0,0 +1,56 @@
+"""Add content-addressed file storage (stored_blobs, blob_chunks)
+
+Revision ID: b3f7c1e9a264
+Revises: a9d2e7c4f158
+Create Date: 2026-10-17 22:00:00.000000
+
+Existing report PDFs and template images stay where they are (file_hash
+NULL) and are still served from disk; move them with `flask storage-import`.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3f7c1e9a264'
+down_revision = 'a9d2e7c4f158'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'stored_blobs',
+        sa.Column('digest', sa.String(length=64), nullable=False),
+        sa.Column('size', sa.BigInteger(), nullable=False),
+        sa.Column('content_type', sa.String(length=100), nullable=True),
+        sa.Column('backend', sa.String(length=20), nullable=False),
+        sa.Column('refs', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('digest')
+    )
+    op.create_table(
+        'blob_chunks',
+        sa.Column('digest', sa.String(length=64), nullable=False),
+        sa.Column('byte_offset', sa.BigInteger(), autoincrement=False, nullable=False),
+        sa.Column('data', sa.LargeBinary(), nullable=False),
+        sa.PrimaryKeyConstraint('digest', 'byte_offset')
+    )
+    with op.batch_alter_table('reports', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('file_hash', sa.String(length=64), nullable=True))
+    with op.batch_alter_table('report_templates', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('file_hash', sa.String(length=64), nullable=True))
+
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("ALTER TABLE stored_blobs ENABLE ROW LEVEL SECURITY;")
+        op.execute("ALTER TABLE blob_chunks ENABLE ROW LEVEL SECURITY;")
+
+
+def downgrade():
+    with op.batch_alter_table('report_templates', schema=None) as batch_op:
+        batch_op.drop_column('file_hash')
+    with op.batch_alter_table('reports', schema=None) as batch_op:
+        batch_op.drop_column('file_hash')
+    op.drop_table('blob_chunks')
+    op.drop_table('stored_blobs')
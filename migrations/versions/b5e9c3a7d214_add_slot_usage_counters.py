@@ -0,0 +1,44 @@
+"""Add slot_usage booking counters for slot capacity
+
+Revision ID: b5e9c3a7d214
+Revises: f2b7d4c9e1a8
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5e9c3a7d214'
+down_revision = 'f2b7d4c9e1a8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'slot_usage',
+        sa.Column('date', sa.Date(), nullable=False),
+        sa.Column('slot_time', sa.String(length=20), nullable=False),
+        sa.Column('kind', sa.String(length=10), nullable=False),
+        sa.Column('booked', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('date', 'slot_time', 'kind')
+    )
+
+    # Count the live (not cancelled) bookings already on the books
+    op.execute("""
+        INSERT INTO slot_usage (date, slot_time, kind, booked)
+        SELECT booking_date, slot_time,
+               CASE WHEN home_collection THEN 'home' ELSE 'lab' END, COUNT(*)
+        FROM bookings
+        WHERE COALESCE(status, 'pending') != 'cancelled'
+        GROUP BY booking_date, slot_time, CASE WHEN home_collection THEN 'home' ELSE 'lab' END
+    """)
+
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("ALTER TABLE slot_usage ENABLE ROW LEVEL SECURITY;")
+
+
+def downgrade():
+    op.drop_table('slot_usage')
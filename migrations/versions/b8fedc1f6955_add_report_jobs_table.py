@@ -0,0 +1,47 @@
+"""Add report_jobs table for background PDF generation
+
+Revision ID: b8fedc1f6955
+Revises: e9b247db6051
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8fedc1f6955'
+down_revision = 'e9b247db6051'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'report_jobs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('report_id', sa.Integer(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=True),
+        sa.Column('download_url', sa.String(length=300), nullable=True),
+        sa.Column('attempts', sa.Integer(), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['report_id'], ['reports.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('report_jobs', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_report_jobs_report_id'), ['report_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_report_jobs_status'), ['status'], unique=False)
+
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("ALTER TABLE report_jobs ENABLE ROW LEVEL SECURITY;")
+
+
+def downgrade():
+    with op.batch_alter_table('report_jobs', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_report_jobs_status'))
+        batch_op.drop_index(batch_op.f('ix_report_jobs_report_id'))
+
+    op.drop_table('report_jobs')
@@ -0,0 +1,38 @@
+"""Add composite indexes for keyset pagination of admin lists
+
+Revision ID: c4d2a7e91f03
+Revises: b8fedc1f6955
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4d2a7e91f03'
+down_revision = 'b8fedc1f6955'
+branch_labels = None
+depends_on = None
+
+
+# (index name, table, columns) — newest-first pages seek on (timestamp, id)
+INDEXES = [
+    ('ix_users_created_at_id', 'users', ['created_at', 'id']),
+    ('ix_users_role_created_at_id', 'users', ['role', 'created_at', 'id']),
+    ('ix_bookings_created_at_id', 'bookings', ['created_at', 'id']),
+    ('ix_bookings_status_created_at_id', 'bookings', ['status', 'created_at', 'id']),
+    ('ix_reports_uploaded_at_id', 'reports', ['uploaded_at', 'id']),
+    ('ix_contact_enquiries_created_at_id', 'contact_enquiries', ['created_at', 'id']),
+    ('ix_testimonials_created_at_id', 'testimonials', ['created_at', 'id']),
+    ('ix_doctor_referrals_created_at_id', 'doctor_referrals', ['created_at', 'id']),
+]
+
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, unique=False)
+
+
+def downgrade():
+    for name, table, columns in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,34 @@
+"""Add throttle_hits for shared attempt throttling
+
+Revision ID: c8e2a5f7d913
+Revises: b3f7c1e9a264
+Create Date: 2026-10-17 23:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c8e2a5f7d913'
+down_revision = 'b3f7c1e9a264'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'throttle_hits',
+        sa.Column('scope', sa.String(length=20), nullable=False),
+        sa.Column('key', sa.String(length=32), nullable=False),
+        sa.Column('window_index', sa.BigInteger(), autoincrement=False, nullable=False),
+        sa.Column('hits', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('scope', 'key', 'window_index')
+    )
+
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("ALTER TABLE throttle_hits ENABLE ROW LEVEL SECURITY;")
+
+
+def downgrade():
+    op.drop_table('throttle_hits')
@@ -0,0 +1,54 @@
+"""Add block_rules and make blocked_slots unique per date/slot
+
+Revision ID: c8f4a2d6e913
+Revises: b5e9c3a7d214
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c8f4a2d6e913'
+down_revision = 'b5e9c3a7d214'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'block_rules',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('start_date', sa.Date(), nullable=False),
+        sa.Column('end_date', sa.Date(), nullable=True),
+        sa.Column('weekdays', sa.Integer(), nullable=True),
+        sa.Column('time_slots', sa.Text(), nullable=True),
+        sa.Column('reason', sa.String(length=200), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_block_rules_start_date_end_date', 'block_rules',
+                    ['start_date', 'end_date'])
+
+    # Keep the oldest of any duplicate blocks before adding the unique index
+    op.execute("""
+        DELETE FROM blocked_slots
+        WHERE id NOT IN (
+            SELECT MIN(id) FROM blocked_slots
+            GROUP BY date, COALESCE(time_slot, '')
+        )
+    """)
+    op.drop_index('ix_blocked_slots_date_time_slot', table_name='blocked_slots')
+    op.create_index('uq_blocked_slots_date_time_slot', 'blocked_slots',
+                    ['date', sa.text("coalesce(time_slot, '')")], unique=True)
+
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("ALTER TABLE block_rules ENABLE ROW LEVEL SECURITY;")
+
+
+def downgrade():
+    op.drop_index('uq_blocked_slots_date_time_slot', table_name='blocked_slots')
+    op.create_index('ix_blocked_slots_date_time_slot', 'blocked_slots', ['date', 'time_slot'])
+    op.drop_index('ix_block_rules_start_date_end_date', table_name='block_rules')
+    op.drop_table('block_rules')
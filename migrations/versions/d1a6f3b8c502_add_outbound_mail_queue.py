@@ -0,0 +1,45 @@
+"""Add outbound_mail queue
+
+Revision ID: d1a6f3b8c502
+Revises: c8f4a2d6e913
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd1a6f3b8c502'
+down_revision = 'c8f4a2d6e913'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'outbound_mail',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('subject', sa.String(length=255), nullable=False),
+        sa.Column('recipients', sa.Text(), nullable=False),
+        sa.Column('sender', sa.String(length=255), nullable=True),
+        sa.Column('body', sa.Text(), nullable=True),
+        sa.Column('html', sa.Text(), nullable=True),
+        sa.Column('status', sa.String(length=20), nullable=True),
+        sa.Column('attempts', sa.Integer(), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('next_attempt_at', sa.DateTime(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('sent_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_outbound_mail_status_next_attempt_at', 'outbound_mail',
+                    ['status', 'next_attempt_at'])
+
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("ALTER TABLE outbound_mail ENABLE ROW LEVEL SECURITY;")
+
+
+def downgrade():
+    op.drop_index('ix_outbound_mail_status_next_attempt_at', table_name='outbound_mail')
+    op.drop_table('outbound_mail')
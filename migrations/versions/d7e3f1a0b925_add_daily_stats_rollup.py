@@ -0,0 +1,44 @@
+"""Add daily_stats booking/revenue rollup
+
+Revision ID: d7e3f1a0b925
+Revises: c4d2a7e91f03
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7e3f1a0b925'
+down_revision = 'c4d2a7e91f03'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'daily_stats',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('test_id', sa.Integer(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('bookings', sa.Integer(), nullable=False),
+        sa.Column('revenue', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('day', 'test_id', 'status')
+    )
+
+    # Backfill from existing bookings (same as `flask backfill-daily-stats`)
+    op.execute("""
+        INSERT INTO daily_stats (day, test_id, status, bookings, revenue)
+        SELECT b.booking_date, b.test_id, COALESCE(b.status, 'pending'),
+               COUNT(b.id), COALESCE(SUM(t.price), 0)
+        FROM bookings b JOIN tests t ON t.id = b.test_id
+        GROUP BY b.booking_date, b.test_id, COALESCE(b.status, 'pending')
+    """)
+
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("ALTER TABLE daily_stats ENABLE ROW LEVEL SECURITY;")
+
+
+def downgrade():
+    op.drop_table('daily_stats')
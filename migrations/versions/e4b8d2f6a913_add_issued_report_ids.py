@@ -0,0 +1,34 @@
+"""Add issued_report_ids for random report ID allocation
+
+Revision ID: e4b8d2f6a913
+Revises: d1a6f3b8c502
+Create Date: 2026-10-17 19:00:00.000000
+
+Report IDs are drawn at random and claimed one by one here (report_ids.py);
+reports already issued are skipped when drawing, so no backfill is needed.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4b8d2f6a913'
+down_revision = 'd1a6f3b8c502'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'issued_report_ids',
+        sa.Column('report_id', sa.String(length=20), nullable=False),
+        sa.PrimaryKeyConstraint('report_id')
+    )
+
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("ALTER TABLE issued_report_ids ENABLE ROW LEVEL SECURITY;")
+
+
+def downgrade():
+    op.drop_table('issued_report_ids')
@@ -0,0 +1,42 @@
+"""Record the booked price on bookings and rebuild daily_stats from it
+
+Revision ID: e7a3c9f2b416
+Revises: c8e2a5f7d913
+Create Date: 2026-10-18 10:00:00.000000
+
+Existing bookings get their test's current price (the best record there
+is). The rollup is rebuilt from those prices, which also clears any drift
+left by price changes under the old triggers.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7a3c9f2b416'
+down_revision = 'c8e2a5f7d913'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('bookings', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('price', sa.Float(), nullable=True))
+
+    op.execute("UPDATE bookings SET price = (SELECT t.price FROM tests t WHERE t.id = bookings.test_id)")
+
+    # Same as `flask backfill-daily-stats`
+    op.execute("DELETE FROM daily_stats")
+    op.execute("""
+        INSERT INTO daily_stats (day, test_id, status, bookings, revenue)
+        SELECT b.booking_date, b.test_id, COALESCE(b.status, 'pending'),
+               COUNT(b.id), COALESCE(SUM(COALESCE(b.price, t.price)), 0)
+        FROM bookings b JOIN tests t ON t.id = b.test_id
+        GROUP BY b.booking_date, b.test_id, COALESCE(b.status, 'pending')
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('bookings', schema=None) as batch_op:
+        batch_op.drop_column('price')
@@ -0,0 +1,35 @@
+"""Add full-text search index on tests
+
+Revision ID: f2b7d4c9e1a8
+Revises: a3c5e8f1b642
+Create Date: 2026-10-17 13:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2b7d4c9e1a8'
+down_revision = 'a3c5e8f1b642'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # PostgreSQL only; SQLite uses the in-memory index in search.py.
+    # The expression must match search._TSVECTOR for the planner to use it.
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute(
+        "CREATE INDEX ix_tests_search_tsv ON tests USING gin "
+        "(to_tsvector('simple', coalesce(name, '') || ' ' || coalesce(description, '')));"
+    )
+    op.execute("CREATE INDEX ix_test_categories_name_trgm ON test_categories "
+               "USING gin (name gin_trgm_ops);")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute("DROP INDEX IF EXISTS ix_test_categories_name_trgm;")
+    op.execute("DROP INDEX IF EXISTS ix_tests_search_tsv;")
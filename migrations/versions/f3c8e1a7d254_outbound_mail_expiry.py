@@ -0,0 +1,32 @@
+"""Add outbound_mail.expires_at and blank bodies of finished messages
+
+Revision ID: f3c8e1a7d254
+Revises: e7a3c9f2b416
+Create Date: 2026-10-18 11:00:00.000000
+
+Messages already sent or given up on may hold OTPs; their bodies are
+cleared here, as mail_queue.py now does when a message finishes.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3c8e1a7d254'
+down_revision = 'e7a3c9f2b416'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('outbound_mail', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('expires_at', sa.DateTime(), nullable=True))
+
+    op.execute("UPDATE outbound_mail SET body = '', html = NULL WHERE status IN ('sent', 'failed')")
+
+
+def downgrade():
+    op.execute("UPDATE outbound_mail SET status = 'failed' WHERE status = 'expired'")
+    with op.batch_alter_table('outbound_mail', schema=None) as batch_op:
+        batch_op.drop_column('expires_at')
@@ -0,0 +1,133 @@
+"""Add report_results and backfill it from reports.test_results_json
+
+Revision ID: f6c1a9d4b372
+Revises: e4b8d2f6a913
+Create Date: 2026-10-17 20:00:00.000000
+
+"""
+import json
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f6c1a9d4b372'
+down_revision = 'e4b8d2f6a913'
+branch_labels = None
+depends_on = None
+
+BATCH = 500
+
+
+def _number(text):
+    try:
+        return float(str(text).strip())
+    except (TypeError, ValueError):
+        return None
+
+
+def _rows(report_id, results):
+    # Same rules report_results.build_rows applies without parameter bounds
+    rows = []
+    for position, result in enumerate(results):
+        if not isinstance(result, dict):
+            continue
+        raw_value = str(result.get('value', '')).strip()
+        normal_range = str(result.get('normal_range', '')).strip()
+        parts = normal_range.split('-')
+        low = high = None
+        if len(parts) == 2 and _number(parts[0]) is not None and _number(parts[1]) is not None:
+            low, high = _number(parts[0]), _number(parts[1])
+        value = _number(raw_value)
+        rows.append({
+            'report_id': report_id,
+            'position': position,
+            'parameter_name': str(result.get('parameter', '')).strip()[:150],
+            'raw_value': raw_value[:100],
+            'numeric_value': value,
+            'unit': str(result.get('unit', '')).strip()[:50],
+            'normal_range': normal_range[:100],
+            'range_min': low,
+            'range_max': high,
+            'is_abnormal': (value < low or value > high)
+            if value is not None and low is not None else None,
+        })
+    return rows
+
+
+def upgrade():
+    op.create_table(
+        'report_results',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('report_id', sa.Integer(), nullable=False),
+        sa.Column('position', sa.Integer(), nullable=False),
+        sa.Column('parameter_id', sa.Integer(), nullable=True),
+        sa.Column('parameter_name', sa.String(length=150), nullable=False),
+        sa.Column('raw_value', sa.String(length=100), nullable=True),
+        sa.Column('numeric_value', sa.Float(), nullable=True),
+        sa.Column('unit', sa.String(length=50), nullable=True),
+        sa.Column('normal_range', sa.String(length=100), nullable=True),
+        sa.Column('range_min', sa.Float(), nullable=True),
+        sa.Column('range_max', sa.Float(), nullable=True),
+        sa.Column('is_abnormal', sa.Boolean(), nullable=True),
+        sa.ForeignKeyConstraint(['report_id'], ['reports.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['parameter_id'], ['test_parameters.id'], ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_report_results_report_id_position', 'report_results',
+                    ['report_id', 'position'])
+    op.create_index('ix_report_results_parameter_id_is_abnormal', 'report_results',
+                    ['parameter_id', 'is_abnormal'])
+    op.create_index('ix_report_results_parameter_name_is_abnormal', 'report_results',
+                    ['parameter_name', 'is_abnormal'])
+
+    # Backfill in id order, a batch of reports at a time
+    bind = op.get_bind()
+    reports = sa.table('reports', sa.column('id', sa.Integer),
+                       sa.column('test_results_json', sa.Text))
+    results = sa.table('report_results', *[sa.column(c) for c in (
+        'report_id', 'position', 'parameter_name', 'raw_value', 'numeric_value', 'unit',
+        'normal_range', 'range_min', 'range_max', 'is_abnormal')])
+    last_id = 0
+    while True:
+        batch = bind.execute(
+            sa.select(reports.c.id, reports.c.test_results_json)
+            .where(reports.c.id > last_id).order_by(reports.c.id).limit(BATCH)
+        ).all()
+        if not batch:
+            break
+        rows = []
+        for report_id, blob in batch:
+            try:
+                parsed = json.loads(blob) if blob else []
+            except (ValueError, TypeError):
+                parsed = []
+            if isinstance(parsed, list):
+                rows.extend(_rows(report_id, parsed))
+        if rows:
+            bind.execute(results.insert(), rows)
+        last_id = batch[-1][0]
+
+    if bind.dialect.name == 'postgresql':
+        op.execute("ALTER TABLE report_results ENABLE ROW LEVEL SECURITY;")
+
+
+def downgrade():
+    # Reports created since the upgrade only have rows; put them back as JSON
+    bind = op.get_bind()
+    rows = bind.execute(sa.text(
+        "SELECT report_id, parameter_name, raw_value, unit, normal_range "
+        "FROM report_results ORDER BY report_id, position")).all()
+    by_report = {}
+    for report_id, name, value, unit, normal_range in rows:
+        by_report.setdefault(report_id, []).append(
+            {'parameter': name, 'value': value or '', 'unit': unit or '',
+             'normal_range': normal_range or ''})
+    for report_id, results in by_report.items():
+        bind.execute(sa.text("UPDATE reports SET test_results_json = :blob WHERE id = :id"),
+                     {'blob': json.dumps(results), 'id': report_id})
+
+    op.drop_index('ix_report_results_parameter_name_is_abnormal', table_name='report_results')
+    op.drop_index('ix_report_results_parameter_id_is_abnormal', table_name='report_results')
+    op.drop_index('ix_report_results_report_id_position', table_name='report_results')
+    op.drop_table('report_results')
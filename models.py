@@ -1,13 +1,20 @@
 from datetime import datetime
-import random
 import json
-from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
 from extensions import db
+import passwords
 
 
 class User(UserMixin, db.Model):
     __tablename__ = 'users'
+    # PostgreSQL also has pg_trgm GIN indexes on name/email/phone for the
+    # admin patient search; they live only in migration a3c5e8f1b642.
+    __table_args__ = (
+        db.Index('ix_users_created_at_id', 'created_at', 'id'),
+        db.Index('ix_users_role_created_at_id', 'role', 'created_at', 'id'),
+        db.Index('ix_users_phone', 'phone'),
+        db.Index('ix_users_oauth_provider_oauth_id', 'oauth_provider', 'oauth_id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
@@ -26,10 +33,13 @@ class User(UserMixin, db.Model):
     testimonials = db.relationship('Testimonial', backref='user', lazy=True)
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = passwords.hash_password('user', password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        ok, upgraded = passwords.verify('user', self.password_hash, password)
+        if upgraded:
+            self.password_hash = upgraded  # saved by the caller's next commit
+        return ok
 
     def is_admin(self):
         return self.role == 'admin'
@@ -94,11 +104,21 @@ class ReportTemplate(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     file_path = db.Column(db.String(300), nullable=False)
+    file_hash = db.Column(db.String(64), nullable=True)  # storage.py blob; None = legacy static file
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 
 class Booking(db.Model):
     __tablename__ = 'bookings'
+    __table_args__ = (
+        db.Index('ix_bookings_created_at_id', 'created_at', 'id'),
+        db.Index('ix_bookings_status_created_at_id', 'status', 'created_at', 'id'),
+        db.Index('ix_bookings_user_id_created_at', 'user_id', 'created_at'),
+        db.Index('ix_bookings_user_id_status_booking_date', 'user_id', 'status', 'booking_date'),
+        db.Index('ix_bookings_status_booking_date', 'status', 'booking_date'),
+        db.Index('ix_bookings_test_id', 'test_id'),
+        db.Index('ix_bookings_patient_phone', 'patient_phone'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -118,6 +138,7 @@ class Booking(db.Model):
     referral_doctor = db.Column(db.String(100), default='')
     payment_mode = db.Column(db.String(20), default='Offline') # Cash/Offline
     payment_status = db.Column(db.String(20), default='pending')
+    price = db.Column(db.Float, nullable=True)  # test price when booked (daily_stats.py)
 
     home_collection = db.Column(db.Boolean, default=False)
     collection_address = db.Column(db.Text, default='') # Keeping for backwards compatibility if needed, or alias to patient_address
@@ -128,6 +149,12 @@ class Booking(db.Model):
 class BlockedSlot(db.Model):
     """Model to manage availability (Admin Blocks)."""
     __tablename__ = 'blocked_slots'
+    __table_args__ = (
+        # One row per date/slot (a NULL slot counts once too), so bulk
+        # blocking can INSERT ... ON CONFLICT DO NOTHING
+        db.Index('uq_blocked_slots_date_time_slot', 'date',
+                 db.text("coalesce(time_slot, '')"), unique=True),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     date = db.Column(db.Date, nullable=False)
@@ -136,8 +163,68 @@ class BlockedSlot(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 
+class BlockRule(db.Model):
+    """Recurring / ranged availability block, expanded when availability is read."""
+    __tablename__ = 'block_rules'
+    __table_args__ = (
+        db.Index('ix_block_rules_start_date_end_date', 'start_date', 'end_date'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    start_date = db.Column(db.Date, nullable=False)
+    end_date = db.Column(db.Date, nullable=True)  # If NULL, repeats indefinitely
+    weekdays = db.Column(db.Integer, nullable=True)  # Bitmask, Monday = 1; NULL = every day
+    time_slots = db.Column(db.Text, nullable=True)  # Comma-separated; NULL = entire day
+    reason = db.Column(db.String(200), default='Unavailable')
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    WEEKDAY_NAMES = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+
+    @property
+    def slot_list(self):
+        return self.time_slots.split(',') if self.time_slots else []
+
+    @property
+    def weekday_list(self):
+        if not self.weekdays:
+            return []
+        return [name for i, name in enumerate(self.WEEKDAY_NAMES) if self.weekdays & (1 << i)]
+
+    def applies_to(self, date):
+        if date < self.start_date or (self.end_date and date > self.end_date):
+            return False
+        return not self.weekdays or bool(self.weekdays & (1 << date.weekday()))
+
+
+class SlotUsage(db.Model):
+    """Live bookings per (date, slot, lab/home), kept current by availability.py."""
+    __tablename__ = 'slot_usage'
+
+    date = db.Column(db.Date, primary_key=True)
+    slot_time = db.Column(db.String(20), primary_key=True)
+    kind = db.Column(db.String(10), primary_key=True)  # lab / home
+    booked = db.Column(db.Integer, nullable=False, default=0)
+
+
+class DailyStat(db.Model):
+    """Booking rollup per (day, test, status), kept current by daily_stats.py."""
+    __tablename__ = 'daily_stats'
+
+    day = db.Column(db.Date, primary_key=True)
+    test_id = db.Column(db.Integer, primary_key=True)
+    status = db.Column(db.String(20), primary_key=True)
+    bookings = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)  # sum of Booking.price
+
+
 class Report(db.Model):
     __tablename__ = 'reports'
+    # patient_name has a pg_trgm GIN index on PostgreSQL (migration a3c5e8f1b642)
+    __table_args__ = (
+        db.Index('ix_reports_uploaded_at_id', 'uploaded_at', 'id'),
+        db.Index('ix_reports_user_id_uploaded_at', 'user_id', 'uploaded_at'),
+        db.Index('ix_reports_phone', 'phone'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     report_id = db.Column(db.String(20), unique=True, nullable=False)  # RID format
@@ -145,11 +232,12 @@ class Report(db.Model):
     token_number = db.Column(db.String(50), unique=True, nullable=False)
     password_hash = db.Column(db.String(256), nullable=False)
     file_path = db.Column(db.String(300), nullable=False)
+    file_hash = db.Column(db.String(64), nullable=True)  # storage.py blob; None = legacy UPLOAD_FOLDER file
     remarks = db.Column(db.Text, default='')
     uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     # New fields for admin-created reports
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)  # set by report_links
     age = db.Column(db.Integer, nullable=True)
     gender = db.Column(db.String(10), nullable=True)
     doctor_name = db.Column(db.String(100), default='')
@@ -164,11 +252,9 @@ class Report(db.Model):
 
     @staticmethod
     def generate_report_id():
-        """Generate a unique Report ID in RID + 6 digits format."""
-        while True:
-            rid = f"RID{random.randint(100000, 999999)}"
-            if not Report.query.filter_by(report_id=rid).first():
-                return rid
+        """Allocate a unique Report ID in RID + 6 digits format."""
+        from report_ids import next_report_id
+        return next_report_id()
 
     @staticmethod
     def generate_password_from_name(name):
@@ -177,25 +263,149 @@ class Report(db.Model):
         return cleaned[:4].upper() if len(cleaned) >= 4 else cleaned.upper().ljust(4, 'X')
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = passwords.hash_password('report', password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        ok, upgraded = passwords.verify('report', self.password_hash, password)
+        if upgraded:
+            self.password_hash = upgraded  # saved by the caller's next commit
+        return ok
 
     def get_test_results(self):
-        """Parse test results JSON."""
+        """Test results as [{'parameter', 'value', 'unit', 'normal_range'}].
+
+        Read from report_results; reports saved before that table existed
+        (and not yet backfilled) fall back to the old JSON column.
+        """
+        if self.results:
+            return [r.to_dict() for r in self.results]
         try:
             return json.loads(self.test_results_json) if self.test_results_json else []
         except (json.JSONDecodeError, TypeError):
             return []
 
-    def set_test_results(self, results):
-        """Store test results as JSON."""
-        self.test_results_json = json.dumps(results)
+
+class ReportResult(db.Model):
+    """One parameter's result on a report, written by report_results.py."""
+    __tablename__ = 'report_results'
+    __table_args__ = (
+        db.Index('ix_report_results_report_id_position', 'report_id', 'position'),
+        db.Index('ix_report_results_parameter_id_is_abnormal', 'parameter_id', 'is_abnormal'),
+        db.Index('ix_report_results_parameter_name_is_abnormal', 'parameter_name', 'is_abnormal'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    report_id = db.Column(db.Integer, db.ForeignKey('reports.id', ondelete='CASCADE'), nullable=False)
+    position = db.Column(db.Integer, nullable=False, default=0)
+    parameter_id = db.Column(db.Integer, db.ForeignKey('test_parameters.id', ondelete='SET NULL'),
+                             nullable=True)
+    parameter_name = db.Column(db.String(150), nullable=False)
+    raw_value = db.Column(db.String(100), default='')
+    numeric_value = db.Column(db.Float, nullable=True)  # NULL if raw_value isn't a number
+    unit = db.Column(db.String(50), default='')
+    normal_range = db.Column(db.String(100), default='')
+    range_min = db.Column(db.Float, nullable=True)
+    range_max = db.Column(db.Float, nullable=True)
+    is_abnormal = db.Column(db.Boolean, nullable=True)  # NULL if it can't be judged
+
+    report = db.relationship('Report', backref=db.backref(
+        'results', lazy=True, order_by='ReportResult.position', cascade='all, delete-orphan'))
+
+    def to_dict(self):
+        return {
+            'parameter': self.parameter_name,
+            'value': self.raw_value,
+            'unit': self.unit,
+            'normal_range': self.normal_range,
+            'is_abnormal': self.is_abnormal,
+        }
+
+
+class ReportJob(db.Model):
+    """Background PDF generation for an admin-created report."""
+    __tablename__ = 'report_jobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    report_id = db.Column(db.Integer, db.ForeignKey('reports.id'), nullable=False, index=True)
+    status = db.Column(db.String(20), default='queued', index=True)  # queued, running, done, failed
+    download_url = db.Column(db.String(300), default='')
+    attempts = db.Column(db.Integer, default=0)
+    error = db.Column(db.Text, default='')
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    report = db.relationship('Report', backref=db.backref('jobs', lazy=True,
+                                                          cascade='all, delete-orphan'))
+
+
+class OutboundMail(db.Model):
+    """Email waiting to be (or already) sent by mail_queue.py."""
+    __tablename__ = 'outbound_mail'
+    __table_args__ = (
+        db.Index('ix_outbound_mail_status_next_attempt_at', 'status', 'next_attempt_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    subject = db.Column(db.String(255), nullable=False)
+    recipients = db.Column(db.Text, nullable=False)  # Comma-separated
+    sender = db.Column(db.String(255), nullable=True)
+    body = db.Column(db.Text, default='')
+    html = db.Column(db.Text, nullable=True)
+    status = db.Column(db.String(20), default='queued')  # queued, sending, sent, failed, expired
+    attempts = db.Column(db.Integer, default=0)
+    error = db.Column(db.Text, default='')
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+    expires_at = db.Column(db.DateTime, nullable=True)  # not worth sending after this (OTPs)
+
+
+class IssuedReportId(db.Model):
+    """A randomly drawn report ID, claimed by one process (report_ids.py)."""
+    __tablename__ = 'issued_report_ids'
+
+    report_id = db.Column(db.String(20), primary_key=True)
+
+
+class ThrottleHit(db.Model):
+    """Attempts per hashed key in one throttle window (throttle.py)."""
+    __tablename__ = 'throttle_hits'
+
+    scope = db.Column(db.String(20), primary_key=True)
+    key = db.Column(db.String(32), primary_key=True)
+    window_index = db.Column(db.BigInteger, primary_key=True, autoincrement=False)
+    hits = db.Column(db.Integer, nullable=False, default=0)
+
+
+class StoredBlob(db.Model):
+    """One stored file, keyed by the SHA-256 of its content (storage.py)."""
+    __tablename__ = 'stored_blobs'
+
+    digest = db.Column(db.String(64), primary_key=True)
+    size = db.Column(db.BigInteger, nullable=False)
+    content_type = db.Column(db.String(100), default='application/octet-stream')
+    backend = db.Column(db.String(20), nullable=False)  # local, s3, database
+    refs = db.Column(db.Integer, nullable=False, default=1)  # rows pointing at it
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class BlobChunk(db.Model):
+    """Content of a StoredBlob kept in the database backend, in order."""
+    __tablename__ = 'blob_chunks'
+
+    digest = db.Column(db.String(64), primary_key=True)
+    byte_offset = db.Column(db.BigInteger, primary_key=True, autoincrement=False)
+    data = db.Column(db.LargeBinary, nullable=False)
 
 
 class ContactEnquiry(db.Model):
     __tablename__ = 'contact_enquiries'
+    __table_args__ = (
+        db.Index('ix_contact_enquiries_created_at_id', 'created_at', 'id'),
+        db.Index('ix_contact_enquiries_unread', 'created_at',
+                 postgresql_where=db.text('NOT is_read'), sqlite_where=db.text('is_read = 0')),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
@@ -208,6 +418,11 @@ class ContactEnquiry(db.Model):
 
 class Testimonial(db.Model):
     __tablename__ = 'testimonials'
+    __table_args__ = (
+        db.Index('ix_testimonials_created_at_id', 'created_at', 'id'),
+        db.Index('ix_testimonials_approved_created_at', 'created_at',
+                 postgresql_where=db.text('is_approved'), sqlite_where=db.text('is_approved = 1')),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
@@ -220,6 +435,9 @@ class Testimonial(db.Model):
 
 class DoctorReferral(db.Model):
     __tablename__ = 'doctor_referrals'
+    __table_args__ = (
+        db.Index('ix_doctor_referrals_created_at_id', 'created_at', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     doctor_name = db.Column(db.String(100), nullable=False)
@@ -232,6 +450,9 @@ class DoctorReferral(db.Model):
 
 class ActivityLog(db.Model):
     __tablename__ = 'activity_logs'
+    __table_args__ = (
+        db.Index('ix_activity_logs_created_at', 'created_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     admin_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -0,0 +1,101 @@
+"""
+Keyset (cursor) pagination for admin list views.
+
+Pages are newest-first on a (timestamp, id) pair. Instead of OFFSET, each
+page filters on the last row seen, so with a matching composite index the
+cost of a page doesn't depend on how deep into the history it is.
+
+Rows with no timestamp (legacy rows with a NULL created_at) come last, as
+if oldest, in id order. They're fetched with a separate `IS NULL` query
+only when a page reaches them, so both halves still walk the index.
+"""
+import base64
+import binascii
+from collections import namedtuple
+from datetime import datetime
+from sqlalchemy import and_, tuple_
+
+DEFAULT_PER_PAGE = 50
+
+# next_cursor / prev_cursor are None at the ends of the list
+KeysetPage = namedtuple('KeysetPage', ['items', 'next_cursor', 'prev_cursor'])
+
+
+def encode_cursor(sort_value, row_id):
+    raw = f"{sort_value.isoformat() if sort_value is not None else ''}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return (datetime or None, id), or None for a missing or malformed cursor."""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        sort_raw, id_raw = base64.urlsafe_b64decode(padded).decode('utf-8').split('|')
+        return (datetime.fromisoformat(sort_raw) if sort_raw else None), int(id_raw)
+    except (ValueError, UnicodeDecodeError, binascii.Error):
+        return None
+
+
+def keyset_paginate(query, sort_col, id_col, after=None, before=None,
+                    per_page=DEFAULT_PER_PAGE):
+    """
+    Return one KeysetPage of query, newest first.
+
+    after  - cursor of the last row on the previous page (older rows)
+    before - cursor of the first row on the next page (newer rows)
+    The query must not already have an ORDER BY.
+    """
+    key = tuple_(sort_col, id_col)
+    dated, undated = sort_col.isnot(None), sort_col.is_(None)
+    after_key = decode_cursor(after)
+    before_key = decode_cursor(before)
+    limit = per_page + 1
+
+    if before_key:
+        # Walk backwards from the cursor, then flip into display order
+        rows = []
+        if before_key[0] is None:
+            rows = query.filter(undated, id_col > before_key[1])\
+                .order_by(id_col.asc()).limit(limit).all()
+            newer = dated
+        else:
+            newer = and_(dated, key > before_key)
+        if len(rows) < limit:
+            rows += query.filter(newer).order_by(sort_col.asc(), id_col.asc())\
+                .limit(limit - len(rows)).all()
+        has_prev = len(rows) > per_page
+        rows = rows[:per_page][::-1]
+        has_next = True
+    else:
+        rows = []
+        if after_key is None or after_key[0] is not None:
+            older = query.filter(dated)
+            if after_key:
+                older = older.filter(key < after_key)
+            rows = older.order_by(sort_col.desc(), id_col.desc()).limit(limit).all()
+        if len(rows) < limit:
+            older = query.filter(undated)
+            if after_key and after_key[0] is None:
+                older = older.filter(id_col < after_key[1])
+            rows += older.order_by(id_col.desc()).limit(limit - len(rows)).all()
+        has_next = len(rows) > per_page
+        rows = rows[:per_page]
+        has_prev = after_key is not None
+
+    def cursor_for(row):
+        return encode_cursor(getattr(row, sort_col.key), getattr(row, id_col.key))
+
+    return KeysetPage(
+        items=rows,
+        next_cursor=cursor_for(rows[-1]) if rows and has_next else None,
+        prev_cursor=cursor_for(rows[0]) if rows and has_prev else None,
+    )
+
+
+def paginate_request(query, sort_col, id_col, args, per_page=DEFAULT_PER_PAGE):
+    """keyset_paginate() driven by ?after= / ?before= request args."""
+    return keyset_paginate(query, sort_col, id_col,
+                           after=args.get('after'), before=args.get('before'),
+                           per_page=per_page)
@@ -0,0 +1,58 @@
+"""
+Password hashing policy.
+
+Each kind of password has its own Werkzeug method string in config
+(PASSWORD_HASH_USER, PASSWORD_HASH_REPORT), e.g. 'scrypt:16384:8:1' or
+'pbkdf2:sha256:600000', so its CPU cost is a deliberate choice rather
+than whatever the installed Werkzeug defaults to. bench_password_hash.py
+times the candidates on the machine that will run them.
+
+The method and its parameters are stored with every hash. When a password
+verifies against a hash made under a different policy, it's hashed again
+under the current one: raising or lowering a cost takes effect as people
+log in or check reports, without a migration or a password reset. The
+caller's next commit saves the new hash.
+"""
+from flask import current_app
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+KINDS = ('user', 'report')
+
+
+def normalise(method):
+    """A method string with Werkzeug's defaults filled in, as it prefixes stored hashes."""
+    name, *args = method.split(':')
+    if name == 'scrypt':
+        n, r, p = args or (2 ** 15, 8, 1)
+        return f'scrypt:{int(n)}:{int(r)}:{int(p)}'
+    if name == 'pbkdf2':
+        hash_name = args[0] if args else 'sha256'
+        iterations = int(args[1]) if len(args) > 1 else DEFAULT_PBKDF2_ITERATIONS
+        return f'pbkdf2:{hash_name}:{iterations}'
+    raise ValueError(f'Unsupported password hash method {method!r}')
+
+
+def policy(kind):
+    """The configured method string for 'user' or 'report' passwords."""
+    return normalise(current_app.config[f'PASSWORD_HASH_{kind.upper()}'])
+
+
+def hash_password(kind, password):
+    return generate_password_hash(password, method=policy(kind))
+
+
+def needs_rehash(kind, stored):
+    return stored.split('$', 1)[0] != policy(kind)
+
+
+def verify(kind, stored, password):
+    """
+    Check a password against its stored hash. Returns (ok, new_hash), where
+    new_hash is set only when the password matched and the stored hash was
+    made under another policy.
+    """
+    if not stored or not check_password_hash(stored, password):
+        return False, None
+    if needs_rehash(kind, stored):
+        return True, hash_password(kind, password)
+    return True, None
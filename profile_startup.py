@@ -0,0 +1,75 @@
+"""
+Cold-start profiler.
+
+Imports the app in a fresh interpreter with `python -X importtime`, once
+with FAST_STARTUP off and once with it on, and reports the wall-clock time
+of `import app` plus the slowest modules. Third-party modules are rolled up
+into their top-level package; the app's own modules are listed as is.
+
+Usage:
+    python profile_startup.py [top N]
+
+DATABASE_URL is passed through; without it a throwaway SQLite file is used
+so the full-startup run doesn't touch a real database.
+"""
+import os
+import re
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+_LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)')
+_WALL_CLOCK = "import time; t = time.perf_counter(); import app; " \
+              "print('WALL', (time.perf_counter() - t) * 1000)"
+
+
+def first_party(module):
+    top = module.split('.')[0]
+    return os.path.exists(os.path.join(ROOT, top + '.py')) or \
+        os.path.isdir(os.path.join(ROOT, top))
+
+
+def profile(fast, database_url):
+    env = dict(os.environ, FAST_STARTUP='1' if fast else '0', DATABASE_URL=database_url)
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', _WALL_CLOCK],
+                            cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    wall_ms = float(re.search(r'WALL ([\d.]+)', result.stdout).group(1))
+
+    # Cumulative time of each package's outermost import, self time for
+    # first-party modules (their cumulative time already includes the rest)
+    packages = defaultdict(float)
+    modules = {}
+    for self_us, cumulative_us, indent, module in _LINE.findall(result.stderr):
+        if first_party(module):
+            modules[module] = int(self_us) / 1000
+            continue
+        top = module.split('.')[0]
+        if module == top:
+            packages[top] += int(cumulative_us) / 1000
+    return wall_ms, packages, modules
+
+
+def main():
+    top_n = int(sys.argv[1]) if len(sys.argv) > 1 else 12
+    database_url = os.environ.get('DATABASE_URL')
+    if not database_url:
+        fd, path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        database_url = f'sqlite:///{path}'
+
+    for fast in (False, True):
+        wall_ms, packages, modules = profile(fast, database_url)
+        print(f"── FAST_STARTUP={'on' if fast else 'off'}: import app took {wall_ms:.0f} ms")
+        print("  slowest packages (cumulative):")
+        for name, ms in sorted(packages.items(), key=lambda kv: -kv[1])[:top_n]:
+            print(f"    {name:32s} {ms:8.1f} ms")
+        print("  app modules (self, incl. create_app for 'app'):")
+        for name, ms in sorted(modules.items(), key=lambda kv: -kv[1])[:top_n]:
+            print(f"    {name:32s} {ms:8.1f} ms")
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+Normal-range evaluation for test results.
+
+Range text is written by hand on each TestParameter, so it comes in many
+shapes: "12.0 - 17.5", "4,000-11,000", "1,50,000 - 4,50,000" (lakh
+grouping), "< 200", "≥ 40", "Up to 34",
+"-2 - 2", or per-group variants such as "M: 13 - 17; F: 12 - 15.5" and
+"Adult: 0.6 - 1.2, Child: 0.3 - 0.7". compile_range() parses a text once
+into typed Bound rows and caches the result, so flagging a report only
+compares floats. Numeric normal_range_min/max on the TestParameter are
+used when the text has no group-specific variants.
+"""
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+# gender: 'M' / 'F' / None (any); ages in years, [age_min, age_max)
+Bound = namedtuple('Bound', [
+    'gender', 'age_min', 'age_max', 'low', 'high', 'low_inclusive', 'high_inclusive',
+])
+
+_NUMBER = r'-?\d+(?:\.\d+)?'
+_BETWEEN = re.compile(rf'({_NUMBER})\s*(?:-|to)\s*({_NUMBER})')
+_COMPARE = re.compile(rf'(<=|>=|<|>)\s*({_NUMBER})')
+_WORDED = re.compile(rf'(up ?to|less than|below|under|more than|greater than|above|over)\s*({_NUMBER})')
+# Any comma between digits is digit grouping, Western (4,000) or Indian
+# (1,50,000). Clauses are split on ; | newline, or a comma before a label
+# word ("Adult: 0.6 - 1.2, Child: 0.3 - 0.7") — never a comma in a number
+_DIGIT_GROUPING = re.compile(r'(?<=\d),(?=\d)')
+_CLAUSE_SPLIT = re.compile(r'[;\n|]|,(?=\s*[a-z])')
+_UNICODE = str.maketrans({'≤': '<=', '≥': '>=', '–': '-', '—': '-', '−': '-'})
+
+_WORDED_OPS = {'up to': '<=', 'upto': '<=', 'less than': '<', 'below': '<', 'under': '<',
+               'more than': '>', 'greater than': '>', 'above': '>', 'over': '>'}
+
+# Label word -> (gender, age_min, age_max)
+_GROUPS = [
+    (re.compile(r'\b(female|females|women|woman|f)\b'), ('F', None, None)),
+    (re.compile(r'\b(male|males|men|man|m)\b'), ('M', None, None)),
+    (re.compile(r'\b(newborn|neonates?|infants?)\b'), (None, 0, 1)),
+    (re.compile(r'\b(child|children|paediatric|pediatric|kids?)\b'), (None, 0, 18)),
+    (re.compile(r'\b(elderly|seniors?)\b'), (None, 60, None)),
+    (re.compile(r'\b(adults?)\b'), (None, 18, None)),
+]
+
+
+def parse_value(raw):
+    """A result value as a float, or None for text results ('Nil', 'Reactive')."""
+    try:
+        return float(raw)
+    except (TypeError, ValueError):
+        pass
+    try:
+        return float(_DIGIT_GROUPING.sub('', str(raw)).strip())
+    except (TypeError, ValueError):
+        return None
+
+
+def normalise_gender(gender):
+    g = str(gender or '').strip().lower()
+    if g in ('m', 'male'):
+        return 'M'
+    if g in ('f', 'female'):
+        return 'F'
+    return None
+
+
+def _group(label):
+    gender = age_min = age_max = None
+    for pattern, (g, lo, hi) in _GROUPS:
+        if pattern.search(label):
+            gender = gender or g
+            if lo is not None or hi is not None:
+                age_min, age_max = lo, hi
+    return gender, age_min, age_max
+
+
+def _parse_clause(clause):
+    """One 'label: bounds' clause -> Bound, or None if it has no bounds."""
+    text = clause.replace('=<', '<=').replace('=>', '>=')
+    between = _BETWEEN.search(text)
+    compare = _COMPARE.search(text)
+    worded = _WORDED.search(text)
+
+    if between:
+        low, high = float(between.group(1)), float(between.group(2))
+        if low > high:
+            low, high = high, low
+        bounds, span = (low, high, True, True), between.span()
+    elif compare or worded:
+        match = compare or worded
+        op = match.group(1) if compare else _WORDED_OPS[match.group(1)]
+        number = float(match.group(2))
+        if op.startswith('<'):
+            bounds = (None, number, True, op == '<=')
+        else:
+            bounds = (number, None, op == '>=', True)
+        span = match.span()
+    else:
+        return None
+
+    label = text[:span[0]] + ' ' + text[span[1]:]
+    return Bound(*_group(label), *bounds)
+
+
+@lru_cache(maxsize=4096)
+def compile_range(text, low=None, high=None):
+    """Parse range text (and a parameter's numeric bounds) into Bound rows."""
+    normalised = _DIGIT_GROUPING.sub('', str(text or '').translate(_UNICODE).lower())
+
+    bounds = tuple(b for b in (_parse_clause(c) for c in _CLAUSE_SPLIT.split(normalised)) if b)
+    grouped = any(b.gender or b.age_min is not None or b.age_max is not None for b in bounds)
+    if not grouped and (low is not None or high is not None):
+        return (Bound(None, None, None, low, high, True, True),)
+    return bounds
+
+
+def _applies(bound, gender, age):
+    if bound.gender and bound.gender != gender:
+        return False
+    if bound.age_min is None and bound.age_max is None:
+        return True
+    if age is None:
+        return False
+    return (bound.age_min is None or age >= bound.age_min) and \
+        (bound.age_max is None or age < bound.age_max)
+
+
+def bound_for(bounds, gender=None, age=None):
+    """The most specific Bound that applies to this patient, or None."""
+    best, best_score = None, -1
+    for bound in bounds:
+        if not _applies(bound, gender, age):
+            continue
+        score = (bound.gender is not None) + (bound.age_min is not None or bound.age_max is not None)
+        if score > best_score:
+            best, best_score = bound, score
+    return best
+
+
+def is_abnormal(value, bound):
+    """True/False, or None when there's nothing to compare."""
+    if value is None or bound is None:
+        return None
+    if bound.low is not None and (value < bound.low or (value == bound.low and not bound.low_inclusive)):
+        return True
+    if bound.high is not None and (value > bound.high or (value == bound.high and not bound.high_inclusive)):
+        return True
+    return False
+
+
+def _age_years(age):
+    try:
+        return float(age)
+    except (TypeError, ValueError):
+        return None
+
+
+def evaluate(results, gender=None, age=None, parameters=()):
+    """[(value, Bound or None, abnormal flag)] for a report's result dicts.
+
+    One pass: each distinct range is compiled once (and cached across
+    reports). parameters are the test's TestParameter/CatalogueParameter
+    rows, matched to results by name for their numeric bounds.
+    """
+    gender = normalise_gender(gender)
+    age = _age_years(age)
+    numeric = {p.parameter_name.strip().lower(): (p.normal_range_min, p.normal_range_max)
+               for p in parameters}
+    chosen = {}  # (range text, min, max) -> Bound for this patient
+    evaluated = []
+    for result in results:
+        key = (str(result.get('normal_range', '')).strip(),
+               *numeric.get(str(result.get('parameter', '')).strip().lower(), (None, None)))
+        try:
+            bound = chosen[key]
+        except KeyError:
+            bound = chosen[key] = bound_for(compile_range(*key), gender, age)
+        value = parse_value(result.get('value', ''))
+        evaluated.append((value, bound, is_abnormal(value, bound)))
+    return evaluated
+
+
+def flag_results(results, gender=None, age=None):
+    """Abnormal flags for result dicts, using stored 'is_abnormal' where present."""
+    pending = [r for r in results if r.get('is_abnormal') is None]
+    computed = iter(flag for _, _, flag in evaluate(pending, gender, age))
+    return [r['is_abnormal'] if r.get('is_abnormal') is not None else next(computed)
+            for r in results]
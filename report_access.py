@@ -0,0 +1,98 @@
+"""
+Who may see a report without typing its password again.
+
+A correct password on /check-report puts a signed, timestamped token for
+that report in the session (good for REPORT_ACCESS_TTL seconds), so the
+result page, reloads and the PDF download are checked with an HMAC instead
+of another password hash. The token carries the tail of the report's
+password hash, so changing the password cuts off anyone still holding one.
+Admins and the patient account a report is linked to never need a token.
+
+The QR code printed on a report links to /report/<RID>/download with a
+second, non-expiring signature over the RID (qr_url()), so scanning the
+paper report opens the PDF but knowing or guessing an RID doesn't.
+Reports printed before links were signed still open from their bare link
+while REPORT_QR_ALLOW_LEGACY is on (legacy_qr_allowed()).
+"""
+from datetime import datetime
+from flask import current_app, session, url_for
+from flask_login import current_user
+from itsdangerous import BadSignature, URLSafeSerializer, URLSafeTimedSerializer
+from extensions import db
+from models import SiteSettings
+
+SESSION_KEY = 'report_access'
+QR_SIGNED_SINCE_KEY = 'report_qr_signed_since'  # site_settings, written by migration a4d7e2c9f815
+_MAX_TOKENS = 10  # reports one browser can have open at a time
+
+
+def _serializer():
+    return URLSafeTimedSerializer(current_app.secret_key, salt='report-access')
+
+
+def _fingerprint(report):
+    return (report.password_hash or '')[-16:]
+
+
+def grant(report):
+    """Remember that this browser just proved it knows the report's password."""
+    tokens = dict(session.get(SESSION_KEY, {}))
+    tokens.pop(str(report.id), None)
+    tokens[str(report.id)] = _serializer().dumps([report.id, _fingerprint(report)])
+    session[SESSION_KEY] = dict(list(tokens.items())[-_MAX_TOKENS:])
+
+
+def has_token(report):
+    """Whether the session holds a live token for this report."""
+    token = session.get(SESSION_KEY, {}).get(str(report.id))
+    if not token:
+        return False
+    try:
+        report_id, fingerprint = _serializer().loads(
+            token, max_age=current_app.config['REPORT_ACCESS_TTL'])
+    except BadSignature:  # includes SignatureExpired
+        return False
+    return report_id == report.id and fingerprint == _fingerprint(report)
+
+
+def can_view(report):
+    """Admins, the linked patient account, or a browser holding a token."""
+    if current_user.is_authenticated and \
+            (current_user.is_admin() or current_user.id == report.user_id):
+        return True
+    return has_token(report)
+
+
+def _qr_serializer():
+    return URLSafeSerializer(current_app.secret_key, salt='report-qr')
+
+
+def qr_token(report_id):
+    """The signature a report's QR code carries. It doesn't expire: it's printed."""
+    return _qr_serializer().dumps(report_id.upper())
+
+
+def has_qr_token(report_id, token):
+    if not token:
+        return False
+    try:
+        return _qr_serializer().loads(token) == report_id.upper()
+    except BadSignature:
+        return False
+
+
+def legacy_qr_allowed(report):
+    """Whether the report was printed with an unsigned QR link that must keep working."""
+    if not current_app.config['REPORT_QR_ALLOW_LEGACY']:
+        return False
+    since = db.session.execute(db.select(SiteSettings.value)
+                               .where(SiteSettings.key == QR_SIGNED_SINCE_KEY)).scalar()
+    if not since:
+        return False  # installed after signing: every printed link is signed
+    return report.uploaded_at is None or report.uploaded_at < datetime.fromisoformat(since)
+
+
+def qr_url(report_id):
+    """Absolute, signed download link for a report's QR code."""
+    return url_for('main.download_report_by_rid', report_id=report_id,
+                   t=qr_token(report_id), _external=True)
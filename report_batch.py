@@ -0,0 +1,96 @@
+"""
+Batch PDF rendering for Life Care Pathology Lab reports.
+
+Renders many reports at once across a process pool, e.g. to regenerate the
+whole archive after a letterhead change or for a health camp. Results are
+streamed back one by one as workers finish.
+"""
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# One unit of work. Only plain data crosses the process boundary —
+# ORM rows are converted in the parent before submission.
+RenderJob = namedtuple('RenderJob', ['key', 'report_data', 'output_path', 'download_url'])
+
+# Outcome of a single job; error is None on success.
+RenderResult = namedtuple('RenderResult', ['key', 'output_path', 'error'])
+
+
+def report_data_from_report(report):
+    """Build the generate_report_pdf() input dict from a Report row."""
+    return {
+        'report_id': report.report_id,
+        'patient_name': report.patient_name,
+        'age': report.age if report.age is not None else 'N/A',
+        'gender': report.gender or 'N/A',
+        'doctor_name': report.doctor_name or 'Self',
+        'phone': report.phone,
+        'test_name': report.test_name,
+        'token_number': report.token_number,
+        'sample_type': report.sample_type,
+        'collection_date': report.collection_date,
+        'collected_at': report.collected_at,
+        'remarks': report.remarks,
+        'test_results': report.get_test_results(),
+    }
+
+
+def job_from_report(report, output_dir, download_url=""):
+    """Build a RenderJob that renders a Report row's PDF into output_dir."""
+    return RenderJob(
+        key=report.report_id,
+        report_data=report_data_from_report(report),
+        output_path=os.path.join(output_dir, report.file_path),
+        download_url=download_url,
+    )
+
+
+def _render_job(job):
+    """Worker entry point. Never raises, so one bad report can't stop the batch."""
+    # Imported here so the parent process doesn't need ReportLab loaded
+    from report_generator import generate_report_pdf
+    try:
+        generate_report_pdf(job.report_data, job.output_path, job.download_url)
+        return RenderResult(job.key, job.output_path, None)
+    except Exception as e:
+        return RenderResult(job.key, job.output_path, f"{type(e).__name__}: {e}")
+
+
+def render_reports(jobs, workers=None):
+    """
+    Render RenderJobs and yield a RenderResult for each as it completes.
+
+    workers=None uses one process per CPU; workers=1 renders in-process
+    without a pool, which is also the fallback where subprocesses are
+    not available.
+    """
+    jobs = list(jobs)
+    if not jobs:
+        return
+
+    if workers == 1 or len(jobs) == 1:
+        for job in jobs:
+            yield _render_job(job)
+        return
+
+    pool = None
+    try:
+        pool = ProcessPoolExecutor(max_workers=workers)
+        futures = {pool.submit(_render_job, job): job for job in jobs}
+    except (OSError, NotImplementedError):
+        # No working multiprocessing here (e.g. no /dev/shm semaphores on
+        # serverless hosts); nothing has been yielded yet, so start over
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+        yield from render_reports(jobs, workers=1)
+        return
+
+    with pool:
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                yield future.result()
+            except Exception as e:
+                # Worker process died (e.g. killed by the OOM killer)
+                yield RenderResult(job.key, job.output_path, f"{type(e).__name__}: {e}")
@@ -4,7 +4,11 @@ Uses ReportLab for PDF generation. Matches new Navy Blue theme.
 """
 import os
 import io
-import qrcode
+import copy
+import hashlib
+import threading
+from collections import namedtuple, OrderedDict
+from types import MappingProxyType
 from datetime import datetime
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4
@@ -14,6 +18,10 @@ from reportlab.platypus import (
     SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image, HRFlowable, PageBreak
 )
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
+from reportlab.graphics.shapes import Drawing
+from reportlab.graphics.barcode.qr import QrCodeWidget
+from config import Config
+from range_eval import flag_results
 
 # Theme Colors
 THEME_DARK = colors.HexColor('#1a1a2e')
@@ -21,93 +29,255 @@ THEME_LIGHT = colors.HexColor('#f0f4ff')
 THEME_ACCENT = colors.HexColor('#3B82F6')
 TEXT_DARK = colors.HexColor('#0F172A')
 
-def generate_qr_code(url, size=25):
-    """Generate a QR code image from a URL."""
+LAB_NAME = "LIFE CARE PATHOLOGY LAB"
+LAB_ADDRESS_LINE = "Near Rickshaw Stand, Vill. Asara (Baghpat) 250623 | Phone: +91 9058275073"
+FOOTER_TEXT = "This is a computer-generated report. Results are indicative."
+
+RESULT_HEADERS = ("#", "Parameter", "Result", "Unit", "Normal Range")
+
+# Everything in a report that does not depend on the patient: paragraph
+# styles, table styles and the static header/footer flowables.
+ReportTheme = namedtuple('ReportTheme', [
+    'styles',               # read-only mapping of ParagraphStyle by name
+    'patient_table_style',
+    'results_table_style',
+    'qr_table_style',
+    'header_flowables',     # lab name, address line, rule
+    'footer_flowables',     # rule, disclaimer
+    'results_header_row',   # pre-rendered header cells of the results table
+])
+
+_theme = None
+
+
+def build_report_theme():
+    """Build a fresh ReportTheme. Prefer get_report_theme() in callers."""
+    base = getSampleStyleSheet()
+
+    header_style = ParagraphStyle('LabHeader', parent=base['Title'],
+                                  fontSize=24, textColor=THEME_DARK,
+                                  fontName='Helvetica-Bold',
+                                  spaceAfter=2 * mm, leading=28, alignment=TA_CENTER)
+
+    sub_header = ParagraphStyle('SubHeader', parent=base['Normal'],
+                                fontSize=11, textColor=colors.HexColor('#64748B'),
+                                alignment=TA_CENTER, spaceAfter=2 * mm)
+
+    section_title = ParagraphStyle('SectionTitle', parent=base['Normal'],
+                                   fontSize=12, textColor=colors.white,
+                                   backColor=THEME_DARK,
+                                   spaceBefore=4 * mm, spaceAfter=2 * mm,
+                                   leading=18, alignment=TA_CENTER,
+                                   borderPadding=6, textTransform='uppercase')
+
+    normal_style = ParagraphStyle('NormalCustom', parent=base['Normal'],
+                                  fontSize=10, leading=14, textColor=TEXT_DARK)
+
+    bold_style = ParagraphStyle('BoldText', parent=base['Normal'],
+                                fontSize=10, leading=14, textColor=TEXT_DARK,
+                                fontName='Helvetica-Bold')
+
+    styles = {
+        'header': header_style,
+        'sub_header': sub_header,
+        'section_title': section_title,
+        'normal': normal_style,
+        'bold': bold_style,
+        'table_header': ParagraphStyle('TH', parent=bold_style, textColor=colors.white),
+        'abnormal': ParagraphStyle('Abnormal', parent=bold_style,
+                                   textColor=colors.HexColor('#DC2626')),
+        'footer': ParagraphStyle('Footer', parent=normal_style, fontSize=8,
+                                 textColor=colors.gray, alignment=TA_CENTER),
+        'tiny': ParagraphStyle('Tiny', fontSize=7, alignment=TA_RIGHT),
+    }
+
+    patient_table_style = TableStyle([
+        ('BACKGROUND', (0, 0), (0, -1), THEME_DARK), # Label col 1
+        ('TEXTCOLOR', (0, 0), (0, -1), colors.white),
+        ('BACKGROUND', (2, 0), (2, -1), THEME_DARK), # Label col 2
+        ('TEXTCOLOR', (2, 0), (2, -1), colors.white),
+        ('BACKGROUND', (1, 0), (1, -1), colors.HexColor('#F8FAFC')),
+        ('BACKGROUND', (3, 0), (3, -1), colors.HexColor('#F8FAFC')),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#E2E8F0')),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('PADDING', (0, 0), (-1, -1), 6),
+    ])
+
+    results_table_style = TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), THEME_DARK),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, THEME_LIGHT]),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#E2E8F0')),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('ALIGN', (1, 1), (1, -1), 'LEFT'), # Parameters left align
+        ('PADDING', (0, 0), (-1, -1), 6),
+    ])
+
+    qr_table_style = TableStyle([('VALIGN', (0,0), (-1,-1), 'MIDDLE'), ('ALIGN', (1,0), (1,0), 'RIGHT')])
+
+    header_flowables = (
+        Paragraph(LAB_NAME, header_style),
+        Paragraph(LAB_ADDRESS_LINE, sub_header),
+        HRFlowable(width="100%", thickness=2, color=THEME_DARK,
+                   spaceAfter=5 * mm, spaceBefore=2 * mm),
+    )
+
+    footer_flowables = (
+        HRFlowable(width="100%", thickness=0.5, color=colors.HexColor('#CBD5E1'), spaceBefore=10*mm, spaceAfter=2*mm),
+        Paragraph(FOOTER_TEXT, styles['footer']),
+    )
+
+    results_header_row = tuple(
+        Paragraph(f"<b>{label}</b>", styles['table_header']) for label in RESULT_HEADERS
+    )
+
+    return ReportTheme(
+        styles=MappingProxyType(styles),
+        patient_table_style=patient_table_style,
+        results_table_style=results_table_style,
+        qr_table_style=qr_table_style,
+        header_flowables=header_flowables,
+        footer_flowables=footer_flowables,
+        results_header_row=results_header_row,
+    )
+
+
+def get_report_theme():
+    """Return the shared ReportTheme, building it on first use."""
+    global _theme
+    if _theme is None:
+        _theme = build_report_theme()
+    return _theme
+
+
+# ── QR code cache ──
+# PNG bytes keyed by (url, size). Memory tier is a bounded LRU; the optional
+# disk tier survives restarts so regenerating a report skips the rasterise.
+_qr_cache = OrderedDict()
+_qr_cache_lock = threading.Lock()
+
+
+def _qr_disk_path(key):
+    if not Config.QR_DISK_CACHE:
+        return None
+    digest = hashlib.sha256(f"{key[0]}|{key[1]}".encode('utf-8')).hexdigest()
+    return os.path.join(Config.UPLOAD_FOLDER, 'qr_cache', f"{digest}.png")
+
+
+def _render_qr_png(url):
+    import qrcode  # with PIL, only needed for raster QR codes
     qr = qrcode.QRCode(version=1, error_correction=qrcode.constants.ERROR_CORRECT_M, box_size=8, border=0)
     qr.add_data(url)
     qr.make(fit=True)
     img = qr.make_image(fill_color="black", back_color="white")
     buffer = io.BytesIO()
     img.save(buffer, format='PNG')
-    buffer.seek(0)
-    return Image(buffer, width=size * mm, height=size * mm)
+    return buffer.getvalue()
+
+
+def get_qr_png(url, size=25):
+    """Return QR code PNG bytes for a URL, from cache when possible."""
+    key = (url, size)
+    with _qr_cache_lock:
+        png = _qr_cache.get(key)
+        if png is not None:
+            _qr_cache.move_to_end(key)
+            return png
+
+    disk_path = _qr_disk_path(key)
+    png = None
+    if disk_path and os.path.exists(disk_path):
+        try:
+            with open(disk_path, 'rb') as f:
+                png = f.read()
+        except OSError:
+            png = None
+
+    if png is None:
+        png = _render_qr_png(url)
+        if disk_path:
+            try:
+                os.makedirs(os.path.dirname(disk_path), exist_ok=True)
+                tmp_path = f"{disk_path}.{os.getpid()}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    f.write(png)
+                os.replace(tmp_path, disk_path)
+            except OSError:
+                pass  # Read-only filesystem (Vercel)
+
+    with _qr_cache_lock:
+        _qr_cache[key] = png
+        _qr_cache.move_to_end(key)
+        while len(_qr_cache) > Config.QR_CACHE_SIZE:
+            _qr_cache.popitem(last=False)
+    return png
+
+
+def clear_qr_cache():
+    """Drop the in-memory QR cache (the disk tier is left alone)."""
+    with _qr_cache_lock:
+        _qr_cache.clear()
+
+
+def generate_vector_qr_code(url, size=25):
+    """QR code drawn with ReportLab's native widget — no PIL, no PNG."""
+    widget = QrCodeWidget(url, barLevel='M', barBorder=0)
+    x1, y1, x2, y2 = widget.getBounds()
+    side = size * mm
+    drawing = Drawing(side, side, transform=[side / (x2 - x1), 0, 0, side / (y2 - y1), 0, 0])
+    drawing.add(widget)
+    return drawing
+
+
+def generate_qr_code(url, size=25, mode=None):
+    """Generate a QR code flowable from a URL ('raster' or 'vector' mode)."""
+    if (mode or Config.REPORT_QR_MODE) == 'vector':
+        return generate_vector_qr_code(url, size)
+    return Image(io.BytesIO(get_qr_png(url, size)), width=size * mm, height=size * mm)
+
 
+def generate_report_pdf(report_data, output_path, download_url="", theme=None, qr_mode=None):
+    theme = theme or get_report_theme()
+    styles = theme.styles
+    section_title = styles['section_title']
+    normal_style = styles['normal']
+    bold_style = styles['bold']
 
-def generate_report_pdf(report_data, output_path, download_url=""):
     doc = SimpleDocTemplate(
         output_path, pagesize=A4,
         topMargin=10 * mm, bottomMargin=15 * mm,
         leftMargin=10 * mm, rightMargin=10 * mm
     )
 
-    styles = getSampleStyleSheet()
-    elements = []
-
-    # Custom styles
-    header_style = ParagraphStyle('LabHeader', parent=styles['Title'],
-                                   fontSize=24, textColor=THEME_DARK,
-                                   fontName='Helvetica-Bold',
-                                   spaceAfter=2 * mm, leading=28, alignment=TA_CENTER)
-    
-    sub_header = ParagraphStyle('SubHeader', parent=styles['Normal'],
-                                 fontSize=11, textColor=colors.HexColor('#64748B'),
-                                 alignment=TA_CENTER, spaceAfter=2 * mm)
-    
-    section_title = ParagraphStyle('SectionTitle', parent=styles['Normal'],
-                                    fontSize=12, textColor=colors.white,
-                                    backColor=THEME_DARK,
-                                    spaceBefore=4 * mm, spaceAfter=2 * mm,
-                                    leading=18, alignment=TA_CENTER,
-                                    borderPadding=6, textTransform='uppercase')
-                                    
-    normal_style = ParagraphStyle('NormalCustom', parent=styles['Normal'],
-                                   fontSize=10, leading=14, textColor=TEXT_DARK)
-                                   
-    bold_style = ParagraphStyle('BoldText', parent=styles['Normal'],
-                                 fontSize=10, leading=14, textColor=TEXT_DARK,
-                                 fontName='Helvetica-Bold')
-
     # ── Lab Header ──
-    elements.append(Paragraph("LIFE CARE PATHOLOGY LAB", header_style))
-    elements.append(Paragraph(
-        "Near Rickshaw Stand, Vill. Asara (Baghpat) 250623 | Phone: +91 9058275073",
-        sub_header
-    ))
-    elements.append(HRFlowable(width="100%", thickness=2, color=THEME_DARK,
-                                spaceAfter=5 * mm, spaceBefore=2 * mm))
+    # Shared flowables are shallow-copied: ReportLab stores layout state on
+    # them during build, and the markup parse is what we want to skip.
+    elements = [copy.copy(f) for f in theme.header_flowables]
 
     # ── Patient Info ──
     elements.append(Paragraph("PATIENT INFORMATION", section_title))
 
     report_date = datetime.utcnow().strftime('%d/%m/%Y %I:%M %p')
-    
+
     # Grid layout for patient info
     p_data = [
         [Paragraph("<b>Patient Name</b>", bold_style), Paragraph(report_data.get('patient_name', 'N/A'), normal_style),
          Paragraph("<b>Report ID</b>", bold_style), Paragraph(report_data.get('report_id', 'N/A'), normal_style)],
-        
+
         [Paragraph("<b>Age / Gender</b>", bold_style), Paragraph(f"{report_data.get('age', 'N/A')} Yrs / {report_data.get('gender', 'N/A')}", normal_style),
          Paragraph("<b>Date</b>", bold_style), Paragraph(report_date, normal_style)],
-         
+
         [Paragraph("<b>Ref. Doctor</b>", bold_style), Paragraph(report_data.get('doctor_name', 'Self'), normal_style),
          Paragraph("<b>Sample ID</b>", bold_style), Paragraph(report_data.get('token_number', 'N/A'), normal_style)],
-         
+
         [Paragraph("<b>Test Name</b>", bold_style), Paragraph(f"<b>{report_data.get('test_name', 'N/A')}</b>", normal_style),
          Paragraph("", normal_style), Paragraph("", normal_style)]
     ]
 
     p_table = Table(p_data, colWidths=[35*mm, 60*mm, 30*mm, 60*mm])
-    p_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (0, -1), THEME_DARK), # Label col 1
-        ('TEXTCOLOR', (0, 0), (0, -1), colors.white),
-        ('BACKGROUND', (2, 0), (2, -1), THEME_DARK), # Label col 2
-        ('TEXTCOLOR', (2, 0), (2, -1), colors.white),
-        ('BACKGROUND', (1, 0), (1, -1), colors.HexColor('#F8FAFC')),
-        ('BACKGROUND', (3, 0), (3, -1), colors.HexColor('#F8FAFC')),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#E2E8F0')),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('PADDING', (0, 0), (-1, -1), 6),
-    ]))
+    p_table.setStyle(theme.patient_table_style)
     elements.append(p_table)
     elements.append(Spacer(1, 5 * mm))
 
@@ -117,32 +287,14 @@ def generate_report_pdf(report_data, output_path, download_url=""):
     test_results = report_data.get('test_results', [])
     if test_results:
         # Header
-        t_data = [[
-            Paragraph("<b>#</b>", ParagraphStyle('TH', parent=bold_style, textColor=colors.white)),
-            Paragraph("<b>Parameter</b>", ParagraphStyle('TH', parent=bold_style, textColor=colors.white)),
-            Paragraph("<b>Result</b>", ParagraphStyle('TH', parent=bold_style, textColor=colors.white)),
-            Paragraph("<b>Unit</b>", ParagraphStyle('TH', parent=bold_style, textColor=colors.white)),
-            Paragraph("<b>Normal Range</b>", ParagraphStyle('TH', parent=bold_style, textColor=colors.white))
-        ]]
-
-        for idx, result in enumerate(test_results, 1):
+        t_data = [[copy.copy(cell) for cell in theme.results_header_row]]
+
+        flags = flag_results(test_results, report_data.get('gender'), report_data.get('age'))
+        for idx, (result, is_abnormal) in enumerate(zip(test_results, flags), 1):
             val = str(result.get('value', ''))
             rng = str(result.get('normal_range', ''))
-            
-            # Logic for abnormal
-            is_abnormal = False
-            try:
-                v = float(val)
-                if '-' in rng:
-                    parts = rng.split('-')
-                    if len(parts) == 2:
-                        lo, hi = float(parts[0]), float(parts[1])
-                        if v < lo or v > hi:
-                            is_abnormal = True
-            except:
-                pass
-            
-            val_style = ParagraphStyle('Abnormal', parent=bold_style, textColor=colors.HexColor('#DC2626')) if is_abnormal else normal_style
+
+            val_style = styles['abnormal'] if is_abnormal else normal_style
             val_txt = f"{val} *" if is_abnormal else val
 
             t_data.append([
@@ -155,17 +307,7 @@ def generate_report_pdf(report_data, output_path, download_url=""):
 
         # Column widths matching preview approx
         r_table = Table(t_data, colWidths=[15*mm, 70*mm, 35*mm, 25*mm, 45*mm], repeatRows=1)
-        r_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), THEME_DARK),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, THEME_LIGHT]),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#E2E8F0')),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('ALIGN', (1, 1), (1, -1), 'LEFT'), # Parameters left align
-            ('PADDING', (0, 0), (-1, -1), 6),
-        ]))
+        r_table.setStyle(theme.results_table_style)
         elements.append(r_table)
     else:
         elements.append(Paragraph("No results recorded.", normal_style))
@@ -178,22 +320,18 @@ def generate_report_pdf(report_data, output_path, download_url=""):
         elements.append(Spacer(1, 5 * mm))
 
     # ── Disclaimer & Footer ──
-    elements.append(HRFlowable(width="100%", thickness=0.5, color=colors.HexColor('#CBD5E1'), spaceBefore=10*mm, spaceAfter=2*mm))
-    
-    footer_text = "This is a computer-generated report. Results are indicative."
-    elements.append(Paragraph(footer_text, ParagraphStyle('Footer', parent=normal_style, fontSize=8, textColor=colors.gray, alignment=TA_CENTER)))
+    elements.extend(copy.copy(f) for f in theme.footer_flowables)
 
     # QR Code at very bottom if URL present
     if download_url:
-        qr = generate_qr_code(download_url, size=20)
+        qr = generate_qr_code(download_url, size=20, mode=qr_mode)
         # Put in a small table to align right or center
-        qr_table = Table([[Paragraph("Scan to Download", ParagraphStyle('Tiny', fontSize=7, alignment=TA_RIGHT)), qr]], colWidths=[160*mm, 25*mm])
-        qr_table.setStyle(TableStyle([('VALIGN', (0,0), (-1,-1), 'MIDDLE'), ('ALIGN', (1,0), (1,0), 'RIGHT')]))
+        qr_table = Table([[Paragraph("Scan to Download", styles['tiny']), qr]], colWidths=[160*mm, 25*mm])
+        qr_table.setStyle(theme.qr_table_style)
         elements.append(qr_table)
 
     # Build
-    # Build
-    if os.path.dirname(output_path):
+    if isinstance(output_path, str) and os.path.dirname(output_path):
         os.makedirs(os.path.dirname(output_path), exist_ok=True)
     doc.build(elements)
     return output_path
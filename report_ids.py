@@ -0,0 +1,95 @@
+"""
+Report ID allocation.
+
+IDs are drawn at random from the RID###### space (900,000 IDs) with the
+`secrets` CSPRNG, so knowing one report's ID says nothing about any other
+— the QR download and /check-report both take an RID, and sequential or
+otherwise computable IDs would let anyone walk through every report.
+
+Randomness alone doesn't make IDs unique, so each draw is claimed in
+issued_report_ids, whose primary key is the ID itself: a process draws
+REPORT_ID_BLOCK_SIZE candidates, inserts them with ON CONFLICT DO NOTHING
+... RETURNING in its own short transaction, and keeps only the ones the
+insert returned. Two instances can't both get the same ID, and one that
+loses a race just draws again. IDs issued before the claims table existed
+(or typed in by hand as sample IDs) are checked against reports in the
+same go — one query per block — and skipped.
+
+As the space fills, more of each block is lost to collisions; at half full
+a block yields about half its size, still for two statements.
+"""
+import secrets
+import threading
+from collections import deque
+from sqlalchemy import or_, select
+from config import Config
+from db_utils import upsert_for
+from extensions import db
+from models import IssuedReportId, Report
+
+PREFIX = 'RID'
+_FIRST = 100000
+_SPACE = 900000  # RID100000 - RID999999
+_MAX_DRAWS = 50  # blocks in a row that yield nothing before giving up
+
+_lock = threading.Lock()
+_available = deque()
+
+
+class ReportIdsExhausted(RuntimeError):
+    """Random draws keep landing on report IDs that are already taken."""
+
+
+def _draw(size):
+    return list({f'{PREFIX}{_FIRST + secrets.randbelow(_SPACE)}' for _ in range(size)})
+
+
+def _claim(candidates):
+    """Atomically claim candidates for this process. Returns the ones it got."""
+    table = IssuedReportId.__table__
+    # A separate, immediately committed transaction: a claimed ID must stay
+    # claimed even if the request that triggered it rolls back.
+    with db.engine.begin() as connection:
+        insert = upsert_for(connection)
+        if insert is not None:
+            return set(connection.execute(
+                insert(table).values([{'report_id': rid} for rid in candidates])
+                .on_conflict_do_nothing().returning(table.c.report_id)).scalars())
+        taken = set(connection.execute(
+            select(table.c.report_id).where(table.c.report_id.in_(candidates))).scalars())
+        fresh = [rid for rid in candidates if rid not in taken]
+        if fresh:
+            connection.execute(table.insert(), [{'report_id': rid} for rid in fresh])
+        return set(fresh)
+
+
+def _refill():
+    for _ in range(_MAX_DRAWS):
+        claimed = _claim(_draw(Config.REPORT_ID_BLOCK_SIZE))
+        if not claimed:
+            continue
+        # Skip IDs used before claims were recorded (report or sample ID)
+        taken = set()
+        for report_id, token in db.session.execute(
+                select(Report.report_id, Report.token_number).where(or_(
+                    Report.report_id.in_(claimed), Report.token_number.in_(claimed)))):
+            taken.update((report_id, token))
+        fresh = [rid for rid in claimed if rid not in taken]
+        if fresh:
+            _available.extend(fresh)
+            return
+    raise ReportIdsExhausted(f'No free report ID in {_MAX_DRAWS} random blocks.')
+
+
+def next_report_id():
+    """A new, never-issued, unpredictable 'RID######'."""
+    with _lock:
+        while not _available:
+            _refill()
+        return _available.popleft()
+
+
+def discard_local():
+    """Drop this process's unused claimed IDs (they're never reissued)."""
+    with _lock:
+        _available.clear()
@@ -0,0 +1,177 @@
+"""
+Background report PDF generation.
+
+create_report saves the Report row together with a queued ReportJob and
+returns immediately; the PDF is built afterwards by one of:
+
+    inline  - synchronously in the request (old behaviour)
+    thread  - an in-process thread pool, for single-process/local runs
+    worker  - a separate `flask report-worker` process polling the table
+
+The finished PDF is saved through storage.py and recorded in
+Report.file_hash; the previous version's blob is released.
+"""
+import io
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import current_app
+from extensions import db
+from models import ReportJob
+import storage
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def enqueue_report_pdf(report, download_url=''):
+    """Queue PDF generation for a Report. Commit, then call dispatch()."""
+    job = ReportJob(report=report, download_url=download_url)
+    db.session.add(job)
+    return job
+
+
+def dispatch(job):
+    """Hand a committed job to the configured runner."""
+    mode = current_app.config['REPORT_JOB_MODE']
+    if mode == 'inline':
+        _run_inline(job.id)
+    elif mode == 'thread':
+        _get_executor().submit(_run_in_thread, current_app._get_current_object(), job.id)
+    # 'worker': left queued for `flask report-worker`
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=current_app.config['REPORT_JOB_THREADS'],
+                thread_name_prefix='report-job')
+    return _executor
+
+
+def _run_inline(job_id):
+    # Nothing comes back for a requeued job in this mode (and serverless
+    # instances freeze after the response), so use its attempts up now;
+    # the last failure marks it 'failed' instead of leaving it queued.
+    for _ in range(current_app.config['REPORT_JOB_MAX_ATTEMPTS']):
+        if run_job(job_id) != 'queued':
+            return
+
+
+def _run_in_thread(app, job_id):
+    with app.app_context():
+        try:
+            # Retry in place, backing off; there's no worker to pick the job
+            # up again. Bounded even when the job isn't ours to claim
+            # (locked by another runner), which costs no attempt.
+            delay = app.config['REPORT_JOB_RETRY_SECONDS']
+            runs = app.config['REPORT_JOB_MAX_ATTEMPTS']
+            for run in range(runs):
+                if run:
+                    time.sleep(delay)
+                    delay *= 2
+                if run_job(job_id) != 'queued':
+                    return
+            app.logger.error(f"Report job {job_id} still queued after {runs} runs; "
+                             f"left for `flask report-worker`")
+        except Exception as e:
+            app.logger.error(f"Report job {job_id} crashed: {e}")
+        finally:
+            db.session.remove()
+
+
+def _claim(query):
+    """Lock the first queued job matched by query and mark it running."""
+    job = query.filter(ReportJob.status == 'queued')\
+        .with_for_update(skip_locked=True).first()
+    if not job:
+        db.session.rollback()
+        return None
+    job.status = 'running'
+    job.attempts = (job.attempts or 0) + 1
+    job.started_at = datetime.utcnow()
+    db.session.commit()
+    return job
+
+
+def _execute(job):
+    """Build the job's PDF and record the outcome. Returns the new status."""
+    # Deferred so web processes in 'worker' mode never load ReportLab
+    from report_generator import generate_report_pdf
+    from report_batch import report_data_from_report
+
+    report = job.report
+    previous = report.file_hash
+    try:
+        pdf = io.BytesIO()
+        generate_report_pdf(report_data_from_report(report), pdf, job.download_url)
+        pdf.seek(0)
+        report.file_hash = storage.save(pdf, 'application/pdf')
+        storage.release(previous)
+        job.status = 'done'
+        job.error = ''
+    except Exception as e:
+        db.session.rollback()  # storage.py deletes a file save() already wrote
+        previous = None
+        job.error = f"{type(e).__name__}: {e}"
+        if job.attempts < current_app.config['REPORT_JOB_MAX_ATTEMPTS']:
+            job.status = 'queued'
+        else:
+            job.status = 'failed'
+            current_app.logger.error(f"Report PDF failed for {report.report_id}: {job.error}")
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+    storage.purge([previous])
+    return job.status
+
+
+def run_job(job_id):
+    """Run one specific job if it's still queued. Returns its final status."""
+    job = _claim(ReportJob.query.filter(ReportJob.id == job_id))
+    if not job:
+        job = db.session.get(ReportJob, job_id)
+        return job.status if job else None
+    return _execute(job)
+
+
+def run_next_job():
+    """Run the oldest queued job. Returns False when the queue is empty."""
+    job = _claim(ReportJob.query.order_by(ReportJob.id))
+    if not job:
+        return False
+    _execute(job)
+    return True
+
+
+def requeue_stale_jobs(older_than):
+    """Put 'running' jobs whose worker died back on the queue."""
+    cutoff = datetime.utcnow() - older_than
+    count = ReportJob.query.filter(
+        ReportJob.status == 'running',
+        ReportJob.started_at < cutoff
+    ).update({'status': 'queued'}, synchronize_session=False)
+    db.session.commit()
+    return count
+
+
+def run_worker(poll_interval=2.0, once=False, stale_after=timedelta(minutes=10)):
+    """Poll the job table forever (or until empty when once=True)."""
+    requeue_stale_jobs(stale_after)
+    while True:
+        if run_next_job():
+            continue
+        if once:
+            return
+        time.sleep(poll_interval)
+
+
+def pdf_status(report):
+    """Status of a report's latest PDF job; 'done' for reports without one."""
+    job = ReportJob.query.filter_by(report_id=report.id)\
+        .order_by(ReportJob.id.desc()).first()
+    if not job:
+        return 'done', ''
+    return job.status, job.error
@@ -0,0 +1,59 @@
+"""
+Linking reports to patient accounts.
+
+Reports are created by an admin from a name and a phone number, so nothing
+in them says which login they belong to. A linked report is served to its
+account without the report password (report_access.can_view), so a report
+is only ever linked on something the account has proved:
+
+  * the booking it was made for (resolve_user(booking_id=...)), which the
+    account itself created;
+  * the patient's email, which every account verified by OTP (or OAuth)
+    when it registered;
+  * the report password, typed on /check-report while logged in (claim()).
+
+Phone numbers and names on accounts and bookings are typed in and never
+verified, so they are never enough: anyone could register with a
+stranger's number and name. A report that matches on neither of the first
+two stays unlinked until its patient opens it once with the password.
+
+The patient dashboard then finds reports by reports.user_id
+(ix_reports_user_id_uploaded_at).
+"""
+from sqlalchemy import select
+from extensions import db
+from models import Booking, User
+
+
+def resolve_user(booking_id=None, email=None):
+    """The id of the account a new report belongs to, or None."""
+    if booking_id:
+        user_id = db.session.execute(
+            select(Booking.user_id).where(Booking.id == booking_id)).scalar()
+        if user_id:
+            return user_id
+
+    email = str(email or '').strip()
+    if email:
+        return db.session.execute(
+            select(User.id).where(User.email.in_({email, email.lower()}),
+                                  User.role == 'patient')).scalars().first()
+    return None
+
+
+def link_report(report, email=None, booking_id=None):
+    """Set report.user_id (if it isn't set) before the report is added."""
+    if report.user_id is None:
+        report.user_id = resolve_user(booking_id=booking_id, email=email)
+    return report.user_id
+
+
+def claim(report, user):
+    """
+    Link an unlinked report to the patient account that just entered its
+    password. Returns whether it was linked. Caller commits.
+    """
+    if report.user_id is not None or not user.is_authenticated or user.role != 'patient':
+        return False
+    report.user_id = user.id
+    return True
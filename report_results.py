@@ -0,0 +1,133 @@
+"""
+Structured test results.
+
+Each row of a report's results table is one report_results row, with the
+value parsed to a number where possible, the normal range as numeric
+bounds and an abnormal flag worked out once (by range_eval) when the
+report is saved. The preview, PDF and any "which results were out of
+range" question read these columns instead of parsing every report's JSON.
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import func, insert, or_, select, update
+from extensions import db
+from models import Report, ReportResult, TestParameter
+import range_eval
+
+
+def build_rows(results, parameters=(), gender=None, age=None):
+    """report_results column values for a list of result dicts.
+
+    parameters are the test's TestParameter / CatalogueParameter rows;
+    a result is linked to the one with the same name. Bounds and the
+    abnormal flag come from range_eval for this patient's gender and age.
+    """
+    by_name = {p.parameter_name.strip().lower(): p for p in parameters}
+    rows = []
+    evaluated = range_eval.evaluate(results, gender, age, parameters)
+    for position, (result, (value, bound, is_abnormal)) in enumerate(zip(results, evaluated)):
+        name = str(result.get('parameter', '')).strip()
+        parameter = by_name.get(name.lower())
+        rows.append({
+            'position': position,
+            'parameter_id': parameter.id if parameter is not None else None,
+            'parameter_name': name,
+            'raw_value': str(result.get('value', '')).strip(),
+            'numeric_value': value,
+            'unit': str(result.get('unit', '')).strip(),
+            'normal_range': str(result.get('normal_range', '')).strip(),
+            'range_min': bound.low if bound else None,
+            'range_max': bound.high if bound else None,
+            'is_abnormal': is_abnormal,
+        })
+    return rows
+
+
+def save_results(report, results, parameters=()):
+    """Replace a flushed report's results with one multi-row INSERT."""
+    rows = build_rows(results, parameters, report.gender, report.age)
+    db.session.execute(ReportResult.__table__.delete().where(ReportResult.report_id == report.id))
+    if rows:
+        db.session.execute(insert(ReportResult), [dict(row, report_id=report.id) for row in rows])
+    db.session.expire(report, ['results'])
+    return len(rows)
+
+
+def backfill(batch_size=500):
+    """Copy results of reports that only have the JSON column. Returns reports done."""
+    done = 0
+    last_id = 0
+    while True:
+        reports = Report.query.filter(
+            Report.id > last_id,
+            ~Report.results.any()
+        ).order_by(Report.id).limit(batch_size).all()
+        if not reports:
+            return done
+        for report in reports:
+            results = report.get_test_results()
+            if results:
+                save_results(report, results)
+                done += 1
+        last_id = reports[-1].id
+        db.session.commit()
+
+
+def reflag(batch_size=500):
+    """
+    Re-evaluate stored rows whose value or range has digit grouping commas
+    ("1,50,000"), which range_eval used to misread. Returns rows changed.
+    """
+    changed = 0
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            select(ReportResult, Report.gender, Report.age, TestParameter)
+            .join(Report, Report.id == ReportResult.report_id)
+            .outerjoin(TestParameter, TestParameter.id == ReportResult.parameter_id)
+            .where(ReportResult.id > last_id,
+                   or_(ReportResult.normal_range.contains(','), ReportResult.raw_value.contains(',')))
+            .order_by(ReportResult.id).limit(batch_size)).all()
+        if not rows:
+            return changed
+        updates = []
+        for row, gender, age, parameter in rows:
+            result = {'parameter': row.parameter_name, 'value': row.raw_value,
+                      'normal_range': row.normal_range}
+            (value, bound, is_abnormal), = range_eval.evaluate(
+                [result], gender, age, (parameter,) if parameter is not None else ())
+            fresh = {'numeric_value': value, 'range_min': bound.low if bound else None,
+                     'range_max': bound.high if bound else None, 'is_abnormal': is_abnormal}
+            if any(getattr(row, column) != v for column, v in fresh.items()):
+                updates.append(dict(fresh, id=row.id))
+        if updates:
+            db.session.execute(update(ReportResult), updates)
+        changed += len(updates)
+        last_id = rows[-1][0].id
+        db.session.commit()
+
+
+# ── Analytics ──
+def abnormal_results(parameter_name, since=None, until=None, limit=200):
+    """[(report, result)] flagged abnormal for a parameter, newest first."""
+    query = db.session.query(Report, ReportResult)\
+        .join(ReportResult, ReportResult.report_id == Report.id)\
+        .filter(ReportResult.parameter_name == parameter_name,
+                ReportResult.is_abnormal.is_(True))
+    if since is not None:
+        query = query.filter(Report.uploaded_at >= since)
+    if until is not None:
+        query = query.filter(Report.uploaded_at < until)
+    return query.order_by(Report.uploaded_at.desc()).limit(limit).all()
+
+
+def abnormal_rates(days=30):
+    """[(parameter, results, abnormal)] for reports from the last `days` days."""
+    since = datetime.utcnow() - timedelta(days=days)
+    abnormal = func.sum(db.case((ReportResult.is_abnormal.is_(True), 1), else_=0))
+    return db.session.execute(
+        select(ReportResult.parameter_name, func.count(ReportResult.id), abnormal)
+        .join(Report, Report.id == ReportResult.report_id)
+        .where(Report.uploaded_at >= since)
+        .group_by(ReportResult.parameter_name)
+        .order_by(abnormal.desc())
+    ).all()
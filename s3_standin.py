@@ -0,0 +1,155 @@
+"""
+Local S3 stand-in.
+
+A tiny path-style S3 server (PUT / GET with Range / HEAD / DELETE on
+/<bucket>/<key>) that keeps objects in memory, checks each request's SigV4
+signature against one access key/secret, and checks that a PUT body
+matches its x-amz-content-sha256. Enough to exercise storage.py's S3
+backend without MinIO or an AWS account:
+
+    python s3_standin.py --port 9000
+    STORAGE_BACKEND=s3 S3_ENDPOINT_URL=http://localhost:9000 S3_BUCKET=reports \\
+        S3_ACCESS_KEY_ID=standin S3_SECRET_ACCESS_KEY=standin-secret flask run
+
+S3StandIn can also be started from a script (see check_storage.py).
+"""
+import argparse
+import hashlib
+import hmac
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote, urlsplit
+
+_AUTH = re.compile(r'AWS4-HMAC-SHA256 Credential=([^/]+)/([^,]+), SignedHeaders=([^,]+), Signature=(\w+)')
+_RANGE = re.compile(r'bytes=(\d+)-(\d*)$')
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, body=b'', headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def _authorised(self, payload_hash):
+        match = _AUTH.match(self.headers.get('Authorization', ''))
+        if not match:
+            return False
+        access_key, scope, names, signature = match.groups()
+        server = self.server
+        if access_key != server.access_key:
+            return False
+        day, region, service, _ = scope.split('/')
+        path = urlsplit(self.path)
+        canonical = '\n'.join([
+            self.command, quote(path.path, safe='/~'), path.query,
+            ''.join(f'{n}:{self.headers.get(n, "").strip()}\n' for n in names.split(';')),
+            names, payload_hash,
+        ])
+        to_sign = '\n'.join(['AWS4-HMAC-SHA256', self.headers.get('x-amz-date', ''), scope,
+                             hashlib.sha256(canonical.encode()).hexdigest()])
+        key = f'AWS4{server.secret_key}'.encode()
+        for part in (day, region, service, 'aws4_request'):
+            key = hmac.new(key, part.encode(), hashlib.sha256).digest()
+        expected = hmac.new(key, to_sign.encode(), hashlib.sha256).hexdigest()
+        return hmac.compare_digest(expected, signature)
+
+    def _handle(self):
+        server = self.server
+        with server.lock:
+            server.requests[self.command] = server.requests.get(self.command, 0) + 1
+        body = b''
+        if self.command == 'PUT':
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        payload_hash = self.headers.get('x-amz-content-sha256', '')
+        if not self._authorised(payload_hash):
+            return self._reply(403, b'<Error><Code>SignatureDoesNotMatch</Code></Error>')
+
+        key = urlsplit(self.path).path
+        if self.command == 'PUT':
+            if hashlib.sha256(body).hexdigest() != payload_hash:
+                return self._reply(400, b'<Error><Code>XAmzContentSHA256Mismatch</Code></Error>')
+            with server.lock:
+                server.objects[key] = (body, self.headers.get('Content-Type', ''))
+            return self._reply(200, headers={'ETag': f'"{hashlib.md5(body).hexdigest()}"'})
+        if self.command == 'DELETE':
+            with server.lock:
+                server.objects.pop(key, None)
+            return self._reply(204)
+
+        with server.lock:
+            stored = server.objects.get(key)
+        if stored is None:
+            return self._reply(404, b'<Error><Code>NoSuchKey</Code></Error>')
+        data, content_type = stored
+        match = _RANGE.match(self.headers.get('Range', ''))
+        if not match:
+            return self._reply(200, data, {'Content-Type': content_type})
+        start = int(match.group(1))
+        end = int(match.group(2)) + 1 if match.group(2) else len(data)
+        if start >= len(data):
+            return self._reply(416)
+        end = min(end, len(data))
+        return self._reply(206, data[start:end], {
+            'Content-Type': content_type,
+            'Content-Range': f'bytes {start}-{end - 1}/{len(data)}'})
+
+    do_PUT = do_GET = do_HEAD = do_DELETE = _handle
+
+
+class S3StandIn(ThreadingHTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host='127.0.0.1', port=0, access_key='standin', secret_key='standin-secret'):
+        super().__init__((host, port), _Handler)
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.lock = threading.Lock()
+        self.objects = {}
+        self.requests = {}
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    @property
+    def url(self):
+        return f'http://{self.server_address[0]}:{self.port}'
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9000)
+    parser.add_argument('--access-key', default='standin')
+    parser.add_argument('--secret-key', default='standin-secret')
+    args = parser.parse_args()
+
+    server = S3StandIn(args.host, args.port, args.access_key, args.secret_key)
+    print(f"S3 stand-in listening on {server.url} (key {args.access_key})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""
+Relevance search over the public test catalogue.
+
+Two backends answer the same questions:
+
+  postgres - to_tsvector/to_tsquery prefix matching over name + description,
+             plus pg_trgm word_similarity on test and category names for
+             typos, ranked in SQL (indexes from migrations a3c5e8f1b642 and
+             f2b7d4c9e1a8).
+  memory   - an in-process inverted index over the active tests, used with
+             SQLite or when SEARCH_BACKEND=memory. Built from the catalogue
+             snapshot (catalogue.py) and rebuilt whenever that changes.
+
+Both treat every word of the query as a prefix ("hae glob" finds
+"Haemoglobin"), require all words to match somewhere, and weight name
+matches over category and description matches.
+"""
+import bisect
+import heapq
+import re
+import threading
+from collections import defaultdict, namedtuple
+from sqlalchemy import func, literal, literal_column, or_, select
+from config import Config
+from extensions import db
+from catalogue import get_catalogue
+from models import Test, TestCategory
+
+AUTOCOMPLETE_LIMIT = 8
+
+# Autocomplete rows are plain data so they can be served from the index
+Suggestion = namedtuple('Suggestion', ['id', 'name', 'category', 'price'])
+
+_WORD = re.compile(r'\w+', re.UNICODE)
+
+# Must match the expression index in migration f2b7d4c9e1a8 exactly
+_TSVECTOR = literal_column(
+    "to_tsvector('simple', coalesce(tests.name, '') || ' ' || coalesce(tests.description, ''))")
+
+
+def tokenize(text):
+    return _WORD.findall((text or '').lower())
+
+
+def backend():
+    """'postgres' or 'memory', per SEARCH_BACKEND and the database in use."""
+    if Config.SEARCH_BACKEND != 'auto':
+        return Config.SEARCH_BACKEND
+    return 'postgres' if db.engine.dialect.name == 'postgresql' else 'memory'
+
+
+# ── In-memory index ──
+_NAME, _CATEGORY, _DESCRIPTION = 3.0, 1.5, 1.0
+_EXACT, _PREFIX, _FUZZY = 1.0, 0.8, 0.6
+_FUZZY_MIN_SIMILARITY = 0.3  # pg_trgm.similarity_threshold default
+
+
+def _trigrams(token):
+    padded = f'  {token} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class MemoryIndex:
+    """Inverted index of tests: token -> {test id: field weight}."""
+
+    def __init__(self, rows):
+        """rows: iterable of (id, name, description, category name, price)."""
+        self.suggestions = {}
+        self.names = {}  # test id -> normalised name, for phrase bonuses and ties
+        self.postings = defaultdict(dict)
+        for test_id, name, description, category, price in rows:
+            self.suggestions[test_id] = Suggestion(test_id, name, category or '', price)
+            self.names[test_id] = ' '.join(tokenize(name))
+            for weight, text in ((_DESCRIPTION, description), (_CATEGORY, category), (_NAME, name)):
+                for token in tokenize(text):
+                    postings = self.postings[token]
+                    postings[test_id] = max(postings.get(test_id, 0), weight)
+
+        self.vocabulary = sorted(self.postings)
+        self.trigrams = defaultdict(set)
+        for token in self.vocabulary:
+            for gram in _trigrams(token):
+                self.trigrams[gram].add(token)
+
+    def _expand(self, term):
+        """{token: match weight} for the index tokens a query word matches."""
+        matches = {}
+        start = bisect.bisect_left(self.vocabulary, term)
+        for token in self.vocabulary[start:]:
+            if not token.startswith(term):
+                break
+            matches[token] = _EXACT if token == term else _PREFIX
+        if matches or len(term) < 3:
+            return matches
+
+        # Nothing starts with it: treat it as a typo
+        grams = _trigrams(term)
+        candidates = set()
+        for gram in grams:
+            candidates |= self.trigrams.get(gram, set())
+        for token in candidates:
+            token_grams = _trigrams(token)
+            similarity = len(grams & token_grams) / len(grams | token_grams)
+            if similarity >= _FUZZY_MIN_SIMILARITY:
+                matches[token] = _FUZZY * similarity
+        return matches
+
+    def search(self, q, limit=None):
+        """Test ids matching every word of q, best first."""
+        terms = tokenize(q)
+        if not terms:
+            return []
+
+        scores = None
+        for term in terms:
+            best = {}
+            for token, match_weight in self._expand(term).items():
+                for test_id, field_weight in self.postings[token].items():
+                    score = match_weight * field_weight
+                    if score > best.get(test_id, 0):
+                        best[test_id] = score
+            if scores is None:
+                scores = best
+            else:
+                scores = {test_id: scores[test_id] + score
+                          for test_id, score in best.items() if test_id in scores}
+            if not scores:
+                return []
+
+        phrase = ' '.join(terms)
+        names = self.names
+        for test_id in scores:
+            if names[test_id].startswith(phrase):
+                scores[test_id] += 5 if names[test_id] == phrase else 2
+
+        def rank(test_id):
+            return -scores[test_id], names[test_id]
+        if limit:
+            return heapq.nsmallest(limit, scores, key=rank)
+        return sorted(scores, key=rank)
+
+    def autocomplete(self, q, limit=AUTOCOMPLETE_LIMIT):
+        return [self.suggestions[test_id] for test_id in self.search(q, limit)]
+
+
+_index_lock = threading.Lock()
+_index = None  # (catalogue snapshot it was built from, MemoryIndex)
+
+
+def get_memory_index():
+    """MemoryIndex over the current catalogue snapshot's active tests."""
+    global _index
+    catalogue = get_catalogue()
+    built = _index
+    if built is not None and built[0] is catalogue:
+        return built[1]
+
+    # One rebuild at a time; the others wait for it instead of piling on
+    with _index_lock:
+        if _index is None or _index[0] is not catalogue:
+            _index = (catalogue, MemoryIndex(
+                (t.id, t.name, t.description, t.category_name, t.price) for t in catalogue.tests))
+        return _index[1]
+
+
+# ── PostgreSQL ──
+def _pg_match(q, terms):
+    """(WHERE clause, relevance score) for a query string on PostgreSQL."""
+    tsquery = func.to_tsquery('simple', ' & '.join(f'{term}:*' for term in terms))
+    typo_categories = select(TestCategory.id).where(literal(q).op('<%')(TestCategory.name))
+    clause = or_(
+        _TSVECTOR.op('@@')(tsquery),
+        literal(q).op('<%')(Test.name),
+        Test.category_id.in_(typo_categories),
+    )
+    score = (func.ts_rank(_TSVECTOR, tsquery)
+             + func.word_similarity(q, Test.name) * 2
+             + func.word_similarity(q, TestCategory.name) * 0.5)
+    return clause, score
+
+
+# ── Public API ──
+def search_tests(q, category_id=None, limit=None):
+    """Active catalogue tests (CatalogueTest) matching q, best first."""
+    terms = tokenize(q)
+    if not terms:
+        return []
+    catalogue = get_catalogue()
+
+    if backend() == 'postgres':
+        clause, score = _pg_match(q, terms)
+        query = select(Test.id).join(TestCategory, Test.category_id == TestCategory.id)\
+            .where(Test.is_active == True, clause).order_by(score.desc(), Test.name)
+        if category_id is not None:
+            query = query.where(Test.category_id == category_id)
+        if limit:
+            query = query.limit(limit)
+        ids = db.session.execute(query).scalars().all()
+    else:
+        ids = get_memory_index().search(q, None if category_id is not None else limit)
+
+    # The snapshot can trail the database by a version check
+    tests = [catalogue.tests_by_id[i] for i in ids if i in catalogue.tests_by_id]
+    if category_id is not None:
+        tests = [t for t in tests if t.category_id == category_id]
+    return tests[:limit] if limit else tests
+
+
+def autocomplete(q, limit=AUTOCOMPLETE_LIMIT):
+    """[Suggestion] for a partially typed query, best first."""
+    terms = tokenize(q)
+    if not terms:
+        return []
+
+    if backend() == 'postgres':
+        clause, score = _pg_match(q, terms)
+        rows = db.session.execute(
+            select(Test.id, Test.name, TestCategory.name, Test.price)
+            .join(TestCategory, Test.category_id == TestCategory.id)
+            .where(Test.is_active == True, clause)
+            .order_by(score.desc(), Test.name)
+            .limit(limit)
+        ).all()
+        return [Suggestion(*row) for row in rows]
+
+    return get_memory_index().autocomplete(q, limit)
@@ -1,7 +1,7 @@
 from app import create_app
 from extensions import db
 from models import User, TestCategory, Test, Testimonial
-from werkzeug.security import generate_password_hash
+import passwords
 
 app = create_app()
 
@@ -16,7 +16,7 @@ def seed_data():
                 phone='9876543210',
                 role='admin',
                 address='Life Care Lab, Asara',
-                password_hash=generate_password_hash('admin123')
+                password_hash=passwords.hash_password('user', 'admin123')
             )
             db.session.add(admin)
             print("Admin user created (admin@lifecare.com / admin123)")
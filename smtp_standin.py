@@ -0,0 +1,142 @@
+"""
+Local SMTP stand-in.
+
+A tiny SMTP server that accepts everything (including AUTH, so the normal
+MAIL_USERNAME/MAIL_PASSWORD settings work against it), keeps the messages
+in memory and counts connections. Point the app at it to exercise the mail
+queue without a real relay:
+
+    python smtp_standin.py --port 8025 [--latency 0.5] [--fail-every 3]
+    MAIL_SERVER=localhost MAIL_PORT=8025 MAIL_USE_TLS=0 flask run
+
+--latency delays the greeting to mimic a slow TLS handshake/login, and
+--fail-every N answers every Nth message with a temporary 451 so retries
+can be watched. SMTPStandIn can also be started from a script (see
+bench_mail_queue.py).
+"""
+import argparse
+import socketserver
+import threading
+import time
+
+
+class _Handler(socketserver.StreamRequestHandler):
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        time.sleep(server.latency)
+        self.reply('220 localhost SMTP stand-in')
+
+        envelope = None
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors='replace').strip()
+            verb = command.split(' ', 1)[0].upper()
+
+            if verb == 'EHLO':
+                self.reply('250-localhost')
+                self.reply('250-AUTH PLAIN')
+                self.reply('250 8BITMIME')
+            elif verb == 'HELO':
+                self.reply('250 localhost')
+            elif verb == 'AUTH':
+                self.reply('235 Authentication successful')
+            elif verb == 'MAIL':
+                envelope = {'from': command[10:].strip(' <>'), 'to': []}
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                envelope['to'].append(command[8:].strip(' <>'))
+                self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                data = self._read_data()
+                with server.lock:
+                    server.received += 1
+                    fail = server.fail_every and server.received % server.fail_every == 0
+                    if not fail:
+                        server.messages.append(dict(envelope, data=data))
+                self.reply('451 Try again later' if fail else '250 Queued')
+                envelope = None
+            elif verb in ('RSET', 'NOOP'):
+                envelope = None if verb == 'RSET' else envelope
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+    def _read_data(self):
+        lines = []
+        while True:
+            line = self.rfile.readline()
+            if not line or line in (b'.\r\n', b'.\n'):
+                break
+            lines.append(line[1:] if line.startswith(b'..') else line)
+        return b''.join(lines)
+
+
+class SMTPStandIn(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, fail_every=0):
+        super().__init__((host, port), _Handler)
+        self.latency = latency
+        self.fail_every = fail_every
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.received = 0
+        self.messages = []
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8025)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='Seconds to wait before greeting each connection')
+    parser.add_argument('--fail-every', type=int, default=0,
+                        help='Reject every Nth message with a temporary error')
+    args = parser.parse_args()
+
+    server = SMTPStandIn(args.host, args.port, args.latency, args.fail_every)
+    print(f"SMTP stand-in listening on {args.host}:{server.port}")
+    seen = 0
+    try:
+        server.start()
+        while True:
+            time.sleep(0.5)
+            with server.lock:
+                new = server.messages[seen:]
+                seen = len(server.messages)
+            for message in new:
+                subject = next((l for l in message['data'].decode(errors='replace').splitlines()
+                                if l.lower().startswith('subject:')), 'Subject: -')
+                print(f"[conn {server.connections}] {message['from']} -> "
+                      f"{', '.join(message['to'])} | {subject[8:].strip()}")
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
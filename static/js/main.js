@@ -292,6 +292,51 @@ document.addEventListener('DOMContentLoaded', () => {
         });
     }
 
+    // ── Test Search Autocomplete (Services Page) ──
+    if (searchInput) {
+        const box = searchInput.closest('.search-box');
+        const list = document.createElement('ul');
+        list.className = 'search-suggestions';
+        list.hidden = true;
+        box.appendChild(list);
+        searchInput.setAttribute('autocomplete', 'off');
+
+        let timer = null;
+        let lastQuery = '';
+        const escapeHtml = text => text.replace(/[&<>"']/g, c => ({
+            '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'
+        })[c]);
+
+        searchInput.addEventListener('input', () => {
+            clearTimeout(timer);
+            const q = searchInput.value.trim();
+            if (!q) { list.hidden = true; return; }
+            timer = setTimeout(() => {
+                lastQuery = q;
+                fetch(`/api/tests/autocomplete?q=${encodeURIComponent(q)}`)
+                    .then(r => r.json())
+                    .then(data => {
+                        if (data.query !== lastQuery) return;  // a newer request is in flight
+                        list.innerHTML = data.results.map(t => `
+                            <li data-name="${escapeHtml(t.name)}">
+                                <span>${escapeHtml(t.name)}</span>
+                                <small>${escapeHtml(t.category)} · ₹${Math.round(t.price)}</small>
+                            </li>`).join('');
+                        list.hidden = data.results.length === 0;
+                    })
+                    .catch(() => { list.hidden = true; });
+            }, 120);
+        });
+
+        list.addEventListener('mousedown', e => {
+            const item = e.target.closest('li');
+            if (!item) return;
+            searchInput.value = item.dataset.name;
+            searchInput.form.submit();
+        });
+        searchInput.addEventListener('blur', () => { list.hidden = true; });
+    }
+
     // ── Flash Message Auto-dismiss ──
     document.querySelectorAll('.flash-message').forEach(msg => {
         setTimeout(() => {
@@ -0,0 +1,368 @@
+"""
+Report file storage.
+
+Report PDFs and template images used to be written into UPLOAD_FOLDER,
+which on Vercel is /tmp and is gone by the next invocation. They now go
+through this module, which keeps each file once, under the SHA-256 of its
+content, in one of (STORAGE_BACKEND):
+
+    local     - files under STORAGE_ROOT, for a server with a real disk
+    s3        - any S3-compatible object store (AWS, MinIO, R2, ...),
+                signed with SigV4 over plain HTTP requests
+    database  - chunked rows in blob_chunks, when there is nothing else
+
+stored_blobs records each file's size, type, the backend holding it and
+how many rows refer to it, so saving identical content again (a re-render
+that didn't change, the same letterhead uploaded twice) only bumps the
+count. Reads are streamed in STORAGE_CHUNK_SIZE pieces from any byte
+offset, so a download never holds a whole PDF in memory.
+
+Callers keep the digest (Report.file_hash, ReportTemplate.file_hash). To
+drop a file, release() it, commit, then call purge() — like queue_mail()
+and dispatch() — so nothing is deleted for a transaction that rolls back.
+The other way round, save() writes local and S3 files before the caller
+commits; if the transaction ends without committing, files it wrote that
+no stored_blobs row claims are deleted again.
+"""
+import hashlib
+import hmac
+import io
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from urllib.parse import quote, urlsplit
+
+import requests
+from flask import current_app
+from sqlalchemy import event, func, insert, select, update
+from sqlalchemy.orm import Session
+from db_utils import upsert_for
+from extensions import db
+from models import BlobChunk, StoredBlob
+
+_EMPTY_SHA256 = hashlib.sha256(b'').hexdigest()
+_SPOOL_MAX = 4 * 1024 * 1024  # bigger uploads spill to a temp file while hashing
+
+
+class StorageError(RuntimeError):
+    """A backend couldn't store, read or delete a file."""
+
+
+# ── Backends ──
+class LocalBackend:
+    name = 'local'
+
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, digest):
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def put(self, digest, fileobj, size, content_type):
+        path = self.path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write beside the target and rename, so readers never see half a file
+        fd, partial = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.partial-')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                shutil.copyfileobj(fileobj, out)
+            os.replace(partial, path)
+        except BaseException:
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+
+    def read(self, digest, start, end, chunk_size):
+        try:
+            f = open(self.path(digest), 'rb')
+        except FileNotFoundError:
+            raise StorageError(f'Blob {digest} is missing from {self.root}')
+        with f:
+            f.seek(start)
+            remaining = end - start
+            while remaining > 0:
+                data = f.read(min(chunk_size, remaining))
+                if not data:
+                    return
+                remaining -= len(data)
+                yield data
+
+    def delete(self, digest):
+        try:
+            os.remove(self.path(digest))
+        except FileNotFoundError:
+            pass
+
+
+class S3Backend:
+    name = 's3'
+
+    def __init__(self, endpoint, bucket, access_key, secret_key, region, timeout=30):
+        self.endpoint = endpoint.rstrip('/')
+        self.bucket = bucket
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self.timeout = timeout
+        self.http = requests.Session()
+
+    def _url(self, digest):
+        # Path-style, which every S3-compatible server understands
+        return f'{self.endpoint}/{self.bucket}/blobs/{digest}'
+
+    def _sign(self, method, url, payload_hash, headers):
+        """headers plus SigV4 Authorization for one request."""
+        parts = urlsplit(url)
+        amz_date = datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')
+        day = amz_date[:8]
+        headers = dict(headers, host=parts.netloc)
+        headers['x-amz-date'] = amz_date
+        headers['x-amz-content-sha256'] = payload_hash
+        signed = {k.lower(): str(v).strip() for k, v in headers.items()}
+        names = ';'.join(sorted(signed))
+
+        canonical = '\n'.join([
+            method, quote(parts.path, safe='/~'), parts.query,
+            ''.join(f'{k}:{signed[k]}\n' for k in sorted(signed)), names, payload_hash,
+        ])
+        scope = f'{day}/{self.region}/s3/aws4_request'
+        to_sign = '\n'.join(['AWS4-HMAC-SHA256', amz_date, scope,
+                             hashlib.sha256(canonical.encode()).hexdigest()])
+        key = f'AWS4{self.secret_key}'.encode()
+        for part in (day, self.region, 's3', 'aws4_request'):
+            key = hmac.new(key, part.encode(), hashlib.sha256).digest()
+        signature = hmac.new(key, to_sign.encode(), hashlib.sha256).hexdigest()
+
+        headers['Authorization'] = (f'AWS4-HMAC-SHA256 Credential={self.access_key}/{scope}, '
+                                    f'SignedHeaders={names}, Signature={signature}')
+        del headers['host']  # requests sets it from the URL
+        return headers
+
+    def _request(self, method, digest, payload_hash=_EMPTY_SHA256, headers=None, **kwargs):
+        url = self._url(digest)
+        try:
+            return self.http.request(method, url, timeout=self.timeout,
+                                     headers=self._sign(method, url, payload_hash, headers or {}),
+                                     **kwargs)
+        except requests.RequestException as e:
+            raise StorageError(f'S3 {method} {digest} failed: {e}')
+
+    def put(self, digest, fileobj, size, content_type):
+        # The content hash is the blob's name, so the payload is signed for free
+        response = self._request('PUT', digest, payload_hash=digest, data=fileobj,
+                                 headers={'Content-Length': str(size),
+                                          'Content-Type': content_type})
+        if response.status_code not in (200, 201, 204):
+            raise StorageError(f'S3 PUT {digest}: HTTP {response.status_code} {response.text[:200]}')
+
+    def read(self, digest, start, end, chunk_size):
+        response = self._request('GET', digest, stream=True,
+                                 headers={'Range': f'bytes={start}-{end - 1}'})
+        with response:
+            if response.status_code not in (200, 206):
+                raise StorageError(f'S3 GET {digest}: HTTP {response.status_code}')
+            if response.status_code == 200 and start:
+                raise StorageError(f'S3 GET {digest}: server ignored the Range header')
+            yield from response.iter_content(chunk_size)
+
+    def delete(self, digest):
+        response = self._request('DELETE', digest)
+        if response.status_code not in (200, 204, 404):
+            raise StorageError(f'S3 DELETE {digest}: HTTP {response.status_code}')
+
+
+class DatabaseBackend:
+    """Chunks in blob_chunks, written in the caller's transaction."""
+    name = 'database'
+
+    def __init__(self, chunk_size):
+        self.chunk_size = chunk_size
+
+    def put(self, digest, fileobj, size, content_type):
+        upsert = upsert_for(db.session.get_bind())
+        offset = 0
+        while True:
+            data = fileobj.read(self.chunk_size)
+            if not data:
+                return
+            row = {'digest': digest, 'byte_offset': offset, 'data': data}
+            if upsert is not None:
+                # The same content saved concurrently writes identical chunks
+                db.session.execute(upsert(BlobChunk).values(**row).on_conflict_do_nothing())
+            else:
+                db.session.execute(insert(BlobChunk).values(**row))
+            offset += len(data)
+
+    def read(self, digest, start, end, chunk_size):
+        # One chunk per query, so memory stays at a chunk however big the file
+        offset = db.session.execute(
+            select(func.max(BlobChunk.byte_offset))
+            .where(BlobChunk.digest == digest, BlobChunk.byte_offset <= start)).scalar()
+        while offset is not None and offset < end:
+            row = db.session.execute(
+                select(BlobChunk.byte_offset, BlobChunk.data)
+                .where(BlobChunk.digest == digest, BlobChunk.byte_offset >= offset)
+                .order_by(BlobChunk.byte_offset).limit(1)).first()
+            if row is None:
+                return
+            data = bytes(row.data)
+            yield data[max(start - row.byte_offset, 0):end - row.byte_offset]
+            offset = row.byte_offset + len(data)
+
+    def delete(self, digest):
+        db.session.execute(BlobChunk.__table__.delete().where(BlobChunk.digest == digest))
+
+
+def _build(name):
+    config = current_app.config
+    if name == 'local':
+        return LocalBackend(config['STORAGE_ROOT'])
+    if name == 's3':
+        if not config['S3_BUCKET']:
+            raise StorageError('STORAGE_BACKEND is s3 but S3_BUCKET is not set.')
+        return S3Backend(config['S3_ENDPOINT_URL'], config['S3_BUCKET'],
+                         config['S3_ACCESS_KEY_ID'], config['S3_SECRET_ACCESS_KEY'],
+                         config['S3_REGION'])
+    if name == 'database':
+        return DatabaseBackend(config['STORAGE_CHUNK_SIZE'])
+    raise StorageError(f'Unknown storage backend {name!r}.')
+
+
+def backend(name=None):
+    """The configured backend, or the one a blob was saved with."""
+    backends = current_app.extensions.setdefault('storage_backends', {})
+    name = name or current_app.config['STORAGE_BACKEND']
+    if name not in backends:
+        backends[name] = _build(name)
+    return backends[name]
+
+
+# ── Saving and reading ──
+def _spool(source, chunk_size):
+    """Copy source to a temp spool, hashing on the way. Returns (spool, digest, size)."""
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    spool = tempfile.SpooledTemporaryFile(max_size=_SPOOL_MAX)
+    sha = hashlib.sha256()
+    size = 0
+    while True:
+        data = source.read(chunk_size)
+        if not data:
+            break
+        sha.update(data)
+        spool.write(data)
+        size += len(data)
+    spool.seek(0)
+    return spool, sha.hexdigest(), size
+
+
+def save(source, content_type='application/octet-stream'):
+    """Store bytes or a readable file and return its digest. Caller commits."""
+    spool, digest, size = _spool(source, current_app.config['STORAGE_CHUNK_SIZE'])
+    with spool:
+        bumped = db.session.execute(
+            update(StoredBlob).where(StoredBlob.digest == digest)
+            .values(refs=StoredBlob.refs + 1)).rowcount
+        if bumped:
+            return digest  # already stored: dedup
+
+        target = backend()
+        target.put(digest, spool, size, content_type)
+        if target.name != 'database':  # blob_chunks roll back by themselves
+            db.session.info.setdefault(_WRITTEN, set()).add((target.name, digest))
+        row = {'digest': digest, 'size': size, 'content_type': content_type,
+               'backend': target.name, 'refs': 1, 'created_at': datetime.utcnow()}
+        upsert = upsert_for(db.session.get_bind())
+        if upsert is not None:
+            # Lost a race with a concurrent save of the same content
+            db.session.execute(upsert(StoredBlob).values(**row).on_conflict_do_update(
+                index_elements=['digest'], set_={'refs': StoredBlob.refs + 1}))
+        else:
+            db.session.execute(insert(StoredBlob).values(**row))
+    return digest
+
+
+def stat(digest):
+    """The StoredBlob row for a digest, or None."""
+    return db.session.get(StoredBlob, digest) if digest else None
+
+
+def stream(blob, start=0, end=None):
+    """Yield a blob's bytes [start, end) in STORAGE_CHUNK_SIZE pieces."""
+    end = blob.size if end is None else min(end, blob.size)
+    if start >= end:
+        return iter(())
+    return backend(blob.backend).read(blob.digest, start, end,
+                                      current_app.config['STORAGE_CHUNK_SIZE'])
+
+
+def read(digest):
+    """A small blob's whole content (template images); None if missing."""
+    blob = stat(digest)
+    return b''.join(stream(blob)) if blob else None
+
+
+# ── Releasing ──
+def release(digest):
+    """Drop one reference to a blob. Commit, then call purge()."""
+    if digest:
+        db.session.execute(update(StoredBlob).where(StoredBlob.digest == digest)
+                           .values(refs=StoredBlob.refs - 1))
+
+
+def purge(digests=None):
+    """Delete blobs nothing refers to any more (just these, if given). Returns how many."""
+    query = select(StoredBlob).where(StoredBlob.refs <= 0)
+    if digests is not None:
+        digests = [d for d in digests if d]
+        if not digests:
+            return 0
+        query = query.where(StoredBlob.digest.in_(digests))
+    # Locked until the commit, so a concurrent save() of the same content
+    # waits and then stores it afresh instead of bumping a deleted row
+    blobs = db.session.execute(query.with_for_update(skip_locked=True)).scalars().all()
+    for blob in blobs:
+        backend(blob.backend).delete(blob.digest)
+        db.session.delete(blob)
+    db.session.commit()
+    return len(blobs)
+
+
+# ── Saves that never committed ──
+_WRITTEN = 'storage_written'  # session.info: (backend, digest) put this transaction
+
+
+@event.listens_for(Session, 'after_commit')
+def _after_commit(session):
+    session.info.pop(_WRITTEN, None)  # the stored_blobs rows are in
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def _after_transaction_end(session, transaction):
+    # Runs after _after_commit, so anything left was rolled back or closed
+    if transaction.parent is not None:
+        return
+    written = session.info.pop(_WRITTEN, None)
+    if not written:
+        return
+    # A concurrent save() of the same content may have committed its row
+    with db.engine.connect() as connection:
+        claimed = set(connection.execute(select(StoredBlob.digest).where(
+            StoredBlob.digest.in_([digest for _, digest in written]))).scalars())
+    for name, digest in written:
+        if digest in claimed:
+            continue
+        try:
+            backend(name).delete(digest)
+        except (StorageError, OSError) as e:
+            current_app.logger.error(f"Couldn't delete uncommitted blob {digest}: {e}")
+
+
+def import_file(path, content_type):
+    """save() a file from disk; None if it isn't there."""
+    try:
+        with open(path, 'rb') as f:
+            return save(f, content_type)
+    except FileNotFoundError:
+        return None
@@ -0,0 +1,162 @@
+"""
+Sliding-window attempt throttling.
+
+Each (scope, key) pair counts hits in fixed windows of `window` seconds
+and keeps the previous window's total. The sliding count is estimated as
+
+    previous * (share of the previous window still inside the slide) + current
+
+which is within a few percent of an exact log of timestamps and costs two
+integers per key. A hit over the limit is still counted, so a client that
+keeps hammering stays blocked instead of getting through every time the
+estimate dips.
+
+Counters live in THROTTLE_BACKEND:
+
+    memory   - a dict in this process. Free, but each serverless instance
+               or gunicorn worker counts on its own.
+    database - throttle_hits rows, upserted in their own short transaction,
+               so every instance shares one count.
+
+Keys are hashed before they're stored: no raw IPs or report IDs are kept.
+"""
+import hashlib
+import threading
+import time
+from collections import namedtuple
+from flask import current_app, request
+from sqlalchemy import select
+from db_utils import upsert_for
+from extensions import db
+from models import ThrottleHit
+
+Decision = namedtuple('Decision', ['allowed', 'count', 'limit', 'retry_after'])
+
+_PRUNE_EVERY = 1000  # hits between sweeps of stale counters
+
+
+def _digest(scope, key):
+    return hashlib.sha256(f'{scope}\0{key}'.encode('utf-8')).hexdigest()[:32]
+
+
+class MemoryCounter:
+    """Per-process counters: {(scope, digest): [window, index, current, previous]}."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {}
+        self._hits = 0
+
+    def hit(self, scope, digest, window, index):
+        with self._lock:
+            entry = self._counts.get((scope, digest))
+            if entry is None or entry[1] < index - 1:
+                entry = [window, index, 0, 0]
+            elif entry[1] == index - 1:
+                entry = [window, index, 0, entry[2]]
+            entry[2] += 1
+            self._counts[(scope, digest)] = entry
+            self._hits += 1
+            if self._hits % _PRUNE_EVERY == 0:
+                self._prune()
+            return entry[2], entry[3]
+
+    def _prune(self):
+        now = time.time()
+        for name, (window, index, _, _) in list(self._counts.items()):
+            if index < int(now // window) - 1:
+                del self._counts[name]
+
+    def clear(self):
+        with self._lock:
+            self._counts.clear()
+
+
+class DatabaseCounter:
+    """Counters shared by every instance through the throttle_hits table."""
+
+    def __init__(self):
+        self._hits = 0
+
+    def hit(self, scope, digest, window, index):
+        table = ThrottleHit.__table__
+        # Committed straight away on its own connection: an attempt counts
+        # even if the request that made it rolls back
+        with db.engine.begin() as connection:
+            insert = upsert_for(connection)
+            if insert is not None:
+                stmt = insert(table).values(scope=scope, key=digest, window_index=index, hits=1)
+                connection.execute(stmt.on_conflict_do_update(
+                    index_elements=['scope', 'key', 'window_index'],
+                    set_={'hits': table.c.hits + 1}))
+            else:
+                bumped = connection.execute(table.update().where(
+                    table.c.scope == scope, table.c.key == digest, table.c.window_index == index)
+                    .values(hits=table.c.hits + 1)).rowcount
+                if not bumped:
+                    connection.execute(table.insert().values(
+                        scope=scope, key=digest, window_index=index, hits=1))
+            counts = dict(connection.execute(
+                select(table.c.window_index, table.c.hits).where(
+                    table.c.scope == scope, table.c.key == digest,
+                    table.c.window_index.in_([index - 1, index]))).all())
+            self._hits += 1
+            if self._hits % _PRUNE_EVERY == 0:
+                connection.execute(table.delete().where(
+                    table.c.scope == scope, table.c.window_index < index - 1))
+        return counts.get(index, 0), counts.get(index - 1, 0)
+
+    def clear(self):
+        with db.engine.begin() as connection:
+            connection.execute(ThrottleHit.__table__.delete())
+
+
+_BACKENDS = {'memory': MemoryCounter, 'database': DatabaseCounter}
+
+
+def counter():
+    """This app's counter store, created on first use."""
+    counters = current_app.extensions.setdefault('throttle_counters', {})
+    name = current_app.config['THROTTLE_BACKEND']
+    if name not in counters:
+        if name not in _BACKENDS:
+            raise ValueError(f'Unknown THROTTLE_BACKEND {name!r}')
+        counters[name] = _BACKENDS[name]()
+    return counters[name]
+
+
+def hit(scope, key, limit, window):
+    """Count one attempt for (scope, key) and decide whether it may proceed."""
+    now = time.time()
+    index = int(now // window)
+    current, previous = counter().hit(scope, _digest(scope, key), window, index)
+    elapsed = now - index * window
+    count = previous * (1 - elapsed / window) + current
+    if count <= limit:
+        return Decision(True, count, limit, 0)
+    # Once this window closes its hits become the "previous" ones and start
+    # fading; until then nothing the client does brings the count down
+    return Decision(False, count, limit, int(window - elapsed) + 1)
+
+
+def attempt(rules):
+    """
+    Count an attempt against several (scope, key, limit, window) rules.
+    Every rule is charged; the decision is the strictest of them.
+    """
+    decisions = [hit(*rule) for rule in rules]
+    return max(decisions, key=lambda d: (not d.allowed, d.retry_after))
+
+
+def client_ip():
+    """
+    The caller's address. Behind THROTTLE_PROXY_HOPS trusted proxies (Vercel's
+    edge is one) it's taken that many entries from the right of
+    X-Forwarded-For, so a client can't pick its own key by sending the header.
+    """
+    hops = current_app.config['THROTTLE_PROXY_HOPS']
+    if hops:
+        forwarded = [a.strip() for a in request.headers.get('X-Forwarded-For', '').split(',') if a.strip()]
+        if len(forwarded) >= hops:
+            return forwarded[-hops]
+    return request.remote_addr or 'unknown'